@@ -0,0 +1,100 @@
+"""块级增量传输基准测试
+
+在本机子进程中启动支持copy-data扩展的SFTP服务器桩，对大文件做几种典型修改
+（末尾追加、原地修改、中间插入），对比完整上传与块级增量上传的耗时和发送字节数。
+
+用法: python benchmarks/bench_delta_transfer.py [文件大小MB]
+"""
+import os
+import sys
+import time
+import socket
+import shutil
+import filecmp
+import logging
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_sftp_throughput import serve
+from delta_transfer import BlockSignature, compute_delta
+from sync_manager import SyncManager
+
+
+def modify(path: str, kind: str):
+    """按修改类型改写本地文件"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    middle = len(data) // 2
+    if kind == '末尾追加':
+        data += os.urandom(64 * 1024)
+    elif kind == '原地修改':
+        data = data[:middle] + os.urandom(4096) + data[middle + 4096:]
+    elif kind == '中间插入':
+        data = data[:middle] + os.urandom(1000) + data[middle:]
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    logging.basicConfig(level=logging.WARNING)
+
+    work_dir = tempfile.mkdtemp(prefix='filesync_delta_bench_')
+    remote_root = os.path.join(work_dir, 'remote')
+    os.makedirs(remote_root)
+    local_path = os.path.join(work_dir, 'payload.bin')
+    original = os.path.join(work_dir, 'original.bin')
+    with open(original, 'wb') as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    port = sock.getsockname()[1]
+    server = multiprocessing.Process(target=serve, args=(sock, remote_root, True), daemon=True)
+    server.start()
+
+    config = {
+        'protocol': 'SFTP', 'host': '127.0.0.1', 'port': port,
+        'username': 'bench', 'password': 'bench',
+        'sftp_parallel_threshold_mb': 0,
+    }
+    state_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        print(f"文件大小: {size_mb} MB")
+        print(f"{'修改类型':<8} {'完整上传':>10} {'增量上传':>10} {'发送字节':>14}")
+        for kind in ('末尾追加', '原地修改', '中间插入'):
+            results = []
+            for delta_enabled in (False, True):
+                manager = SyncManager()
+                manager.create_connection('bench', dict(config, delta_transfer=delta_enabled))
+                remote_path = f'/{kind}_{delta_enabled}.bin'
+                shutil.copyfile(original, local_path)
+                manager.sync_file('bench', local_path, remote_path)
+                # 远程修改时间精度为秒，等待后再修改本地文件
+                time.sleep(1.1)
+                signature = BlockSignature.compute(local_path)
+                modify(local_path, kind)
+
+                start = time.perf_counter()
+                manager.sync_file('bench', local_path, remote_path)
+                results.append(time.perf_counter() - start)
+                manager.close_connection('bench')
+                if not filecmp.cmp(local_path, remote_root + remote_path, shallow=False):
+                    print(f"校验失败: {remote_path}")
+
+            delta = compute_delta(local_path, signature)
+            sent = delta.literal_bytes if delta else os.path.getsize(local_path)
+            print(f"{kind:<8} {results[0]:9.2f}s {results[1]:9.2f}s {sent:14d}")
+    finally:
+        os.chdir(state_dir)
+        server.terminate()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
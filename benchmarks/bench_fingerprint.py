@@ -0,0 +1,49 @@
+"""内容指纹算法吞吐量基准测试
+
+对同一个临时文件（已在页缓存中）用各指纹算法计算指纹，输出MB/s。
+
+用法: python benchmarks/bench_fingerprint.py [文件大小MB] [重复次数]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_monitor import HASH_BUFFER_SIZE
+from fingerprint import FINGERPRINTS
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    work_dir = tempfile.mkdtemp(prefix='filesync_fingerprint_bench_')
+    file_path = os.path.join(work_dir, 'payload.bin')
+    try:
+        with open(file_path, 'wb') as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+        size = os.path.getsize(file_path)
+        buffer = bytearray(HASH_BUFFER_SIZE)
+        # 预热页缓存
+        FINGERPRINTS['crc32'].file(file_path, buffer)
+
+        print(f"文件大小: {size_mb} MB, 重复次数: {repeat}")
+        for name, fingerprint in FINGERPRINTS.items():
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fingerprint.file(file_path, buffer)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            note = '' if fingerprint.strong else ' (仅检测变化，不用于识别相同内容)'
+            print(f"{name:<10} {best:8.3f}s {size / best / 1024 / 1024:10.1f} MB/s{note}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""SFTP上传吞吐量基准测试
+
+在本机子进程中启动一个基于paramiko的SFTP服务器桩，对比:
+  1. paramiko默认的 sftp.put
+  2. SyncManager 单通道流水线上传
+  3. SyncManager 多通道区段并行上传
+
+用法: python benchmarks/bench_sftp_throughput.py [文件大小MB] [并发通道数]
+"""
+import os
+import sys
+import time
+import socket
+import shutil
+import filecmp
+import logging
+import tempfile
+import multiprocessing
+
+import paramiko
+from paramiko import (ServerInterface, SFTPServerInterface, SFTPServer, SFTPAttributes,
+                      SFTPHandle, SFTP_OK, AUTH_SUCCESSFUL, OPEN_SUCCEEDED)
+from paramiko.sftp import CMD_EXTENDED
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sync_manager import SyncManager
+
+
+class StubServer(ServerInterface):
+    """接受任意用户名密码的SSH服务器"""
+
+    def check_auth_password(self, username, password):
+        return AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return OPEN_SUCCEEDED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+
+def set_file_attr(path, attr):
+    """修改文件属性，修改大小时用os.truncate（paramiko的set_file_attr会先清空文件）"""
+    if attr._flags & attr.FLAG_SIZE:
+        os.truncate(path, attr.st_size)
+        attr._flags &= ~attr.FLAG_SIZE
+    SFTPServer.set_file_attr(path, attr)
+
+
+class StubHandle(SFTPHandle):
+    """本地文件句柄"""
+
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            set_file_attr(self.filename, attr)
+            return SFTP_OK
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class StubSFTPServer(SFTPServerInterface):
+    """把所有SFTP操作映射到本地根目录的服务器桩"""
+
+    root = ''
+
+    def _local_path(self, path):
+        return self.root + self.canonicalize(path)
+
+    def list_folder(self, path):
+        path = self._local_path(path)
+        try:
+            result = []
+            for name in os.listdir(path):
+                attr = SFTPAttributes.from_stat(os.stat(os.path.join(path, name)))
+                attr.filename = name
+                result.append(attr)
+            return result
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._local_path(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        path = self._local_path(path)
+        try:
+            fd = os.open(path, flags, 0o666)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = StubHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._local_path(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(self._local_path(oldpath), self._local_path(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    posix_rename = rename
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._local_path(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            set_file_attr(self._local_path(path), attr)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+
+class CopyDataSFTPServer(SFTPServer):
+    """支持copy-data扩展（OpenSSH 9.0+提供）的SFTP服务器"""
+
+    def _process(self, t, request_number, msg):
+        if t == CMD_EXTENDED:
+            position = msg.packet.tell()
+            if msg.get_text() == 'copy-data':
+                self._copy_data(request_number, msg)
+                return
+            msg.packet.seek(position)
+        super()._process(t, request_number, msg)
+
+    def _copy_data(self, request_number, msg):
+        """在服务器端把一个文件的区段复制到另一个文件"""
+        read_handle = self.file_table[msg.get_binary()]
+        read_offset = msg.get_int64()
+        length = msg.get_int64()
+        write_handle = self.file_table[msg.get_binary()]
+        write_offset = msg.get_int64()
+        read_handle.readfile.seek(read_offset)
+        write_handle.writefile.seek(write_offset)
+        while length > 0:
+            data = read_handle.readfile.read(min(length, 1024 * 1024))
+            if not data:
+                break
+            write_handle.writefile.write(data)
+            length -= len(data)
+        write_handle.writefile.flush()
+        self._send_status(request_number, SFTP_OK)
+
+
+def serve(sock: socket.socket, root: str, copy_data: bool = False):
+    """SFTP服务器子进程入口"""
+    StubSFTPServer.root = root
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+    host_key = paramiko.RSAKey.generate(2048)
+    while True:
+        client, _ = sock.accept()
+        transport = paramiko.Transport(client)
+        transport.add_server_key(host_key)
+        transport.set_subsystem_handler('sftp', CopyDataSFTPServer if copy_data else SFTPServer,
+                                        StubSFTPServer)
+        transport.start_server(server=StubServer())
+
+
+def measure(name: str, size: int, func):
+    """执行一次上传并输出吞吐量"""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {elapsed:8.2f}s {size / elapsed / 1024 / 1024:10.1f} MB/s")
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    parallel = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    logging.basicConfig(level=logging.WARNING)
+
+    work_dir = tempfile.mkdtemp(prefix='filesync_sftp_bench_')
+    remote_root = os.path.join(work_dir, 'remote')
+    os.makedirs(remote_root)
+    local_path = os.path.join(work_dir, 'payload.bin')
+    with open(local_path, 'wb') as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(1024 * 1024))
+    size = os.path.getsize(local_path)
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    port = sock.getsockname()[1]
+    server = multiprocessing.Process(target=serve, args=(sock, remote_root), daemon=True)
+    server.start()
+
+    config = {
+        'protocol': 'SFTP', 'host': '127.0.0.1', 'port': port,
+        'username': 'bench', 'password': 'bench',
+        'parallel_transfers': parallel,
+    }
+    try:
+        print(f"文件大小: {size_mb} MB, 并发通道数: {parallel}")
+
+        # paramiko默认上传
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.connect('127.0.0.1', port=port, username='bench', password='bench')
+        sftp = ssh.open_sftp()
+        measure('sftp.put', size, lambda: sftp.put(local_path, '/default.bin'))
+        sftp.close()
+        ssh.close()
+
+        # 单通道流水线上传（关闭区段并行）
+        manager = SyncManager()
+        manager.create_connection('single', dict(config, sftp_parallel_threshold_mb=0))
+        measure('流水线单通道', size,
+                lambda: manager.sync_file('single', local_path, '/single.bin'))
+        manager.close_connection('single')
+
+        # 多通道区段并行上传
+        manager.create_connection('ranged', dict(config, sftp_parallel_threshold_mb=1))
+        measure('多通道区段并行', size,
+                lambda: manager.sync_file('ranged', local_path, '/ranged.bin'))
+        manager.close_connection('ranged')
+
+        for name in ('default.bin', 'single.bin', 'ranged.bin'):
+            if not filecmp.cmp(local_path, os.path.join(remote_root, name), shallow=False):
+                print(f"校验失败: {name}")
+    finally:
+        server.terminate()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""状态索引基准测试
+
+对比旧的JSON哈希值文件（每次变化整体重写current/previous两个文件，每次扫描重新解析）
+与SQLite状态索引（只提交变化的行）在大量文件时单个文件变化的开销和启动加载耗时。
+不需要真实文件，记录由程序生成。
+
+用法: python benchmarks/bench_state_index.py [文件数量]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state_index import StateIndex
+
+
+def measure(name: str, func) -> float:
+    """执行一次并输出耗时"""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:8.3f}s")
+    return elapsed
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    work_dir = tempfile.mkdtemp(prefix='filesync_index_bench_')
+    root = os.path.join(work_dir, 'data')
+    try:
+        records = {}
+        for i in range(file_count):
+            path = os.path.join(root, f'dir{i % 1000}', f'file{i}.bin')
+            records[path] = (i, i * 1000, i, hashlib.sha256(str(i).encode()).hexdigest())
+        hashes = {path: record[3] for path, record in records.items()}
+        changed = dict(records)
+        first = next(iter(changed))
+        changed[first] = changed[first][:3] + (hashlib.sha256(b'changed').hexdigest(),)
+        print(f"文件数: {file_count}")
+
+        # 旧流程：每次变化重写两个JSON文件，每次扫描加载一次
+        current_file = os.path.join(work_dir, 'current_hashes.json')
+        previous_file = os.path.join(work_dir, 'previous_hashes.json')
+
+        def json_save():
+            for file_path in (current_file, previous_file):
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    json.dump(hashes, f, indent=4, ensure_ascii=False)
+
+        def json_load():
+            with open(previous_file, 'r', encoding='utf-8') as f:
+                json.load(f)
+
+        measure('JSON 单文件变化写入', json_save)
+        measure('JSON 每次扫描加载', json_load)
+        print(f"{'JSON 文件大小':<28} {os.path.getsize(current_file) * 2 / 1024 / 1024:8.1f}MB")
+
+        # 状态索引：只提交变化的行
+        db_path = os.path.join(work_dir, 'index.db')
+        index = StateIndex(db_path, root)
+        measure('索引 首次写入全部记录', lambda: index.update(records))
+        measure('索引 单文件变化写入', lambda: index.update(changed))
+        index.close()
+
+        index = StateIndex(db_path, root)
+        measure('索引 启动加载', index.load)
+        index.close()
+        print(f"{'索引文件大小':<28} {os.path.getsize(db_path) / 1024 / 1024:8.1f}MB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
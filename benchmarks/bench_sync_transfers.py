@@ -0,0 +1,74 @@
+"""统计每次文件变化事件触发的传输次数
+
+对比旧流程（增量上传后再因SYNC_REQUIRED上传整个目录树）与当前的增量同步流程。
+不需要远程服务器，传输操作只计数不执行。
+
+用法: python benchmarks/bench_sync_transfers.py [文件数量]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_monitor import FileMonitor
+from sync_manager import SyncManager
+
+
+class CountingSyncManager(SyncManager):
+    """只统计传输次数的同步管理器"""
+
+    def __init__(self):
+        super().__init__()
+        self.transfers = 0
+        self.connections['bench'] = {'type': 'bench', 'config': {}}
+
+    def sync_file(self, task_id, local_path, remote_path, operation='upload'):
+        self.transfers += 1
+        return True
+
+    def verify_remote_file(self, task_id, local_path, remote_path):
+        return True
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    local_dir = tempfile.mkdtemp(prefix='filesync_bench_')
+    try:
+        for i in range(file_count):
+            sub_dir = os.path.join(local_dir, f'dir{i % 50}')
+            os.makedirs(sub_dir, exist_ok=True)
+            with open(os.path.join(sub_dir, f'file{i}.txt'), 'w') as f:
+                f.write(f'content {i}\n')
+
+        monitor = FileMonitor()
+        previous = monitor._scan_directory(local_dir, incremental=True)
+
+        # 模拟一次变化事件：修改一个文件
+        changed = os.path.join(local_dir, 'dir0', 'file0.txt')
+        time.sleep(0.01)
+        with open(changed, 'a') as f:
+            f.write('changed\n')
+        current = monitor._scan_directory(local_dir, incremental=True)
+        added, modified, deleted = monitor._detect_changes(current, previous)
+
+        # 旧流程：先按变化集合上传，再因SYNC_REQUIRED上传索引中的全部文件
+        legacy = CountingSyncManager()
+        legacy.apply_changes('bench', local_dir, '/remote', added, modified, deleted)
+        legacy.full_reconcile('bench', local_dir, '/remote', current.keys())
+
+        # 当前流程：只应用变化集合
+        delta = CountingSyncManager()
+        delta.apply_changes('bench', local_dir, '/remote', added, modified, deleted)
+
+        print(f"目录文件数: {file_count}, 变化文件数: {len(added) + len(modified) + len(deleted)}")
+        print(f"旧流程每次变化事件传输次数: {legacy.transfers}")
+        print(f"增量流程每次变化事件传输次数: {delta.transfers}")
+    finally:
+        shutil.rmtree(local_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""WebDAV小文件上传速度基准测试（每秒文件数）
+
+在本机子进程中启动一个WebDAV服务器桩（每个请求附加固定延迟以模拟网络往返），对比:
+  1. SyncManager 线程池同步请求（并发传输数个连接）
+  2. SyncManager 异步WebDAV请求（事件循环中同时进行多个请求）
+
+用法: python benchmarks/bench_webdav_async.py [文件数量] [请求延迟毫秒] [异步并发请求数]
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import logging
+import tempfile
+import multiprocessing
+from urllib.parse import unquote, urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sync_manager import SyncManager
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """只实现同步用到的WebDAV方法，保持连接"""
+
+    protocol_version = 'HTTP/1.1'
+    root = ''
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _path(self) -> str:
+        return os.path.join(self.root, unquote(urlparse(self.path).path).strip('/'))
+
+    def _reply(self, status: int, body: bytes = b''):
+        time.sleep(self.delay)
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_PUT(self):
+        data = self._read_body()
+        path = self._path()
+        if not os.path.isdir(os.path.dirname(path)):
+            return self._reply(409)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self._reply(201)
+
+    def do_MKCOL(self):
+        self._read_body()
+        path = self._path()
+        if os.path.exists(path):
+            return self._reply(405)
+        if not os.path.isdir(os.path.dirname(path)):
+            return self._reply(409)
+        os.mkdir(path)
+        self._reply(201)
+
+    def do_PROPFIND(self):
+        self._read_body()
+        path = self._path()
+        if not os.path.exists(path):
+            return self._reply(404)
+        self._reply(207, b'<?xml version="1.0" encoding="utf-8"?><d:multistatus xmlns:d="DAV:"/>')
+
+    def do_DELETE(self):
+        self._read_body()
+        path = self._path()
+        if not os.path.isfile(path):
+            return self._reply(404)
+        os.remove(path)
+        self._reply(204)
+
+
+def serve(sock: socket.socket, root: str, delay: float):
+    StubHandler.root = root
+    StubHandler.delay = delay
+    server = ThreadingHTTPServer(sock.getsockname(), StubHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def measure(name: str, manager: SyncManager, task_id: str, local_dir: str, remote_dir: str, files: set):
+    started = time.perf_counter()
+    result = manager.apply_changes(task_id, local_dir, remote_dir, files, set(), set())
+    elapsed = time.perf_counter() - started
+    print(f"{name:<24} {elapsed:8.2f} 秒  {len(files) / elapsed:9.1f} 文件/秒  "
+          f"成功 {result['uploaded']}  失败 {result['failed']}")
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    delay_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    logging.basicConfig(level=logging.WARNING)
+
+    work_dir = tempfile.mkdtemp(prefix='filesync_webdav_bench_')
+    local_dir = os.path.join(work_dir, 'local')
+    remote_root = os.path.join(work_dir, 'remote')
+    os.makedirs(remote_root)
+    files = set()
+    for i in range(file_count):
+        sub_dir = os.path.join(local_dir, f'dir{i % 50}')
+        os.makedirs(sub_dir, exist_ok=True)
+        path = os.path.join(sub_dir, f'file{i}.txt')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(512 + i % 3584))
+        files.add(path)
+
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(256)
+    port = sock.getsockname()[1]
+    server = multiprocessing.Process(target=serve, args=(sock, remote_root, delay_ms / 1000), daemon=True)
+    server.start()
+
+    config = {
+        'protocol': 'WebDAV', 'host': f'http://127.0.0.1:{port}',
+        'username': 'bench', 'password': 'bench',
+        'parallel_transfers': 4, 'verify_mode': 'none', 'delta_transfer': False,
+    }
+    try:
+        print(f"文件数量: {file_count}, 请求延迟: {delay_ms} ms, 异步并发请求数: {concurrency}")
+
+        manager = SyncManager()
+        manager.create_connection('threads', config)
+        measure('线程池同步请求(4)', manager, 'threads', local_dir, '/threads', files)
+        manager.close_connection('threads')
+
+        # 异步请求同样占用调度器的传输槽，同时传输数上限与并发请求数一致
+        manager = SyncManager(max_active_transfers=concurrency)
+        manager.create_connection('async', dict(config, webdav_async=True, webdav_concurrency=concurrency))
+        measure(f'异步请求({concurrency})', manager, 'async', local_dir, '/async', files)
+        manager.close_connection('async')
+    finally:
+        server.terminate()
+        server.join()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
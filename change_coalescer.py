@@ -0,0 +1,169 @@
+import os
+import time
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from transfer_journal import JournalKey
+
+# 文件持续变化时最多等待的时间（秒），超过后即使仍在写入也提交一次
+MAX_COALESCE_DELAY = 60.0
+
+
+class _PendingChange:
+    """一个路径在当前合并窗口内的状态"""
+
+    __slots__ = ('existed_before', 'exists', 'first_seen', 'last_changed', 'stat_signature')
+
+    def __init__(self, existed_before: bool, now: float):
+        # 合并窗口开始前远程是否已有该文件
+        self.existed_before = existed_before
+        # 最后一次事件后本地是否存在该文件
+        self.exists = True
+        self.first_seen = now
+        self.last_changed = now
+        self.stat_signature: Optional[Tuple[int, int]] = None
+
+
+class ChangeCoalescer:
+    """合并监控端报告的变化，文件静默（大小和修改时间不再变化）一段时间后才交给同步
+
+    同一路径的多次事件合并为一次；窗口内先新增后删除的文件（临时文件）直接丢弃。
+    移动操作不需要等待，下一次取出时立即交给同步，合并窗口中尚未同步的路径随移动一起改名。
+    丢弃或改写已排队的操作时调用 on_rewrite(丢弃的操作日志键, 改写后新排队的键)，以便同步更新操作日志。
+    """
+
+    def __init__(self, quiet_period: float = 2.0, max_delay: float = MAX_COALESCE_DELAY,
+                 on_rewrite: Optional[Callable[[List[JournalKey], List[JournalKey]], None]] = None):
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.on_rewrite = on_rewrite
+        self._pending: Dict[str, _PendingChange] = {}
+        # (旧路径, 新路径, 是否为目录)
+        self._moves: List[Tuple[str, str, bool]] = []
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    @staticmethod
+    def _stat_signature(path: str) -> Optional[Tuple[int, int]]:
+        """文件的大小和修改时间，文件不存在时返回None"""
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            return None
+        return file_stat.st_size, file_stat.st_mtime_ns
+
+    @staticmethod
+    def _path_keys(path: str) -> List[JournalKey]:
+        """一个路径可能已排队的上传和删除操作"""
+        return [('upload', path, ''), ('delete', path, '')]
+
+    @staticmethod
+    def _change_key(path: str, change: _PendingChange) -> JournalKey:
+        return ('upload' if change.exists else 'delete', path, '')
+
+    def _rewritten(self, discarded: List[JournalKey], queued: List[JournalKey]):
+        if self.on_rewrite is not None and (discarded or queued):
+            self.on_rewrite(discarded, queued)
+
+    def add(self, added: Iterable[str], modified: Iterable[str], deleted: Iterable[str],
+            now: Optional[float] = None):
+        """加入一个变化集合"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for paths, existed_before, exists in ((added, False, True), (modified, True, True),
+                                                  (deleted, True, False)):
+                for path in paths:
+                    change = self._pending.get(path)
+                    if change is None:
+                        change = self._pending[path] = _PendingChange(existed_before, now)
+                    change.exists = exists
+                    change.last_changed = now
+                    change.stat_signature = self._stat_signature(path) if exists else None
+
+    def add_moves(self, moved: Iterable[Tuple[str, str]], moved_dirs: Iterable[Tuple[str, str]] = (),
+                  now: Optional[float] = None):
+        """加入文件移动和目录移动"""
+        now = time.monotonic() if now is None else now
+        discarded: List[JournalKey] = []
+        queued: List[JournalKey] = []
+        with self._lock:
+            for old_dir, new_dir in moved_dirs:
+                self._moves.append((old_dir, new_dir, True))
+                old_prefix = old_dir + os.sep
+                for path in [path for path in self._pending if path.startswith(old_prefix)]:
+                    new_path = new_dir + path[len(old_dir):]
+                    change = self._pending[new_path] = self._pending.pop(path)
+                    # 按新路径比较大小和修改时间，否则会被误认为仍在写入
+                    if change.exists:
+                        change.stat_signature = self._stat_signature(new_path)
+                    discarded += self._path_keys(path)
+                    queued.append(self._change_key(new_path, change))
+            
+            dir_prefixes = tuple(old_dir + os.sep for old_dir, _ in moved_dirs)
+            for old_path, new_path in moved:
+                if dir_prefixes and old_path.startswith(dir_prefixes):
+                    # 目录中的文件已随目录改名，保留文件移动供目录移动失败时逐个处理
+                    self._moves.append((old_path, new_path, False))
+                    continue
+                # 移动覆盖了目标路径上尚未同步的变化
+                if self._pending.pop(new_path, None) is not None:
+                    discarded += self._path_keys(new_path)
+                change = self._pending.pop(old_path, None)
+                if change is None:
+                    self._moves.append((old_path, new_path, False))
+                    continue
+                # 旧路径还有未同步的变化：远程已有旧文件时先移动，再按修改上传新路径
+                discarded += self._path_keys(old_path)
+                if change.existed_before:
+                    self._moves.append((old_path, new_path, False))
+                else:
+                    # 远程没有旧文件，移动改为上传新路径
+                    discarded.append(('move', old_path, new_path))
+                change.exists = True
+                change.last_changed = now
+                change.stat_signature = self._stat_signature(new_path)
+                self._pending[new_path] = change
+                queued.append(self._change_key(new_path, change))
+        self._rewritten(discarded, queued)
+
+    def pop_moves(self) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+        """取出全部移动，返回 (文件移动, 目录移动)"""
+        with self._lock:
+            moves = self._moves
+            self._moves = []
+        return ([(old, new) for old, new, is_dir in moves if not is_dir],
+                [(old, new) for old, new, is_dir in moves if is_dir])
+
+    def pop_ready(self, now: Optional[float] = None) -> Tuple[Set[str], Set[str], Set[str]]:
+        """取出已静默的变化，返回 (新增, 修改, 删除)"""
+        now = time.monotonic() if now is None else now
+        added, modified, deleted = set(), set(), set()
+        discarded: List[JournalKey] = []
+        with self._lock:
+            for path, change in list(self._pending.items()):
+                overdue = now - change.first_seen >= self.max_delay
+                if not overdue and now - change.last_changed < self.quiet_period:
+                    continue
+                if change.exists and not overdue:
+                    # 大小或修改时间仍在变化，说明文件还在写入
+                    signature = self._stat_signature(path)
+                    if signature != change.stat_signature:
+                        change.stat_signature = signature
+                        change.last_changed = now
+                        continue
+                del self._pending[path]
+                if change.exists:
+                    (modified if change.existed_before else added).add(path)
+                elif change.existed_before:
+                    deleted.add(path)
+                else:
+                    # 窗口内新增后又删除的临时文件，不需要同步
+                    discarded += self._path_keys(path)
+        self._rewritten(discarded, [])
+        return added, modified, deleted
+
+    def pop_all(self) -> Tuple[Set[str], Set[str], Set[str]]:
+        """不等待静默，取出全部变化"""
+        return self.pop_ready(now=float('inf'))
@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import logging
+from threading import Lock
+from typing import Dict
+
+
+class CheckpointStore:
+    """断点续传检查点存储，按远程路径记录每个未完成上传已写入的字节数
+
+    检查点同时记录本地文件的大小和修改时间，本地文件变化后检查点自动失效。
+    进度更新先保存在内存中，累计写入超过flush_bytes或距上次写盘超过flush_interval秒时才落盘。
+    """
+
+    def __init__(self, file_path: str, flush_bytes: int = 8 * 1024 * 1024, flush_interval: float = 2.0):
+        self.file_path = file_path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self._lock = Lock()
+        self._entries: Dict[str, dict] = self._load()
+        self._unflushed_bytes = 0
+        self._last_flush = time.monotonic()
+
+    def _load(self) -> Dict[str, dict]:
+        """从文件加载检查点"""
+        try:
+            if os.path.exists(self.file_path):
+                with open(self.file_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logging.warning(f"加载断点续传检查点失败: {str(e)}")
+        return {}
+
+    def get_offset(self, remote_path: str, local_path: str, local_stat: os.stat_result) -> int:
+        """获取可续传的字节偏移，本地文件已变化或没有检查点时返回0"""
+        with self._lock:
+            entry = self._entries.get(remote_path)
+            if (not entry or entry['local_path'] != local_path
+                    or entry['size'] != local_stat.st_size
+                    or entry['mtime_ns'] != local_stat.st_mtime_ns):
+                return 0
+            return entry['offset']
+
+    def update(self, remote_path: str, local_path: str, local_stat: os.stat_result, offset: int):
+        """更新上传进度"""
+        with self._lock:
+            entry = self._entries.get(remote_path)
+            previous = entry['offset'] if entry else 0
+            self._entries[remote_path] = {
+                'local_path': local_path,
+                'size': local_stat.st_size,
+                'mtime_ns': local_stat.st_mtime_ns,
+                'offset': offset
+            }
+            self._unflushed_bytes += max(offset - previous, 0)
+            due = (self._unflushed_bytes >= self.flush_bytes
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def clear(self, remote_path: str):
+        """上传完成后删除检查点"""
+        with self._lock:
+            if self._entries.pop(remote_path, None) is None:
+                return
+        self.flush()
+
+    def flush(self):
+        """把检查点原子地写入文件"""
+        with self._lock:
+            self._unflushed_bytes = 0
+            self._last_flush = time.monotonic()
+            try:
+                if not self._entries:
+                    if os.path.exists(self.file_path):
+                        os.remove(self.file_path)
+                    return
+                os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+                temp_path = self.file_path + '.tmp'
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._entries, f, ensure_ascii=False)
+                os.replace(temp_path, self.file_path)
+            except Exception as e:
+                logging.warning(f"保存断点续传检查点失败: {str(e)}")
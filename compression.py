@@ -0,0 +1,199 @@
+import os
+import time
+import zlib
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+import paramiko
+
+# 已经压缩过的文件类型，不再压缩
+COMPRESSED_EXTENSIONS = {
+    '.gz', '.tgz', '.bz2', '.xz', '.txz', '.zst', '.lz4', '.zip', '.7z', '.rar',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.avif',
+    '.mp3', '.aac', '.ogg', '.opus', '.flac', '.m4a',
+    '.mp4', '.m4v', '.mkv', '.mov', '.avi', '.webm',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.jar', '.apk', '.pdf',
+}
+# 判断压缩效果时从文件开头取样的字节数
+SAMPLE_SIZE = 64 * 1024
+# 取样压缩后大小超过原大小的该比例时认为不值得压缩
+MAX_SAMPLE_RATIO = 0.9
+# 小于该大小的文件压缩收益太小，直接发送
+MIN_COMPRESS_SIZE = 4 * 1024
+# 流式gzip每次读取的字节数
+GZIP_CHUNK_SIZE = 256 * 1024
+# 已实际测试过替换SSH压缩器的paramiko版本 (主版本, 次版本)，其他版本不替换
+SSH_COMPRESSOR_VERSIONS = {(5, 0)}
+
+
+def is_compressible(local_path: str) -> bool:
+    """按扩展名和开头数据的压缩率判断文件是否值得压缩"""
+    if os.path.splitext(local_path)[1].lower() in COMPRESSED_EXTENSIONS:
+        return False
+    try:
+        if os.path.getsize(local_path) < MIN_COMPRESS_SIZE:
+            return False
+        with open(local_path, 'rb') as f:
+            sample = f.read(SAMPLE_SIZE)
+    except OSError:
+        return False
+    return len(zlib.compress(sample, 1)) <= len(sample) * MAX_SAMPLE_RATIO
+
+
+class CompressionStats:
+    """一个任务的压缩统计：压缩前后的字节数、压缩耗费的CPU时间和跳过压缩的文件数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.cpu_seconds = 0.0
+        self.compressed_files = 0
+        self.skipped_files = 0
+
+    def add(self, raw_bytes: int, wire_bytes: int, cpu_seconds: float = 0.0):
+        with self._lock:
+            self.raw_bytes += raw_bytes
+            self.wire_bytes += wire_bytes
+            self.cpu_seconds += cpu_seconds
+
+    def count_file(self, compressed: bool):
+        with self._lock:
+            if compressed:
+                self.compressed_files += 1
+            else:
+                self.skipped_files += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'raw_bytes': self.raw_bytes,
+                'wire_bytes': self.wire_bytes,
+                'ratio': self.wire_bytes / self.raw_bytes if self.raw_bytes else 1.0,
+                'cpu_seconds': self.cpu_seconds,
+                'compressed_files': self.compressed_files,
+                'skipped_files': self.skipped_files,
+            }
+
+
+def gzip_chunks(f, stats: Optional[CompressionStats] = None,
+                throttle: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """把文件对象从当前位置起流式压缩为gzip数据块，用作HTTP请求体
+
+    throttle(字节数) 按压缩后实际发送的字节数调用。
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    while True:
+        data = f.read(GZIP_CHUNK_SIZE)
+        started = time.thread_time()
+        output = compressor.compress(data) if data else compressor.flush()
+        if stats:
+            stats.add(len(data), len(output), time.thread_time() - started)
+        if output:
+            if throttle:
+                throttle(len(output))
+            yield output
+        if not data:
+            return
+
+
+class SSHCompressor:
+    """SSH传输层的zlib压缩器，替换paramiko默认的压缩器以统计压缩效果
+
+    调用线程处于bypass()中时，数据以deflate未压缩块发送，不耗费压缩CPU。
+    paramiko每个包都以Z_FULL_FLUSH结束，包之间字节对齐且不引用之前的数据，
+    因此可以在两个压缩包之间插入未压缩块，对端照常解压。
+    """
+
+    _local = threading.local()
+
+    def __init__(self, stats: Optional[CompressionStats] = None):
+        self.z = zlib.compressobj()
+        self.stats = stats
+        # 第一个包必须经过zlib压缩，以输出zlib流头
+        self._started = False
+
+    @classmethod
+    @contextmanager
+    def bypass(cls) -> Iterator[None]:
+        """在with块内当前线程发送的数据不压缩"""
+        previous = getattr(cls._local, 'bypass', False)
+        cls._local.bypass = True
+        try:
+            yield
+        finally:
+            cls._local.bypass = previous
+
+    @classmethod
+    def bypassed(cls) -> bool:
+        """当前线程是否处于bypass()中"""
+        return getattr(cls._local, 'bypass', False)
+
+    def __call__(self, data: bytes) -> bytes:
+        if self._started and self.bypassed():
+            output = _stored_blocks(data)
+            if self.stats:
+                self.stats.add(len(data), len(output))
+            return output
+        started = time.thread_time()
+        output = self.z.compress(data) + self.z.flush(zlib.Z_FULL_FLUSH)
+        self._started = True
+        if self.stats:
+            self.stats.add(len(data), len(output), time.thread_time() - started)
+        return output
+
+
+def _stored_blocks(data: bytes) -> bytes:
+    """把数据编码为deflate未压缩块（每块最多65535字节）"""
+    parts = []
+    for start in range(0, len(data), 0xFFFF):
+        block = data[start:start + 0xFFFF]
+        parts.append(b'\x00' + struct.pack('<HH', len(block), len(block) ^ 0xFFFF) + block)
+    return b''.join(parts)
+
+
+def _paramiko_version() -> tuple:
+    """paramiko的 (主版本, 次版本)，无法解析时返回 (0, 0)"""
+    try:
+        return tuple(int(part) for part in paramiko.__version__.split('.')[:2])
+    except (AttributeError, ValueError):
+        return (0, 0)
+
+
+def install_ssh_compressor(transport, stats: CompressionStats) -> bool:
+    """在已协商压缩的paramiko Transport上改用SSHCompressor，未协商压缩时返回False
+
+    压缩本身由连接时的compress参数（Transport.use_compression()）请求，是否已协商
+    按公开的local_compression判断。替换压缩器需要paramiko内部的压缩器表和包处理器属性，
+    只在验证过的paramiko版本上替换；其他版本记录警告后沿用paramiko自己的压缩器，
+    照常压缩，但不统计压缩效果，bypass()也不生效。
+
+    已在使用的压缩流不能重新开始，新压缩器沿用原压缩器的zlib对象；
+    重新协商密钥时paramiko会新建压缩器，因此同时替换该Transport使用的压缩器类型。
+    """
+    if transport.local_compression not in ('zlib', 'zlib@openssh.com'):
+        return False
+    if _paramiko_version() not in SSH_COMPRESSOR_VERSIONS:
+        logging.warning(f"未在paramiko {paramiko.__version__} 上测试过替换SSH压缩器，"
+                        f"使用paramiko默认的压缩，不统计压缩效果")
+        return True
+    packetizer = transport.packetizer
+    if (not hasattr(transport, '_compression_info')
+            or not hasattr(packetizer, '_Packetizer__compress_engine_out')
+            or not hasattr(packetizer, 'set_outbound_compressor')):
+        logging.warning(f"paramiko {paramiko.__version__} 中没有替换SSH压缩器所需的属性，"
+                        f"使用paramiko默认的压缩，不统计压缩效果")
+        return True
+    compression_info = dict(transport._compression_info)
+    for name in ('zlib', 'zlib@openssh.com'):
+        compression_info[name] = (lambda: SSHCompressor(stats), compression_info[name][1])
+    transport._compression_info = compression_info
+    current = packetizer._Packetizer__compress_engine_out
+    if current is not None:
+        compressor = SSHCompressor(stats)
+        compressor.z = current.z
+        packetizer.set_outbound_compressor(compressor)
+    return True
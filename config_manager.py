@@ -106,6 +106,23 @@ class ConfigManager:
         self.current_config['last_used_protocol'] = protocol
         self.save_config()
     
+    def get_max_active_transfers(self) -> int:
+        """获取所有任务合计的最大同时传输数"""
+        return int(self.current_config.get('max_active_transfers', 8))
+
+    def get_global_rate_limit(self) -> int:
+        """获取所有任务合计的上传限速（KB/s），0表示不限速"""
+        return int(self.current_config.get('global_rate_limit_kbps', 0))
+
+    def get_global_rate_schedule(self) -> str:
+        """获取全局限速的时间段计划，如 08:00-18:00=512"""
+        return self.current_config.get('global_rate_schedule', '')
+
+    def set_global_rate_limit(self, kbps: int) -> bool:
+        """设置所有任务合计的上传限速（KB/s）"""
+        self.current_config['global_rate_limit_kbps'] = int(kbps)
+        return self.save_config()
+
     def get_last_used_protocol(self) -> str:
         """获取最后使用的协议"""
         return self.current_config.get('last_used_protocol', 'SFTP')
@@ -0,0 +1,149 @@
+import time
+import errno
+import ftplib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import paramiko
+
+# 说明网络或套接字已不可用的errno
+NETWORK_ERRNOS = {errno.ENETDOWN, errno.ENETUNREACH, errno.EHOSTUNREACH, errno.ENOTCONN, errno.EBADF}
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """异常是否说明连接本身已不可用（传输层或协议错误）
+    
+    文件不存在、权限不足、SFTP_FAILURE等SFTP状态错误（paramiko抛出的IOError，
+    可能不带errno）和FTP 5xx应答等只是这一次操作失败，连接仍可继续使用。
+    """
+    if isinstance(error, (EOFError, ConnectionError, TimeoutError, paramiko.SSHException,
+                          paramiko.SFTPError, ftplib.error_temp, ftplib.error_reply, ftplib.error_proto)):
+        return True
+    if isinstance(error, OSError):
+        if error.errno in NETWORK_ERRNOS:
+            return True
+        # paramiko在通道已关闭时抛出不带errno的socket.error
+        return error.errno is None and str(error) == 'Socket is closed'
+    return False
+
+
+class ConnectionPool:
+    """通用连接池，复用空闲连接并回收损坏的连接"""
+
+    def __init__(self, factory: Callable[[], Any], max_size: int,
+                 validator: Optional[Callable[[Any], bool]] = None,
+                 closer: Optional[Callable[[Any], None]] = None,
+                 validate_after: float = 30.0):
+        """
+        factory: 创建一个新连接（已登录）
+        validator: 检查空闲连接是否仍然可用，空闲超过validate_after秒的连接在取出前检查
+        closer: 关闭连接
+        """
+        self.factory = factory
+        self.max_size = max(1, max_size)
+        self.validator = validator
+        self.closer = closer
+        self.validate_after = validate_after
+        self._idle: List[Tuple[Any, float]] = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def add(self, conn: Any):
+        """把已经创建好的连接放入池中（例如创建任务时用于测试的首个连接）"""
+        with self._cond:
+            self._created += 1
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """取出一个连接，没有空闲连接且已达上限时等待"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._created >= self.max_size:
+                    if self._closed:
+                        raise RuntimeError("连接池已关闭")
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("等待空闲连接超时")
+                    self._cond.wait(remaining)
+                if self._closed:
+                    raise RuntimeError("连接池已关闭")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    conn, last_used = None, 0.0
+                    self._created += 1
+
+            if conn is None:
+                try:
+                    return self.factory()
+                except Exception:
+                    with self._cond:
+                        self._created -= 1
+                        self._cond.notify()
+                    raise
+
+            # 长时间空闲的连接可能已被服务器断开，取出前检查
+            if self.validator and time.monotonic() - last_used > self.validate_after:
+                try:
+                    valid = self.validator(conn)
+                except Exception:
+                    valid = False
+                if not valid:
+                    logging.info("回收失效的连接")
+                    self._discard(conn)
+                    continue
+            return conn
+
+    def try_acquire(self) -> Optional[Any]:
+        """不等待地取出一个连接，没有空闲连接且已达上限时返回None"""
+        try:
+            return self.acquire(timeout=0)
+        except TimeoutError:
+            return None
+
+    def release(self, conn: Any, broken: bool = False):
+        """归还连接，损坏的连接会被关闭并从池中移除"""
+        if broken or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn: Any):
+        """关闭并丢弃一个连接"""
+        try:
+            if self.closer:
+                self.closer(conn)
+        except Exception:
+            pass
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """以上下文管理器的方式使用连接，出现连接层异常时视为连接损坏，其他异常照常归还连接"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except Exception as e:
+            self.release(conn, broken=is_connection_error(e))
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        """关闭池中所有空闲连接，正在使用的连接在归还时关闭"""
+        with self._cond:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
@@ -0,0 +1,326 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import hashlib
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from paramiko.sftp import CMD_EXTENDED, int64
+
+# 达到该大小的文件才保存块签名并尝试增量传输
+DELTA_MIN_SIZE = 4 * 1024 * 1024
+# 需要发送的字面数据超过文件大小的该比例时放弃增量传输，直接完整上传
+MAX_LITERAL_RATIO = 0.5
+# 连续不匹配超过该块数后不再逐字节滚动，改为按块跳跃查找，限制纯Python滚动的开销
+MAX_ROLLING_BLOCKS = 4
+
+_ADLER_MOD = 65521
+_STRONG_SIZE = 16
+_RECORD = struct.Struct(f'>I{_STRONG_SIZE}s')
+
+
+def choose_block_size(file_size: int) -> int:
+    """按文件大小选择块大小（约为文件大小的平方根，取2的幂，限制在16KB到1MB之间）"""
+    bits = max(1, int(file_size ** 0.5)).bit_length()
+    return 1 << max(14, min(20, bits))
+
+
+def _strong_hash(data) -> bytes:
+    """块的强校验值"""
+    return hashlib.blake2b(data, digest_size=_STRONG_SIZE).digest()
+
+
+class BlockSignature:
+    """文件的块签名：每个块的滚动校验值（adler32）和强校验值，以及签名对应的远程文件状态"""
+
+    def __init__(self, block_size: int, file_size: int, weak: List[int], strong: List[bytes],
+                 remote_size: int = -1, remote_mtime: int = -1):
+        self.block_size = block_size
+        self.file_size = file_size
+        self.weak = weak
+        self.strong = strong
+        self.remote_size = remote_size
+        self.remote_mtime = remote_mtime
+
+    @classmethod
+    def compute(cls, local_path: str, block_size: Optional[int] = None) -> 'BlockSignature':
+        """计算本地文件的块签名"""
+        file_size = os.path.getsize(local_path)
+        block_size = block_size or choose_block_size(file_size)
+        weak, strong = [], []
+        with open(local_path, 'rb') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                weak.append(zlib.adler32(block))
+                strong.append(_strong_hash(block))
+        return cls(block_size, file_size, weak, strong)
+
+    def matches_remote(self, remote_stat) -> bool:
+        """远程文件是否仍是生成签名时的版本"""
+        return (remote_stat.st_size == self.remote_size
+                and int(remote_stat.st_mtime or 0) == self.remote_mtime)
+
+    def save(self, file_path: str):
+        """保存签名：第一行为JSON头，之后是每个块的二进制记录"""
+        header = {
+            'block_size': self.block_size,
+            'file_size': self.file_size,
+            'remote_size': self.remote_size,
+            'remote_mtime': self.remote_mtime
+        }
+        temp_path = file_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            f.write(b''.join(_RECORD.pack(w, s) for w, s in zip(self.weak, self.strong)))
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> 'BlockSignature':
+        """加载签名"""
+        with open(file_path, 'rb') as f:
+            header = json.loads(f.readline().decode('utf-8'))
+            body = f.read()
+        weak, strong = [], []
+        for w, s in _RECORD.iter_unpack(body):
+            weak.append(w)
+            strong.append(s)
+        return cls(header['block_size'], header['file_size'], weak, strong,
+                   header['remote_size'], header['remote_mtime'])
+
+
+class SignatureStore:
+    """按远程路径保存最近一次同步版本的块签名"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, remote_path: str) -> str:
+        """签名文件路径"""
+        name = hashlib.md5(remote_path.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{name}.sig')
+
+    def load(self, remote_path: str) -> Optional[BlockSignature]:
+        """加载签名，不存在或损坏时返回None"""
+        path = self._path(remote_path)
+        if not os.path.exists(path):
+            return None
+        try:
+            return BlockSignature.load(path)
+        except Exception as e:
+            logging.warning(f"加载块签名失败: {str(e)}")
+            self.discard(remote_path)
+            return None
+
+    def save(self, remote_path: str, signature: BlockSignature):
+        """保存签名"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            signature.save(self._path(remote_path))
+        except Exception as e:
+            logging.warning(f"保存块签名失败: {str(e)}")
+
+    def rename(self, old_remote_path: str, new_remote_path: str):
+        """远程文件被移动后，签名随之改名"""
+        try:
+            os.replace(self._path(old_remote_path), self._path(new_remote_path))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"移动块签名失败: {str(e)}")
+
+    def discard(self, remote_path: str):
+        """删除签名（远程文件已删除或即将被原地修改）"""
+        try:
+            os.remove(self._path(remote_path))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"删除块签名失败: {str(e)}")
+
+
+class Delta:
+    """新文件相对于旧版本的差异：从旧文件复制的区段和需要发送的字面数据区段"""
+
+    def __init__(self, file_size: int):
+        self.file_size = file_size
+        # (旧文件偏移, 新文件偏移, 长度)
+        self.copies: List[Tuple[int, int, int]] = []
+        # (新文件偏移, 长度)
+        self.literals: List[Tuple[int, int]] = []
+
+    @property
+    def literal_bytes(self) -> int:
+        """需要发送的字节数"""
+        return sum(length for _, length in self.literals)
+
+    def is_in_place(self) -> bool:
+        """所有复制区段都在原位置，可以直接在远程文件上原地写入字面数据"""
+        return all(src == dst for src, dst, _ in self.copies)
+
+    def add_copy(self, src: int, dst: int, length: int):
+        """添加复制区段，与上一个连续的区段合并"""
+        if self.copies:
+            last_src, last_dst, last_length = self.copies[-1]
+            if last_src + last_length == src and last_dst + last_length == dst:
+                self.copies[-1] = (last_src, last_dst, last_length + length)
+                return
+        self.copies.append((src, dst, length))
+
+    def add_literal(self, dst: int, length: int):
+        """添加字面数据区段"""
+        if length > 0:
+            self.literals.append((dst, length))
+
+
+def compute_delta(local_path: str, signature: BlockSignature,
+                  max_literal_ratio: float = MAX_LITERAL_RATIO) -> Optional[Delta]:
+    """按rsync算法用滚动校验值在新文件中查找旧文件的块
+
+    字面数据超过max_literal_ratio时返回None，表示完整上传更划算。
+    """
+    block_size = signature.block_size
+    file_size = os.path.getsize(local_path)
+    delta = Delta(file_size)
+    if file_size == 0:
+        return delta
+
+    # 只有完整的块参与滚动匹配，末尾不足一块的部分单独比较
+    full_blocks = signature.file_size // block_size
+    table = {}
+    for index in range(full_blocks):
+        table.setdefault(signature.weak[index], []).append(index)
+    strong = signature.strong
+    literal_limit = file_size * max_literal_ratio
+
+    def find_block(weak: int, window) -> Optional[int]:
+        candidates = table.get(weak)
+        if not candidates:
+            return None
+        digest = _strong_hash(window)
+        for index in candidates:
+            if strong[index] == digest:
+                return index
+        return None
+
+    with open(local_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        pos = 0
+        literal_start = 0
+        literal_total = 0
+        last_window = file_size - block_size
+        while pos <= last_window:
+            weak = zlib.adler32(data[pos:pos + block_size])
+            index = find_block(weak, data[pos:pos + block_size])
+            if index is None and pos - literal_start < MAX_ROLLING_BLOCKS * block_size:
+                # 逐字节滚动查找，最多滚动一个块
+                a = weak & 0xffff
+                b = weak >> 16
+                stop = min(last_window, pos + block_size)
+                if stop == pos:
+                    # 已到最后一个窗口，剩余部分作为字面数据
+                    pos += 1
+                while pos < stop:
+                    out_byte = data[pos]
+                    in_byte = data[pos + block_size]
+                    a = (a - out_byte + in_byte) % _ADLER_MOD
+                    b = (b - block_size * out_byte + a - 1) % _ADLER_MOD
+                    pos += 1
+                    weak = (b << 16) | a
+                    if weak in table:
+                        index = find_block(weak, data[pos:pos + block_size])
+                        if index is not None:
+                            break
+            elif index is None:
+                # 长时间不匹配，按块跳跃查找重新对齐的内容
+                pos += block_size
+
+            if index is None:
+                if literal_total + pos - literal_start > literal_limit:
+                    return None
+                continue
+
+            delta.add_literal(literal_start, pos - literal_start)
+            literal_total += pos - literal_start
+            delta.add_copy(index * block_size, pos, block_size)
+            pos += block_size
+            literal_start = pos
+
+        # 末尾不足一块的部分与旧文件最后一个不完整块相同时也可复制
+        tail_length = signature.file_size - full_blocks * block_size
+        if (tail_length and literal_start == pos and file_size - pos == tail_length
+                and _strong_hash(data[pos:file_size]) == strong[full_blocks]):
+            delta.add_copy(full_blocks * block_size, pos, tail_length)
+            literal_start = file_size
+        delta.add_literal(literal_start, file_size - literal_start)
+        literal_total += file_size - literal_start
+
+    if literal_total > literal_limit:
+        return None
+    return delta
+
+
+def apply_in_place(sftp, local_path: str, remote_path: str, delta: Delta, buffer_size: int,
+                   throttle: Optional[Callable[[int], None]] = None):
+    """在远程文件上原地写入变化的区段，并截断到新文件大小"""
+    with open(local_path, 'rb') as local_file, sftp.open(remote_path, 'r+b') as remote_file:
+        old_size = remote_file.stat().st_size
+        remote_file.set_pipelined(True)
+        for dst, length in delta.literals:
+            _write_literal(local_file, remote_file, dst, length, buffer_size, throttle)
+        if old_size > delta.file_size:
+            remote_file.truncate(delta.file_size)
+
+
+def rebuild_remote(sftp, local_path: str, remote_path: str, temp_path: str, delta: Delta,
+                   buffer_size: int, throttle: Optional[Callable[[int], None]] = None):
+    """在远程临时文件中重建新文件：未变化的区段用copy-data扩展在服务器端从旧文件复制，
+    变化的区段从本地发送，完成后替换旧文件
+
+    服务器不支持copy-data扩展时抛出IOError。
+    """
+    operations = [(dst, 'copy', src, length) for src, dst, length in delta.copies]
+    operations += [(dst, 'literal', 0, length) for dst, length in delta.literals]
+    operations.sort()
+    with open(local_path, 'rb') as local_file, \
+            sftp.open(remote_path, 'rb') as old_file, \
+            sftp.open(temp_path, 'wb') as new_file:
+        new_file.set_pipelined(True)
+        for dst, kind, src, length in operations:
+            if kind == 'copy':
+                sftp._request(CMD_EXTENDED, 'copy-data', old_file.handle, int64(src), int64(length),
+                              new_file.handle, int64(dst))
+            else:
+                _write_literal(local_file, new_file, dst, length, buffer_size, throttle)
+    sftp.posix_rename(temp_path, remote_path)
+
+
+def copy_remote_file(sftp, source_path: str, target_path: str) -> int:
+    """用copy-data扩展在服务器端复制整个文件，返回复制的字节数
+
+    服务器不支持copy-data扩展时抛出IOError。
+    """
+    with sftp.open(source_path, 'rb') as source_file, sftp.open(target_path, 'wb') as target_file:
+        size = source_file.stat().st_size
+        if size:
+            sftp._request(CMD_EXTENDED, 'copy-data', source_file.handle, int64(0), int64(size),
+                          target_file.handle, int64(0))
+    return size
+
+
+def _write_literal(local_file, remote_file, offset: int, length: int, buffer_size: int,
+                   throttle: Optional[Callable[[int], None]] = None):
+    """把本地文件[offset, offset+length)写入远程文件的相同位置，throttle(字节数) 在每次写入前调用"""
+    local_file.seek(offset)
+    remote_file.seek(offset)
+    remaining = length
+    while remaining > 0:
+        data = local_file.read(min(buffer_size, remaining))
+        if not data:
+            break
+        if throttle:
+            throttle(len(data))
+        remote_file.write(data)
+        remaining -= len(data)
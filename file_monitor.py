@@ -1,67 +1,193 @@
 import os
 import sys
-import json
+import stat
 import hashlib
 import logging
 import time
 import queue
-from typing import Dict, Set, Tuple
+import threading
+import concurrent.futures
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 from multiprocessing import Process, Event, Queue, freeze_support
+from file_watcher import InotifyWatcher
+from state_index import STATE_DIR, FileRecord, StateIndex
+from fingerprint import DEFAULT_FINGERPRINT, get_fingerprint
+from monitor_ipc import EVENT_QUEUE_SIZE, ScanComplete, paginate_changes
+
+# 计算哈希时每次读取的字节数，缓冲区越大hashlib释放GIL的时间越长，多线程并行效果越好
+HASH_BUFFER_SIZE = 1024 * 1024
+# 待计算哈希的文件少于该数量时直接在当前线程计算
+PARALLEL_HASH_MIN_FILES = 8
+# 哈希计算进度的上报间隔（秒）
+HASH_PROGRESS_INTERVAL = 2.0
 
 class FileMonitor:
     """文件监控类，负责监控文件夹变化并计算文件哈希值"""
     
-    def __init__(self):
+    def __init__(self, hash_workers: int = 0, fingerprint: str = DEFAULT_FINGERPRINT):
         self.monitor_processes: Dict[str, Process] = {}
         self.stop_events: Dict[str, Event] = {}
+        # 日志文本和结构化事件（扫描完成、变化集合）分别通过两个队列发送
         self.log_queues: Dict[str, Queue] = {}
+        self.event_queues: Dict[str, Queue] = {}
+        # 增量扫描记录: 文件路径 -> (大小, mtime_ns, inode, 哈希值)
+        self.file_records: Dict[str, Tuple[int, int, int, str]] = {}
+        # 并行计算哈希的线程数，0表示按CPU核数自动选择
+        self.hash_workers = hash_workers or min(32, os.cpu_count() or 1)
+        # 哈希计算进度回调: (已完成文件数, 总文件数, 已完成字节数, 总字节数)
+        self.progress_callback: Optional[Callable[[int, int, int, int], None]] = None
+        # 判断文件内容是否变化所用的指纹算法
+        self.fingerprint = get_fingerprint(fingerprint)
+        # 每个哈希线程复用自己的读取缓冲区
+        self._thread_buffers = threading.local()
         
     def _calculate_file_hash(self, file_path: str) -> str:
-        """计算文件的SHA256哈希值"""
+        """按任务选择的指纹算法计算文件的哈希值"""
         try:
-            sha256_hash = hashlib.sha256()
-            with open(file_path, "rb") as f:
-                for byte_block in iter(lambda: f.read(4096), b""):
-                    sha256_hash.update(byte_block)
-            return sha256_hash.hexdigest()
+            buffer = getattr(self._thread_buffers, 'buffer', None)
+            if buffer is None:
+                buffer = self._thread_buffers.buffer = bytearray(HASH_BUFFER_SIZE)
+            return self.fingerprint.file(file_path, buffer)
         except Exception as e:
             return ""
 
-    def _scan_directory(self, directory: str) -> Dict[str, str]:
-        """扫描目录并计算所有文件的哈希值"""
-        file_hashes = {}
-        try:
-            for root, _, files in os.walk(directory):
-                for file in files:
-                    file_path = os.path.abspath(os.path.join(root, file))
-                    file_hash = self._calculate_file_hash(file_path)
-                    if file_hash:
-                        file_hashes[file_path] = file_hash
-        except Exception:
-            pass
-        return file_hashes
+    def _hash_files(self, files: List[Tuple[str, os.stat_result]]) -> Dict[str, Tuple[int, int, int, str]]:
+        """用线程池并行计算一批文件的哈希值，返回 文件路径 -> 记录
+        
+        大文件优先提交，避免最后只剩一个大文件在单线程上计算；读取失败的文件不出现在结果中。
+        """
+        files = sorted(files, key=lambda item: item[1].st_size, reverse=True)
+        total = len(files)
+        total_bytes = sum(file_stat.st_size for _, file_stat in files)
+        records = {}
+        done = 0
+        done_bytes = 0
+        last_report = time.monotonic()
+        reported = False
 
-    def _save_hashes(self, hashes: Dict[str, str], file_path: str):
-        """保存哈希值到JSON文件"""
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(hashes, f, indent=4, ensure_ascii=False)
-        except Exception:
-            pass
+        def collect(file_path: str, file_stat: os.stat_result, file_hash: str):
+            nonlocal done, done_bytes, last_report, reported
+            done += 1
+            done_bytes += file_stat.st_size
+            if file_hash:
+                records[file_path] = (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino, file_hash)
+            now = time.monotonic()
+            if self.progress_callback and (now - last_report >= HASH_PROGRESS_INTERVAL
+                                           or (reported and done == total)):
+                last_report = now
+                reported = True
+                self.progress_callback(done, total, done_bytes, total_bytes)
+
+        if self.hash_workers <= 1 or total < PARALLEL_HASH_MIN_FILES:
+            for file_path, file_stat in files:
+                collect(file_path, file_stat, self._calculate_file_hash(file_path))
+            return records
+
+        # 限制同时提交的任务数，避免百万级文件时一次性创建大量Future
+        window = self.hash_workers * 4
+        pending = {}
+        remaining = iter(files)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.hash_workers,
+                                                   thread_name_prefix='Hash') as executor:
+            while True:
+                for file_path, file_stat in remaining:
+                    future = executor.submit(self._calculate_file_hash, file_path)
+                    pending[future] = (file_path, file_stat)
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    break
+                finished, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    file_path, file_stat = pending.pop(future)
+                    collect(file_path, file_stat, future.result())
+        return records
+
+    def _walk_files(self, directory: str) -> Iterator[Tuple[str, os.stat_result]]:
+        """使用os.scandir遍历目录，逐个返回文件路径及其stat信息"""
+        pending = [directory]
+        while pending:
+            current_dir = pending.pop()
+            try:
+                with os.scandir(current_dir) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                            elif entry.is_file():
+                                yield entry.path, entry.stat()
+                        except OSError:
+                            continue
+            except OSError:
+                continue
 
-    def _load_hashes(self, file_path: str) -> Dict[str, str]:
-        """从JSON文件加载哈希值"""
+    def _scan_directory(self, directory: str, incremental: bool = False) -> Dict[str, str]:
+        """扫描目录并计算所有文件的哈希值
+        
+        增量模式下只对stat签名(大小、mtime_ns、inode)发生变化的文件重新计算哈希，
+        其余文件直接复用上一次扫描记录中的哈希值。
+        """
+        records = {}
+        to_hash = []
         try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            for file_path, file_stat in self._walk_files(os.path.abspath(directory)):
+                signature = (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+                record = self.file_records.get(file_path) if incremental else None
+                if record and record[:3] == signature:
+                    records[file_path] = record
+                else:
+                    to_hash.append((file_path, file_stat))
+            records.update(self._hash_files(to_hash))
         except Exception:
             pass
-        return {}
+        self.file_records = records
+        return {file_path: record[3] for file_path, record in records.items()}
+
+    def _rescan_paths(self, dirty_files: Set[str], dirty_dirs: Set[str],
+                      incremental: bool = True) -> Dict[str, str]:
+        """只重新检查事件涉及的文件和目录，其余文件沿用上一次的扫描记录"""
+        records = dict(self.file_records)
+
+        # 目录发生变化时，先移除该目录下的旧记录，再重新遍历
+        for dir_path in dirty_dirs:
+            prefix = dir_path + os.sep
+            for file_path in [p for p in records if p.startswith(prefix)]:
+                del records[file_path]
+            if dir_path in records:
+                del records[dir_path]
+            if os.path.isdir(dir_path):
+                for file_path, file_stat in self._walk_files(dir_path):
+                    dirty_files.add(file_path)
+
+        to_hash = []
+        for file_path in dirty_files:
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                records.pop(file_path, None)
+                continue
+            if not stat.S_ISREG(file_stat.st_mode):
+                records.pop(file_path, None)
+                continue
+            signature = (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+            record = self.file_records.get(file_path) if incremental else None
+            if record and record[:3] == signature:
+                records[file_path] = record
+                continue
+            # 读取失败的文件不保留旧记录
+            records.pop(file_path, None)
+            to_hash.append((file_path, file_stat))
+        records.update(self._hash_files(to_hash))
+
+        self.file_records = records
+        return {file_path: record[3] for file_path, record in records.items()}
 
     def _detect_changes(self, current_hashes: Dict[str, str], 
                        previous_hashes: Dict[str, str]) -> Tuple[Set[str], Set[str], Set[str]]:
-        """检测文件变化，返回新增、修改和删除的文件集合"""
+        """检测文件变化，返回新增、修改和删除的文件集合
+        
+        比较的是指纹算法的结果；采样指纹中包含文件大小和修改时间，只修改时间变化也视为修改。
+        """
         current_files = set(current_hashes.keys())
         previous_files = set(previous_hashes.keys())
         
@@ -82,17 +208,127 @@ class FileMonitor:
         
         return added_files, modified_files, deleted_files
 
-    def _get_hash_files(self, directory: str, remote_dir: str) -> Tuple[str, str]:
-        """获取指定目录的哈希值文件路径"""
+    def _detect_moves(self, added: Set[str], deleted: Set[str], current_hashes: Dict[str, str],
+                      previous_hashes: Dict[str, str]) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+        """把哈希值相同的删除文件和新增文件配对为移动，并从added和deleted中移除
+        
+        返回 (文件移动列表, 目录移动列表)。整个目录被移动时额外给出目录移动，
+        其中的文件移动仍保留在文件移动列表中，供目录移动失败时逐个处理。
+        指纹算法不能可靠区分内容时（strong为False）不配对，仍按删除加新增处理。
+        """
+        if not added or not deleted or not self.fingerprint.strong:
+            return [], []
+        deleted_by_hash: Dict[str, List[str]] = {}
+        for path in sorted(deleted):
+            deleted_by_hash.setdefault(previous_hashes[path], []).append(path)
+        
+        moves = []
+        for new_path in sorted(added):
+            candidates = deleted_by_hash.get(current_hashes.get(new_path))
+            if not candidates:
+                continue
+            # 同名文件优先配对
+            name = os.path.basename(new_path)
+            old_path = next((path for path in candidates if os.path.basename(path) == name), candidates[0])
+            candidates.remove(old_path)
+            moves.append((old_path, new_path))
+        for old_path, new_path in moves:
+            deleted.discard(old_path)
+            added.discard(new_path)
+        return moves, self._detect_directory_moves(moves, current_hashes, previous_hashes)
+
+    def _detect_directory_moves(self, moves: List[Tuple[str, str]], current_hashes: Dict[str, str],
+                                previous_hashes: Dict[str, str]) -> List[Tuple[str, str]]:
+        """找出可以合并为一次目录移动的文件移动"""
+        groups: Dict[Tuple[str, str], Set[str]] = {}
+        for old_path, new_path in moves:
+            old_parts = old_path.split(os.sep)
+            new_parts = new_path.split(os.sep)
+            # 去掉相同的末尾路径部分，剩下的前缀就是被移动的目录
+            common = 0
+            while (common < min(len(old_parts), len(new_parts)) - 1
+                   and old_parts[-1 - common] == new_parts[-1 - common]):
+                common += 1
+            if common == 0:
+                continue
+            old_root = os.sep.join(old_parts[:-common])
+            new_root = os.sep.join(new_parts[:-common])
+            groups.setdefault((old_root, new_root), set()).add(old_path)
+        
+        dir_moves = []
+        for (old_root, new_root), old_paths in groups.items():
+            old_prefix = old_root + os.sep
+            new_prefix = new_root + os.sep
+            if new_root.startswith(old_prefix) or old_root.startswith(new_prefix):
+                continue
+            # 旧目录中的文件必须全部移走，新目录在此之前不能存在文件
+            if any(path.startswith(old_prefix) for path in current_hashes):
+                continue
+            if any(path.startswith(new_prefix) for path in previous_hashes):
+                continue
+            if all(path in old_paths for path in previous_hashes if path.startswith(old_prefix)):
+                dir_moves.append((old_root, new_root))
+        return sorted(dir_moves)
+
+    def _get_index_file(self, directory: str, remote_dir: str) -> str:
+        """获取指定目录的状态索引文件路径"""
         # 结合本地和远程路径生成唯一标识
         path_hash = hashlib.md5(f"{directory}:{remote_dir}".encode()).hexdigest()
-        current_file = f'current_hashes_{path_hash}.json'
-        previous_file = f'previous_hashes_{path_hash}.json'
-        return current_file, previous_file
+        return os.path.join(STATE_DIR, f'index_{path_hash}.db')
+
+    def _remove_legacy_hash_files(self, directory: str, remote_dir: str):
+        """删除旧版本在工作目录中生成的JSON哈希值文件"""
+        path_hash = hashlib.md5(f"{directory}:{remote_dir}".encode()).hexdigest()
+        for file_path in (f'current_hashes_{path_hash}.json', f'previous_hashes_{path_hash}.json'):
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    logging.info(f"已删除旧的哈希值文件: {file_path}")
+            except OSError as e:
+                logging.warning(f"删除旧的哈希值文件失败: {str(e)}")
+
+    def get_indexed_records(self, directory: str, remote_dir: str) -> Dict[str, FileRecord]:
+        """读取状态索引中的全部记录（绝对路径 -> (大小, mtime_ns, inode, 哈希值)）"""
+        index_file = self._get_index_file(directory, remote_dir)
+        if not os.path.exists(index_file):
+            return {}
+        index = StateIndex(index_file, directory)
+        try:
+            return index.load()
+        finally:
+            index.close()
+
+    def get_indexed_files(self, directory: str, remote_dir: str) -> List[str]:
+        """读取状态索引中记录的所有文件（可在监控进程运行时从其他进程读取）"""
+        index_file = self._get_index_file(directory, remote_dir)
+        if not os.path.exists(index_file):
+            return []
+        index = StateIndex(index_file, directory)
+        try:
+            return list(index.paths())
+        finally:
+            index.close()
+
+    @staticmethod
+    def _put_event(event_queue: Queue, message, stop_event: Event) -> bool:
+        """发送一条事件，队列已满时等待同步端读取，收到停止请求时放弃并返回False"""
+        while not stop_event.is_set():
+            try:
+                event_queue.put(message, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
 
     @staticmethod
-    def _monitor_process(directory: str, remote_dir: str, stop_event: Event, log_queue: Queue, interval: int = 5):
+    def _monitor_process(directory: str, remote_dir: str, stop_event: Event, log_queue: Queue,
+                         event_queue: Queue, interval: int = 5, incremental: bool = True,
+                         monitor_mode: str = 'polling', hash_workers: int = 0,
+                         fingerprint: str = DEFAULT_FINGERPRINT):
         """监控进程的主函数"""
+        watcher = None
+        index = None
+        batch = 0
         try:
             # 设置进程级日志处理
             logging.basicConfig(level=logging.INFO)
@@ -100,46 +336,88 @@ class FileMonitor:
             log_queue.put_nowait(f"开始监控目录: {directory}")
             
             # 创建监控器实例
-            monitor = FileMonitor()
+            monitor = FileMonitor(hash_workers, fingerprint)
+            
+            def report_hash_progress(done: int, total: int, done_bytes: int, total_bytes: int):
+                log_queue.put_nowait(f"正在计算文件哈希: {done}/{total} 个文件, "
+                                     f"{done_bytes / 1024 / 1024:.0f}/{total_bytes / 1024 / 1024:.0f} MB")
+            monitor.progress_callback = report_hash_progress
             
-            # 获取该目录专用的哈希值文件
-            current_file, previous_file = monitor._get_hash_files(directory, remote_dir)
+            # 打开该目录专用的状态索引，载入上次的记录，未变化的文件无需重新计算哈希
+            monitor._remove_legacy_hash_files(directory, remote_dir)
+            index = StateIndex(monitor._get_index_file(directory, remote_dir), directory,
+                               monitor.fingerprint.name)
+            monitor.file_records = index.load()
             
-            # 初始化哈希值文件
-            initial_hashes = monitor._scan_directory(directory)
-            monitor._save_hashes(initial_hashes, current_file)
-            monitor._save_hashes(initial_hashes, previous_file)
+            # 事件模式下先建立监视点再做初始扫描，避免遗漏扫描期间的变化
+            if monitor_mode == 'event':
+                watcher = InotifyWatcher(directory)
+                if watcher.start():
+                    log_queue.put_nowait(f"已启用inotify事件监控: {directory}")
+                else:
+                    watcher = None
+                    log_queue.put_nowait("当前系统不支持inotify事件监控，改用定时轮询")
+            
+            # 以初始扫描结果作为比较基准
+            indexed_paths = set(monitor.file_records)
+            previous_hashes = monitor._scan_directory(directory, incremental)
+            # 程序停止期间删除的文件：索引中有而初始扫描中没有。新增和修改的文件由启动核对上传，
+            # 这里只发送删除；目录不存在（如未挂载）时不认为文件被删除
+            offline_deleted = indexed_paths - set(previous_hashes) if os.path.isdir(directory) else set()
+            if offline_deleted:
+                log_queue.put_nowait(f"检测到程序停止期间删除的文件: {len(offline_deleted)}个")
+                batch += 1
+                for page in paginate_changes(batch, directory, set(), set(), offline_deleted, [], []):
+                    if not FileMonitor._put_event(event_queue, page, stop_event):
+                        break
+            index.update(monitor.file_records)
+            # 通知同步端索引已就绪，可以与远程核对
+            FileMonitor._put_event(event_queue, ScanComplete(directory), stop_event)
             
             while not stop_event.is_set():
                 try:
-                    # 扫描当前状态
-                    current_hashes = monitor._scan_directory(directory)
-                    
-                    # 加载上次的哈希值
-                    previous_hashes = monitor._load_hashes(previous_file)
+                    if watcher:
+                        # 等待文件系统事件，只重新检查受影响的路径
+                        dirty_files, dirty_dirs, overflow = watcher.read_events(min(interval, 1))
+                        if overflow:
+                            # 事件队列溢出时无法得知丢失了哪些事件，重新遍历整个目录树
+                            # 并补齐监视点（增量模式下只需stat，不会重新读取未变化的文件）
+                            log_queue.put_nowait(f"inotify事件队列溢出，重新扫描目录: {directory}")
+                            watcher.add_watch_recursive(watcher.directory)
+                            current_hashes = monitor._scan_directory(directory, incremental)
+                        elif dirty_files or dirty_dirs:
+                            current_hashes = monitor._rescan_paths(dirty_files, dirty_dirs, incremental)
+                        else:
+                            continue
+                    else:
+                        # 扫描当前状态
+                        current_hashes = monitor._scan_directory(directory, incremental)
                     
-                    # 检测变化
+                    # 检测变化，内容相同的删除和新增文件视为移动
                     added, modified, deleted = monitor._detect_changes(current_hashes, previous_hashes)
+                    moved, moved_dirs = monitor._detect_moves(added, deleted, current_hashes, previous_hashes)
+                    
+                    # 如果有变化，分页发送变化集合，由同步端只处理这些文件
+                    if added or modified or deleted or moved:
+                        log_queue.put_nowait(f"检测到文件变化: 新增{len(added)}个, "
+                                             f"修改{len(modified)}个, 删除{len(deleted)}个, 移动{len(moved)}个")
+                        hashes, hash_prefix = None, ''
+                        if monitor.fingerprint.strong:
+                            # 附带内容指纹，同步端据此把相同内容的文件改为服务器端复制
+                            hashes, hash_prefix = current_hashes, monitor.fingerprint.name + ':'
+                        batch += 1
+                        for page in paginate_changes(batch, directory, added, modified, deleted,
+                                                     moved, moved_dirs, hashes, hash_prefix):
+                            if not FileMonitor._put_event(event_queue, page, stop_event):
+                                break
                     
-                    # 如果有变化，立即触发同步
-                    if added or modified or deleted:
-                        changes_info = {
-                            "added": list(added),
-                            "modified": list(modified),
-                            "deleted": list(deleted)
-                        }
-                        log_queue.put_nowait(f"检测到文件变化: {json.dumps(changes_info)}")
-                        
-                        # 立即更新哈希值文件并触发同步
-                        monitor._save_hashes(current_hashes, current_file)
-                        log_queue.put_nowait("SYNC_REQUIRED")  # 发送同步请求
-                        
-                        # 等待短暂时间后更新previous_file
-                        time.sleep(0.5)
-                        monitor._save_hashes(current_hashes, previous_file)
+                    previous_hashes = current_hashes
+                    # 只把变化的记录写入状态索引（包括仅stat签名变化的文件）
+                    index.update(monitor.file_records)
                     
                     # 等待下一次扫描
-                    time.sleep(interval)
+                    if not watcher:
+                        time.sleep(interval)
                     
                 except Exception as e:
                     logging.error(f"监控目录时发生错误: {str(e)}")
@@ -150,10 +428,18 @@ class FileMonitor:
             logging.error(f"监控进程发生错误: {str(e)}")
             log_queue.put_nowait(f"监控进程发生错误: {str(e)}")
         finally:
+            if watcher:
+                watcher.close()
+            if index:
+                index.close()
+            # 停止后未读取的事件已无意义，退出时不等待其写入队列
+            event_queue.cancel_join_thread()
             logging.info(f"停止监控目录: {directory}")
             log_queue.put_nowait(f"停止监控目录: {directory}")
 
-    def start_monitoring(self, directory: str, remote_dir: str, interval: int = 5):
+    def start_monitoring(self, directory: str, remote_dir: str, interval: int = 5, incremental: bool = True,
+                         monitor_mode: str = 'polling', hash_workers: int = 0,
+                         fingerprint: str = DEFAULT_FINGERPRINT):
         """开始监控指定目录"""
         if directory in self.monitor_processes:
             if self.monitor_processes[directory].is_alive():
@@ -167,11 +453,13 @@ class FileMonitor:
             # 创建新的事件和队列
             stop_event = Event()
             log_queue = Queue()
+            event_queue = Queue(EVENT_QUEUE_SIZE)
             
             # 创建并启动进程
             process = Process(
                 target=self._monitor_process,
-                args=(directory, remote_dir, stop_event, log_queue, interval),
+                args=(directory, remote_dir, stop_event, log_queue, event_queue, interval, incremental,
+                      monitor_mode, hash_workers, fingerprint),
                 daemon=True,
                 name=f"Monitor-{directory}"
             )
@@ -180,6 +468,7 @@ class FileMonitor:
             self.monitor_processes[directory] = process
             self.stop_events[directory] = stop_event
             self.log_queues[directory] = log_queue
+            self.event_queues[directory] = event_queue
             
             # 启动进程
             process.start()
@@ -225,6 +514,8 @@ class FileMonitor:
                         del self.stop_events[directory]
                     if directory in self.log_queues:
                         del self.log_queues[directory]
+                    if directory in self.event_queues:
+                        del self.event_queues[directory]
                     
                     logging.info(f"成功停止监控目录: {directory}")
                     
@@ -238,6 +529,7 @@ class FileMonitor:
             self.monitor_processes.clear()
             self.stop_events.clear()
             self.log_queues.clear()
+            self.event_queues.clear()
 
     def is_monitoring(self, directory: str) -> bool:
         """检查指定目录是否正在被监控"""
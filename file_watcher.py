@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+import struct
+import select
+import ctypes
+import ctypes.util
+import logging
+from typing import Dict, Set, Tuple
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF |
+              IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    """加载libc并检查inotify接口是否可用"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_init1.restype = ctypes.c_int
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_add_watch.restype = ctypes.c_int
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        libc.inotify_rm_watch.restype = ctypes.c_int
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class InotifyWatcher:
+    """基于Linux inotify的目录监视器，递归管理监视点并汇总变化路径"""
+
+    def __init__(self, directory: str):
+        self.directory = os.path.abspath(directory)
+        self.fd = -1
+        self.libc = None
+        self.watches: Dict[int, str] = {}
+
+    @staticmethod
+    def is_supported() -> bool:
+        """检查当前平台是否支持inotify"""
+        return _load_libc() is not None
+
+    def start(self) -> bool:
+        """初始化inotify并为整个目录树添加监视点"""
+        self.libc = _load_libc()
+        if self.libc is None:
+            return False
+
+        fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logging.error(f"inotify初始化失败: {os.strerror(ctypes.get_errno())}")
+            return False
+        self.fd = fd
+
+        try:
+            self.add_watch_recursive(self.directory)
+        except OSError as e:
+            logging.error(f"添加inotify监视点失败: {str(e)}")
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        """关闭inotify文件描述符并清理监视点"""
+        if self.fd >= 0:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+        self.fd = -1
+        self.watches.clear()
+
+    def _add_watch(self, path: str):
+        """为单个目录添加监视点"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            # 目录在遍历期间被删除属于正常情况，由后续事件处理
+            if errno in (2, 20):  # ENOENT, ENOTDIR
+                return
+            raise OSError(errno, os.strerror(errno), path)
+        self.watches[wd] = path
+
+    def add_watch_recursive(self, directory: str):
+        """递归为目录及其所有子目录添加监视点"""
+        pending = [directory]
+        while pending:
+            current_dir = pending.pop()
+            self._add_watch(current_dir)
+            try:
+                with os.scandir(current_dir) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def _remove_watch_tree(self, directory: str):
+        """移除目录及其子目录的监视点（目录被移出或删除时调用）"""
+        prefix = directory + os.sep
+        for wd, path in list(self.watches.items()):
+            if path == directory or path.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                self.watches.pop(wd, None)
+
+    def read_events(self, timeout: float, settle: float = 0.2,
+                    max_wait: float = 2.0) -> Tuple[Set[str], Set[str], bool]:
+        """等待并读取事件，返回(需要重新检查的文件, 需要重新扫描的目录, 是否发生队列溢出)
+
+        收到第一个事件后继续收集，直到连续settle秒没有新事件或累计等待超过max_wait秒，
+        以便把一次批量写入合并为一次处理。
+        """
+        dirty_files: Set[str] = set()
+        dirty_dirs: Set[str] = set()
+        overflow = False
+
+        if self.fd < 0:
+            return dirty_files, dirty_dirs, overflow
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return dirty_files, dirty_dirs, overflow
+
+        deadline = time.monotonic() + max_wait
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                data = b''
+            if data:
+                overflow = self._parse_events(data, dirty_files, dirty_dirs) or overflow
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([self.fd], [], [], min(settle, remaining))
+            if not readable:
+                break
+
+        return dirty_files, dirty_dirs, overflow
+
+    def _parse_events(self, data: bytes, dirty_files: Set[str], dirty_dirs: Set[str]) -> bool:
+        """解析原始事件数据，返回是否出现IN_Q_OVERFLOW"""
+        overflow = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+
+            parent = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if parent is None:
+                continue
+
+            if not name:
+                # 被监视目录自身被删除或移动
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    if parent == self.directory:
+                        overflow = True
+                    else:
+                        dirty_dirs.add(parent)
+                continue
+
+            path = os.path.join(parent, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # 新目录中的文件可能在添加监视点之前就已创建，需要整体扫描
+                    try:
+                        self.add_watch_recursive(path)
+                    except OSError as e:
+                        logging.warning(f"添加inotify监视点失败: {str(e)}")
+                        overflow = True
+                    dirty_dirs.add(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._remove_watch_tree(path)
+                    dirty_dirs.add(path)
+            else:
+                dirty_files.add(path)
+
+        return overflow
@@ -0,0 +1,127 @@
+import os
+import zlib
+import struct
+import hashlib
+import logging
+from typing import Dict
+
+# 默认的内容指纹算法
+DEFAULT_FINGERPRINT = 'sha256'
+# 采样指纹每个采样区段的大小
+SAMPLE_SIZE = 1024 * 1024
+
+
+class Fingerprint:
+    """内容指纹算法，用于判断文件内容是否变化
+
+    strong为False的算法不能可靠地区分内容不同的文件（校验和容易碰撞，或只读取部分内容），
+    只能用于检测变化，不能据此把不同路径的文件认定为同一内容（移动、服务器端复制）。
+    """
+
+    name = ''
+    label = ''
+    strong = True
+
+    def new(self):
+        """创建一个增量计算对象（提供update和hexdigest）"""
+        raise NotImplementedError
+
+    def file(self, file_path: str, buffer: bytearray) -> str:
+        """计算文件指纹，buffer为复用的读取缓冲区"""
+        hasher = self.new()
+        view = memoryview(buffer)
+        with open(file_path, 'rb', buffering=0) as f:
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                hasher.update(view[:size])
+        return hasher.hexdigest()
+
+
+class Sha256Fingerprint(Fingerprint):
+    """SHA-256"""
+
+    name = 'sha256'
+    label = 'SHA-256'
+
+    def new(self):
+        return hashlib.sha256()
+
+
+class Blake2bFingerprint(Fingerprint):
+    """BLAKE2b（128位摘要），在没有SHA硬件指令的64位CPU上比SHA-256快"""
+
+    name = 'blake2b'
+    label = 'BLAKE2b'
+
+    def new(self):
+        return hashlib.blake2b(digest_size=16)
+
+
+class _Crc32:
+    """CRC32增量计算对象，摘要中同时包含数据长度以降低碰撞概率"""
+
+    def __init__(self):
+        self.crc = 0
+        self.length = 0
+
+    def update(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.length += len(data)
+
+    def hexdigest(self) -> str:
+        return f'{self.crc:08x}{self.length:016x}'
+
+
+class Crc32Fingerprint(Fingerprint):
+    """CRC32校验和（zlib实现），速度最快，仅用于检测变化"""
+
+    name = 'crc32'
+    label = 'CRC32'
+    # 32位校验和在大量文件中容易碰撞
+    strong = False
+
+    def new(self):
+        return _Crc32()
+
+
+class SampledFingerprint(Fingerprint):
+    """采样指纹：只读取文件开头、中间和末尾各一段，适合超大的媒体文件
+
+    较小的文件仍完整计算BLAKE2b。文件大小和修改时间计入指纹，修改时间变化即视为文件已修改。
+    """
+
+    name = 'sampled'
+    label = '采样(大小+修改时间+首/中/尾)'
+    strong = False
+
+    def new(self):
+        return hashlib.blake2b(digest_size=16)
+
+    def file(self, file_path: str, buffer: bytearray) -> str:
+        with open(file_path, 'rb', buffering=0) as f:
+            file_stat = os.fstat(f.fileno())
+            if file_stat.st_size <= 3 * SAMPLE_SIZE:
+                return super().file(file_path, buffer)
+            hasher = self.new()
+            hasher.update(struct.pack('>QQ', file_stat.st_size, file_stat.st_mtime_ns))
+            for offset in (0, (file_stat.st_size - SAMPLE_SIZE) // 2, file_stat.st_size - SAMPLE_SIZE):
+                f.seek(offset)
+                hasher.update(f.read(SAMPLE_SIZE))
+            return hasher.hexdigest()
+
+
+FINGERPRINTS: Dict[str, Fingerprint] = {
+    fingerprint.name: fingerprint
+    for fingerprint in (Sha256Fingerprint(), Blake2bFingerprint(), Crc32Fingerprint(), SampledFingerprint())
+}
+
+
+def get_fingerprint(name: str) -> Fingerprint:
+    """按名称获取指纹算法，未知名称时使用默认算法"""
+    fingerprint = FINGERPRINTS.get(name)
+    if fingerprint is None:
+        logging.warning(f"未知的指纹算法: {name}，使用{DEFAULT_FINGERPRINT}")
+        fingerprint = FINGERPRINTS[DEFAULT_FINGERPRINT]
+    return fingerprint
@@ -1,6 +1,7 @@
 from .main_window import MainWindow
 from .task_dialog import TaskDialog
+from .sync_worker import SyncWorker
 import queue
 
 
-__all__ = ['MainWindow', 'TaskDialog']
+__all__ = ['MainWindow', 'TaskDialog', 'SyncWorker']
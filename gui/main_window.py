@@ -1,10 +1,10 @@
 import os
 import uuid
-import time
-import json
 import logging
 from PyQt5 import QtWidgets, QtGui, QtCore
 from .task_dialog import TaskDialog
+from .sync_worker import SyncWorker
+from monitor_ipc import ChangePage, ScanComplete, decode_change_page
 from typing import Dict, Set
 import queue
 class MainWindow(QtWidgets.QMainWindow):
@@ -17,6 +17,13 @@ class MainWindow(QtWidgets.QMainWindow):
         self.sync_manager = sync_manager
         self.active_tasks: Dict[str, dict] = {}
         self.task_timers: Dict[str, QtCore.QTimer] = {}
+        self.sync_workers: Dict[str, SyncWorker] = {}
+        # 已请求停止、正在完成当前传输的同步线程，线程结束后关闭连接
+        self.stopping_workers: Dict[str, SyncWorker] = {}
+        # 退出程序时等待所有同步线程结束后再退出
+        self.quitting = False
+        # 同步队列已满时暂存的变化集合，等待下次检查时再提交
+        self.pending_changes: Dict[str, dict] = {}
         
         # 创建系统托盘
         self.tray_icon = None
@@ -208,6 +215,10 @@ class MainWindow(QtWidgets.QMainWindow):
         # 允许自动换行显示
         self.task_list.setWordWrap(True)
         self.task_list.verticalHeader().setDefaultAlignment(QtCore.Qt.AlignTop)
+        
+        # 右键菜单
+        self.task_list.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.task_list.customContextMenuRequested.connect(self.show_task_context_menu)
         layout.addWidget(self.task_list)
         
         # 创建底部按钮布局
@@ -349,6 +360,25 @@ class MainWindow(QtWidgets.QMainWindow):
         
         self.task_list.setCellWidget(row, 5, button_widget)
     
+    def show_task_context_menu(self, pos: QtCore.QPoint):
+        """显示任务右键菜单"""
+        row = self.task_list.rowAt(pos.y())
+        tasks = self.config_manager.get_sync_tasks()
+        if row < 0 or row >= len(tasks):
+            return
+        task = tasks[row]
+        
+        menu = QtWidgets.QMenu(self)
+        full_sync_action = menu.addAction("全量同步")
+        full_sync_action.setEnabled(task['id'] in self.active_tasks)
+        full_sync_action.triggered.connect(lambda: self.full_sync_task(task))
+        menu.addSeparator()
+        rate_limit_action = menu.addAction("上传限速...")
+        rate_limit_action.triggered.connect(lambda: self.set_task_rate_limit(task))
+        global_rate_limit_action = menu.addAction("全局限速...")
+        global_rate_limit_action.triggered.connect(lambda: self.set_global_rate_limit())
+        menu.exec_(self.task_list.viewport().mapToGlobal(pos))
+    
     def load_tasks(self):
         """从配置加载任务并自动启动"""
         tasks = self.config_manager.get_sync_tasks()
@@ -449,58 +479,39 @@ class MainWindow(QtWidgets.QMainWindow):
             # 如果任务已经在运行，直接返回成功
             if task['id'] in self.active_tasks:
                 return True
+            
+            # 上次停止的同步线程仍在使用该任务的连接
+            if task['id'] in self.stopping_workers:
+                if show_message:
+                    QtWidgets.QMessageBox.information(
+                        self, "提示", f"任务 \"{task['name']}\" 正在停止，请稍后再启动")
+                return False
                 
             # 创建连接
             if not self.sync_manager.create_connection(task['id'], task):
                 raise Exception("无法创建连接")
             
-            # 设置回调函数
-            def sync_callback(directory: str, added: set, modified: set, deleted: set):
-                try:
-                    # 处理新增和修改的文件
-                    for local_path in added | modified:
-                        # 计算相对路径并规范化远程路径
-                        relative_path = os.path.relpath(local_path, directory)
-                        remote_path = os.path.normpath(os.path.join(task['remote_dir'], relative_path))
-                        # 转换为Unix风格路径
-                        remote_path = remote_path.replace('\\', '/')
-                        # 确保路径以/开头
-                        if not remote_path.startswith('/'):
-                            remote_path = '/' + remote_path
-                        
-                        # 同步文件并验证
-                        success = self.sync_manager.sync_file(task['id'], local_path, remote_path, 'upload')
-                        if success:
-                            # 验证远程文件
-                            if self.sync_manager.verify_remote_file(task['id'], local_path, remote_path):
-                                logging.info(f"同步文件成功并验证: {local_path} -> {remote_path}")
-                            else:
-                                logging.error(f"文件同步验证失败: {local_path} -> {remote_path}")
-                                success = False
-                        else:
-                            logging.error(f"同步文件失败: {local_path} -> {remote_path}")
-                    
-                    # 处理删除的文件
-                    for local_path in deleted:
-                        relative_path = os.path.relpath(local_path, directory)
-                        remote_path = os.path.normpath(os.path.join(task['remote_dir'], relative_path))
-                        remote_path = remote_path.replace('\\', '/')
-                        if not remote_path.startswith('/'):
-                            remote_path = '/' + remote_path
-                        success = self.sync_manager.sync_file(task['id'], '', remote_path, 'delete')
-                        if success:
-                            logging.info(f"删除远程文件成功: {remote_path}")
-                        else:
-                            logging.error(f"删除远程文件失败: {remote_path}")
-                except Exception as e:
-                    logging.error(f"同步回调执行失败: {str(e)}")
-            
             # 开始监控，使用配置的扫描间隔
-            if self.file_monitor.start_monitoring(task['local_dir'], task['remote_dir'], task.get('scan_interval', 5)):
+            if self.file_monitor.start_monitoring(task['local_dir'], task['remote_dir'],
+                                                  task.get('scan_interval', 5),
+                                                  task.get('incremental_scan', True),
+                                                  task.get('monitor_mode', 'polling'),
+                                                  task.get('hash_workers', 0),
+                                                  task.get('hash_algorithm', 'sha256')):
                 self.active_tasks[task['id']] = task
                 # 移除启动提示弹窗
                 logging.info(f"任务 \"{task['name']}\" 已启动")
                 
+                # 启动后台同步线程，所有传输都在该线程中执行
+                worker = SyncWorker(task, self.sync_manager, self.file_monitor)
+                worker.progress.connect(self._on_sync_progress)
+                worker.job_finished.connect(self._on_sync_finished)
+                worker.start()
+                self.sync_workers[task['id']] = worker
+                replayed = worker.replay_journal()
+                if replayed:
+                    logging.info(f"任务 \"{task['name']}\" 有{replayed}个上次未完成的操作，将重新执行")
+                
                 # 启动定时器检查日志队列
                 timer = QtCore.QTimer(self)
                 timer.timeout.connect(lambda: self._check_task_logs(task))
@@ -518,126 +529,144 @@ class MainWindow(QtWidgets.QMainWindow):
                 f"启动任务失败: {str(e)}"
             )
             # 清理连接
-            self.sync_manager.close_connection(task['id'])
+            self.sync_manager.close_connection(task['id'], wait=False)
             return False
     
     def _check_task_logs(self, task: dict):
-        """检查任务的日志队列"""
+        """检查任务的日志队列和监控事件队列"""
         try:
             log_queue = self.file_monitor.log_queues.get(task['local_dir'])
             if log_queue:
+                try:
+                    while True:
+                        logging.info(log_queue.get_nowait())
+                except queue.Empty:
+                    pass
+            
+            # 先提交上次因同步队列已满而暂存的变化集合
+            pending = self.pending_changes.pop(task['id'], None)
+            if pending and not self._handle_file_changes(task, pending):
+                return
+            
+            event_queue = self.file_monitor.event_queues.get(task['local_dir'])
+            if event_queue:
                 try:
                     while True:
                         try:
-                            message = log_queue.get_nowait()
-                            if message == "SYNC_REQUIRED":
-                                # 处理同步请求
-                                self._sync_task_changes(task)
-                            else:
-                                self._handle_file_changes_from_log(task, message)
+                            message = event_queue.get_nowait()
                         except queue.Empty:
                             break
+                        if isinstance(message, ChangePage):
+                            # 监控进程分页发送的变化集合，每页单独提交
+                            if not self._handle_file_changes(task, decode_change_page(message)):
+                                # 同步队列已满，停止读取，剩余页留在监控队列中
+                                break
+                        elif isinstance(message, ScanComplete):
+                            self._reconcile_task(task)
                 except Exception as e:
-                    logging.error(f"处理日志消息失败: {str(e)}")
+                    logging.error(f"处理监控事件失败: {str(e)}")
         except Exception as e:
             logging.error(f"检查任务日志失败: {str(e)}")
             
-    def _sync_task_changes(self, task: dict):
-        """同步任务的文件变化"""
-        try:
-            # 获取哈希值文件
-            current_file, _ = self.file_monitor._get_hash_files(task['local_dir'], task['remote_dir'])
-            
-            # 加载当前哈希值
-            with open(current_file, 'r', encoding='utf-8') as f:
-                current_hashes = json.load(f)
-                
-            # 同步所有文件
-            for local_path, _ in current_hashes.items():
-                # 计算相对路径并规范化远程路径
-                relative_path = os.path.relpath(local_path, task['local_dir'])
-                remote_path = os.path.normpath(os.path.join(task['remote_dir'], relative_path))
-                remote_path = remote_path.replace('\\', '/')
-                if not remote_path.startswith('/'):
-                    remote_path = '/' + remote_path
-                    
-                # 同步文件并验证
-                success = self.sync_manager.sync_file(task['id'], local_path, remote_path, 'upload')
-                if success:
-                    if self.sync_manager.verify_remote_file(task['id'], local_path, remote_path):
-                        logging.info(f"同步文件成功并验证: {local_path} -> {remote_path}")
-                    else:
-                        logging.error(f"文件同步验证失败: {local_path} -> {remote_path}")
-                else:
-                    logging.error(f"同步文件失败: {local_path} -> {remote_path}")
-                    
-        except Exception as e:
-            logging.error(f"同步任务变化失败: {str(e)}")
+    def full_sync_task(self, task: dict):
+        """全量同步任务：上传当前索引中的所有文件，仅由用户明确触发"""
+        worker = self.sync_workers.get(task['id'])
+        if worker is None:
+            return
+        if not worker.request_full_sync():
+            logging.warning(f"任务 \"{task['name']}\" 同步队列已满，请稍后再试")
     
-    def _handle_file_changes_from_log(self, task: dict, message: str):
-        """从日志消息中解析并处理文件变化"""
-        try:
-            if "检测到文件变化" in message:
-                # 解析JSON格式的变化信息
-                start = message.find("{")
-                end = message.rfind("}")
-                if start != -1 and end != -1:
-                    changes_json = message[start:end+1]
-                    changes = json.loads(changes_json)
-                    
-                    # 处理文件变化
-                    self._handle_file_changes(task, 
-                        set(changes.get("added", [])),
-                        set(changes.get("modified", [])),
-                        set(changes.get("deleted", [])))
-            else:
-                # 记录其他类型的���志消息
-                logging.info(message)
-        except json.JSONDecodeError as e:
-            logging.error(f"解析日志消息失败: {str(e)}")
-        except Exception as e:
-            logging.error(f"处理文件变化日志失败: {str(e)}")
+    def set_task_rate_limit(self, task: dict):
+        """调整任务的上传限速，任务运行中时立即生效"""
+        kbps, ok = QtWidgets.QInputDialog.getInt(
+            self, "上传限速", f"任务 \"{task['name']}\" 的上传限速(KB/s)，0表示不限速:",
+            int(task.get('rate_limit_kbps', 0)), 0, 10 * 1024 * 1024)
+        if not ok:
+            return
+        task['rate_limit_kbps'] = kbps
+        self.config_manager.update_sync_task(task['id'], task)
+        if task['id'] in self.active_tasks:
+            self.sync_manager.rate_limiter.set_task_limit(task['id'], kbps)
+        logging.info(f"任务 \"{task['name']}\" 上传限速设置为 {kbps} KB/s")
     
-    def _handle_file_changes(self, task: dict, added: Set[str], modified: Set[str], deleted: Set[str]):
-        """处理文件变化"""
-        try:
-            # 处理新增和修改的文件
-            for local_path in added | modified:
-                # 计算相对路径并规范化远程路径
-                relative_path = os.path.relpath(local_path, task['local_dir'])
-                remote_path = os.path.normpath(os.path.join(task['remote_dir'], relative_path))
-                # 转换为Unix风格路径
-                remote_path = remote_path.replace('\\', '/')
-                # 确保路径以/开头
-                if not remote_path.startswith('/'):
-                    remote_path = '/' + remote_path
-                
-                # 同步文件并验证
-                success = self.sync_manager.sync_file(task['id'], local_path, remote_path, 'upload')
-                if success:
-                    # 验证远程文件
-                    if self.sync_manager.verify_remote_file(task['id'], local_path, remote_path):
-                        logging.info(f"同步文件成功并验证: {local_path} -> {remote_path}")
-                    else:
-                        logging.error(f"文件同步验证失败: {local_path} -> {remote_path}")
-                else:
-                    logging.error(f"同步文件失败: {local_path} -> {remote_path}")
-            
-            # 处理删除的文件
-            for local_path in deleted:
-                relative_path = os.path.relpath(local_path, task['local_dir'])
-                remote_path = os.path.normpath(os.path.join(task['remote_dir'], relative_path))
-                remote_path = remote_path.replace('\\', '/')
-                if not remote_path.startswith('/'):
-                    remote_path = '/' + remote_path
-                success = self.sync_manager.sync_file(task['id'], '', remote_path, 'delete')
-                if success:
-                    logging.info(f"删除远程文件成功: {remote_path}")
-                else:
-                    logging.error(f"删除远程文件失败: {remote_path}")
-                    
-        except Exception as e:
-            logging.error(f"处理文件变化失败: {str(e)}")
+    def set_global_rate_limit(self):
+        """调整所有任务合计的上传限速，立即生效"""
+        kbps, ok = QtWidgets.QInputDialog.getInt(
+            self, "全局限速", "所有任务合计的上传限速(KB/s)，0表示不限速:",
+            self.config_manager.get_global_rate_limit(), 0, 10 * 1024 * 1024)
+        if not ok:
+            return
+        self.config_manager.set_global_rate_limit(kbps)
+        self.sync_manager.rate_limiter.set_global_limit(kbps)
+        logging.info(f"全局上传限速设置为 {kbps} KB/s")
+    
+    def _reconcile_task(self, task: dict):
+        """初始扫描完成后与远程核对，补传远程缺少或不一致的文件"""
+        worker = self.sync_workers.get(task['id'])
+        if worker is None or not task.get('startup_reconcile', True):
+            return
+        if not worker.request_reconcile():
+            logging.warning(f"任务 \"{task['name']}\" 同步队列已满，跳过启动核对")
+    
+    def _handle_file_changes(self, task: dict, changes: dict) -> bool:
+        """将变化集合提交给后台同步线程，同步队列已满时暂存并返回False"""
+        worker = self.sync_workers.get(task['id'])
+        if worker is None:
+            return True
+        if worker.submit_changes(set(changes.get('added', [])),
+                                 set(changes.get('modified', [])),
+                                 set(changes.get('deleted', [])),
+                                 [tuple(pair) for pair in changes.get('moved', [])],
+                                 [tuple(pair) for pair in changes.get('moved_dirs', [])],
+                                 changes.get('hashes')):
+            return True
+        self.pending_changes[task['id']] = changes
+        return False
+    
+    def _on_sync_progress(self, task_id: str, done: int, total: int):
+        """在状态列显示后台同步进度"""
+        row = self._find_task_row(task_id)
+        if row < 0 or task_id not in self.active_tasks:
+            return
+        status = "运行中" if done >= total else f"同步中 {done}/{total}"
+        status_item = self.task_list.item(row, 4)
+        if status_item is not None:
+            status_item.setText(status)
+    
+    def _on_sync_finished(self, task_id: str, stats: dict):
+        """在状态列的提示中显示任务的累计传输统计和调度情况"""
+        row = self._find_task_row(task_id)
+        totals = self.sync_manager.task_stats.get(task_id)
+        status_item = self.task_list.item(row, 4) if row >= 0 else None
+        if status_item is None or not totals:
+            return
+        tooltip = (f"已上传 {totals.get('uploaded', 0)} 个, 删除 {totals.get('deleted', 0)} 个, "
+                   f"移动 {totals.get('moved', 0)} 个, 失败 {totals.get('failed', 0)} 个\n"
+                   f"服务器端复制 {totals.get('deduplicated', 0)} 个, "
+                   f"节省流量 {totals.get('bytes_saved', 0) / 1024 / 1024:.1f} MB")
+        metrics = self.sync_manager.scheduler.metrics().get(task_id)
+        if metrics:
+            tooltip += (f"\n调度: 排队 {metrics['waiting']} 个, 传输中 {metrics['active']} 个, "
+                        f"平均等待 {metrics['avg_wait']:.1f} 秒, 最长等待 {metrics['max_wait']:.1f} 秒")
+        compression = self.sync_manager.compression_stats.get(task_id)
+        if compression is not None:
+            snapshot = compression.snapshot()
+            tooltip += (f"\n压缩: {snapshot['raw_bytes'] / 1024 / 1024:.1f} MB -> "
+                        f"{snapshot['wire_bytes'] / 1024 / 1024:.1f} MB ({snapshot['ratio']:.0%}), "
+                        f"CPU {snapshot['cpu_seconds']:.1f} 秒, "
+                        f"压缩 {snapshot['compressed_files']} 个, 跳过 {snapshot['skipped_files']} 个")
+        task_rate, global_rate = self.sync_manager.rate_limiter.current_rates(task_id)
+        if task_rate or global_rate:
+            tooltip += (f"\n限速: 任务 {task_rate or '不限'} KB/s, "
+                        f"全局 {global_rate or '不限'} KB/s")
+        status_item.setToolTip(tooltip)
+    
+    def _find_task_row(self, task_id: str) -> int:
+        """查找任务在表格中的行号"""
+        for row, task in enumerate(self.config_manager.get_sync_tasks()):
+            if task['id'] == task_id:
+                return row if row < self.task_list.rowCount() else -1
+        return -1
     
     def stop_task(self, task: dict) -> bool:
         """停止同步任务"""
@@ -649,11 +678,15 @@ class MainWindow(QtWidgets.QMainWindow):
             # 停止文件监控
             self.file_monitor.stop_monitoring(task['local_dir'])
             
-            # 等待进程完全停止
-            time.sleep(1)
-            
-            # 关闭连接
-            self.sync_manager.close_connection(task['id'])
+            # 请求停止后台同步线程，当前文件传输完成后线程结束，再在界面线程中关闭连接
+            worker = self.sync_workers.pop(task['id'], None)
+            self.pending_changes.pop(task['id'], None)
+            if worker is not None:
+                self.stopping_workers[task['id']] = worker
+                worker.finished.connect(lambda: self._on_worker_stopped(task))
+                worker.stop()
+            else:
+                self.sync_manager.close_connection(task['id'], wait=False)
             
             # 停止并清理定时器
             if task['id'] in self.task_timers:
@@ -664,7 +697,7 @@ class MainWindow(QtWidgets.QMainWindow):
             # 从活动任务中移除
             del self.active_tasks[task['id']]
             
-            logging.info(f"任务 \"{task['name']}\" 已停止")
+            logging.info(f"任务 \"{task['name']}\" 正在停止")
             return True
             
         except Exception as e:
@@ -675,6 +708,16 @@ class MainWindow(QtWidgets.QMainWindow):
             )
             return False
     
+    def _on_worker_stopped(self, task: dict):
+        """同步线程结束后关闭任务的连接，传输线程都已空闲，关闭时不等待"""
+        worker = self.stopping_workers.pop(task['id'], None)
+        if worker is not None:
+            worker.deleteLater()
+        self.sync_manager.close_connection(task['id'], wait=False)
+        logging.info(f"任务 \"{task['name']}\" 已停止")
+        if self.quitting and not self.stopping_workers:
+            QtWidgets.QApplication.quit()
+    
     def tray_icon_activated(self, reason):
         """处理托盘图标点击事件"""
         if reason == QtWidgets.QSystemTrayIcon.Trigger:
@@ -686,10 +729,10 @@ class MainWindow(QtWidgets.QMainWindow):
     
     def quit_app(self):
         """完全退出应用程序"""
-        # 停止所有任务并等待它们完全停止
+        # 停止所有任务，同步线程都结束后再退出
+        self.quitting = True
         for task in list(self.active_tasks.values()):
             self.stop_task(task)
-            time.sleep(1)  # 确保每个任务都有足够时间完全停止
         
         # 清理所有定时器
         for timer in self.task_timers.values():
@@ -697,8 +740,9 @@ class MainWindow(QtWidgets.QMainWindow):
             timer.deleteLater()
         self.task_timers.clear()
         
-        # 退出应用
-        QtWidgets.QApplication.quit()
+        # 没有正在停止的同步线程时直接退出，否则由最后一个线程结束时退出
+        if not self.stopping_workers:
+            QtWidgets.QApplication.quit()
     
     def closeEvent(self, event: QtGui.QCloseEvent):
         """窗口关闭事件"""
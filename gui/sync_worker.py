@@ -0,0 +1,197 @@
+import os
+import time
+import queue
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from PyQt5 import QtCore
+from change_coalescer import ChangeCoalescer
+from state_index import STATE_DIR
+from transfer_journal import JournalKey, TransferJournal, change_keys, replay_changes
+
+
+class SyncWorker(QtCore.QThread):
+    """任务同步工作线程，所有传输操作都在该线程中执行，通过信号向界面报告进度"""
+
+    # 任务ID, 已完成数量, 总数量
+    progress = QtCore.pyqtSignal(str, int, int)
+    # 任务ID, 传输统计
+    job_finished = QtCore.pyqtSignal(str, dict)
+
+    def __init__(self, task: dict, sync_manager, file_monitor, max_pending_jobs: int = 64,
+                 max_pending_paths: int = 100000, parent=None):
+        super().__init__(parent)
+        self.task = task
+        self.sync_manager = sync_manager
+        self.file_monitor = file_monitor
+        # 有界任务队列，队列满时由调用方暂停读取监控消息，形成背压
+        self.jobs = queue.Queue(maxsize=max_pending_jobs)
+        # 持久化操作日志，程序被终止后重新启动时重放未完成的操作
+        self.journal = TransferJournal(os.path.join(STATE_DIR, f"journal_{task['id']}.log"))
+        # 变化合并窗口，等待文件静默后再同步；等待时间为0时不合并
+        debounce = float(task.get('debounce_seconds', 2))
+        self.coalescer = (ChangeCoalescer(debounce, on_rewrite=self._on_coalescer_rewrite)
+                          if debounce > 0 else None)
+        self.max_pending_paths = max_pending_paths
+        # 本地路径 -> 内容指纹，同步时用于服务器端复制去重
+        self.content_hashes: Dict[str, str] = {}
+        self._hashes_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._last_progress_emit = 0.0
+
+    def submit_changes(self, added: Set[str], modified: Set[str], deleted: Set[str],
+                       moved: Optional[List[Tuple[str, str]]] = None,
+                       moved_dirs: Optional[List[Tuple[str, str]]] = None,
+                       hashes: Optional[Dict[str, str]] = None) -> bool:
+        """提交一个变化集合，队列已满时返回False"""
+        moved = moved or []
+        moved_dirs = moved_dirs or []
+        if self.coalescer is not None and len(self.coalescer) >= self.max_pending_paths:
+            return False
+        with self._hashes_lock:
+            for path in deleted:
+                self.content_hashes.pop(path, None)
+            self.content_hashes.update(hashes or {})
+        self.journal.queue(change_keys(added | modified, deleted, moved, moved_dirs))
+        if self.coalescer is not None:
+            self.coalescer.add_moves(moved, moved_dirs)
+            self.coalescer.add(added, modified, deleted)
+            return True
+        try:
+            self.jobs.put_nowait(('changes', added, modified, deleted, moved, moved_dirs))
+            return True
+        except queue.Full:
+            return False
+
+    def _on_coalescer_rewrite(self, discarded: List[JournalKey], queued: List[JournalKey]):
+        """合并窗口丢弃（如临时文件）或改写（如移动改为上传）已排队的操作时更新操作日志"""
+        self.journal.complete(discarded)
+        self.journal.queue(queued)
+
+    def replay_journal(self) -> int:
+        """把操作日志中上次未完成的操作加入队列，返回操作数量"""
+        pending = list(self.journal.pending())
+        if not pending:
+            return 0
+        try:
+            self.jobs.put_nowait(('replay', pending))
+        except queue.Full:
+            return 0
+        return len(pending)
+
+    def request_reconcile(self) -> bool:
+        """请求一次启动核对，队列已满时返回False"""
+        try:
+            self.jobs.put_nowait(('reconcile',))
+            return True
+        except queue.Full:
+            return False
+
+    def request_full_sync(self) -> bool:
+        """请求一次全量同步，队列已满时返回False"""
+        try:
+            self.jobs.put_nowait(('full_sync',))
+            return True
+        except queue.Full:
+            return False
+
+    def stop(self):
+        """请求停止工作线程，不等待；当前文件传输完成后退出，退出时发出finished信号"""
+        self._stopping.set()
+
+    def is_stopping(self) -> bool:
+        """是否已请求停止"""
+        return self._stopping.is_set()
+
+    def _report_progress(self, done: int, total: int):
+        """上报进度，限制信号频率避免界面刷新过于频繁"""
+        now = time.monotonic()
+        if done == total or now - self._last_progress_emit >= 0.1:
+            self._last_progress_emit = now
+            self.progress.emit(self.task['id'], done, total)
+
+    def _apply_changes(self, added: Set[str], modified: Set[str], deleted: Set[str],
+                       moved: List[Tuple[str, str]], moved_dirs: List[Tuple[str, str]],
+                       journal_keys: Optional[List[JournalKey]] = None) -> dict:
+        """同步一个变化集合，在操作日志中记录开始，只把成功的操作记录为完成
+
+        失败和因停止未执行的操作保留为执行中，下次启动时重放。
+        """
+        task = self.task
+        uploads = added | modified
+        keys = change_keys(uploads, deleted, moved, moved_dirs) + list(journal_keys or [])
+        # 合并窗口可能把同一路径的上传和删除合并为其中一个，两者都视为已处理
+        keys += change_keys(deleted, uploads)
+        self.journal.begin(keys)
+        with self._hashes_lock:
+            hashes = {path: self.content_hashes.pop(path) for path in added | modified
+                      if path in self.content_hashes}
+        results: Dict[str, bool] = {}
+        stats = self.sync_manager.apply_changes(
+            task['id'], task['local_dir'], task['remote_dir'],
+            added, modified, deleted,
+            progress_callback=self._report_progress,
+            should_stop=self.is_stopping,
+            moved=moved, moved_dirs=moved_dirs, hashes=hashes, results=results)
+        logging.info(f"任务 \"{task['name']}\" 增量同步完成: {stats}")
+        # 移动按新旧路径都成功判断；目录移动按旧目录判断
+        self.journal.complete([key for key in keys
+                               if results.get(key[1]) and (key[0] != 'move' or results.get(key[2]))])
+        return stats
+
+    def run(self):
+        """工作线程主循环"""
+        try:
+            self._run_loop()
+        finally:
+            self.journal.close()
+
+    def _run_loop(self):
+        task = self.task
+        while not self._stopping.is_set():
+            # 批量刷新操作日志
+            self.journal.sync()
+            # 合并窗口中已静默的变化
+            if self.coalescer is not None:
+                try:
+                    # 移动不需要等待静默，先于其他变化执行
+                    moved, moved_dirs = self.coalescer.pop_moves()
+                    added, modified, deleted = self.coalescer.pop_ready()
+                    if added or modified or deleted or moved or moved_dirs:
+                        self.job_finished.emit(task['id'], self._apply_changes(
+                            added, modified, deleted, moved, moved_dirs))
+                except Exception as e:
+                    logging.error(f"同步工作线程执行失败: {str(e)}")
+
+            try:
+                job = self.jobs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            try:
+                if job[0] == 'changes':
+                    _, added, modified, deleted, moved, moved_dirs = job
+                    stats = self._apply_changes(added, modified, deleted, moved, moved_dirs)
+                elif job[0] == 'replay':
+                    _, keys = job
+                    uploads, deleted, moved, moved_dirs = replay_changes(keys)
+                    logging.info(f"任务 \"{task['name']}\" 重放上次未完成的操作: {len(keys)}个")
+                    stats = self._apply_changes(set(), uploads, deleted, moved, moved_dirs, keys)
+                elif job[0] == 'full_sync':
+                    local_files = self.file_monitor.get_indexed_files(task['local_dir'], task['remote_dir'])
+                    stats = self.sync_manager.full_reconcile(
+                        task['id'], task['local_dir'], task['remote_dir'], local_files,
+                        progress_callback=self._report_progress,
+                        should_stop=self.is_stopping)
+                    logging.info(f"任务 \"{task['name']}\" 全量同步完成: {stats}")
+                elif job[0] == 'reconcile':
+                    local_records = self.file_monitor.get_indexed_records(task['local_dir'], task['remote_dir'])
+                    stats = self.sync_manager.startup_reconcile(
+                        task['id'], task['local_dir'], task['remote_dir'], local_records,
+                        progress_callback=self._report_progress,
+                        should_stop=self.is_stopping)
+                else:
+                    continue
+                self.job_finished.emit(task['id'], stats)
+            except Exception as e:
+                logging.error(f"同步工作线程执行失败: {str(e)}")
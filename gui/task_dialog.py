@@ -1,6 +1,8 @@
 import os
 from PyQt5 import QtWidgets, QtGui, QtCore
 import queue
+from fingerprint import DEFAULT_FINGERPRINT, FINGERPRINTS
+from rate_limiter import invalid_schedule_parts
 
 
 class TaskDialog(QtWidgets.QDialog):
@@ -112,26 +114,190 @@ class TaskDialog(QtWidgets.QDialog):
         dir_layout.addWidget(interval_label, 0, 0)
         dir_layout.addWidget(self.interval_input, 0, 1)
         
+        # 增量扫描
+        self.incremental_check = QtWidgets.QCheckBox("增量扫描(仅对大小或修改时间变化的文件重新计算哈希)")
+        self.incremental_check.setChecked(True)
+        dir_layout.addWidget(self.incremental_check, 0, 2)
+        
+        # 监控方式
+        monitor_mode_label = QtWidgets.QLabel("监控方式:")
+        self.monitor_mode_combo = QtWidgets.QComboBox()
+        self.monitor_mode_combo.addItem("定时轮询", "polling")
+        self.monitor_mode_combo.addItem("事件驱动(inotify，仅Linux)", "event")
+        dir_layout.addWidget(monitor_mode_label, 1, 0)
+        dir_layout.addWidget(self.monitor_mode_combo, 1, 1, 1, 2)
+        
+        # 指纹算法
+        hash_algorithm_label = QtWidgets.QLabel("指纹算法:")
+        self.hash_algorithm_combo = QtWidgets.QComboBox()
+        for fingerprint in FINGERPRINTS.values():
+            self.hash_algorithm_combo.addItem(fingerprint.label, fingerprint.name)
+        self.hash_algorithm_combo.setToolTip("判断文件内容是否变化所用的算法，修改后首次扫描会重新计算所有文件")
+        dir_layout.addWidget(hash_algorithm_label, 2, 0)
+        dir_layout.addWidget(self.hash_algorithm_combo, 2, 1, 1, 2)
+        
+        # 哈希线程数
+        hash_workers_label = QtWidgets.QLabel("哈希线程数:")
+        self.hash_workers_input = QtWidgets.QSpinBox()
+        self.hash_workers_input.setRange(0, 64)
+        self.hash_workers_input.setValue(0)
+        self.hash_workers_input.setSpecialValueText("自动")
+        self.hash_workers_input.setToolTip("并行计算文件哈希的线程数，自动表示按CPU核数选择")
+        dir_layout.addWidget(hash_workers_label, 3, 0)
+        dir_layout.addWidget(self.hash_workers_input, 3, 1)
+        
         # 本地目录
         local_dir_label = QtWidgets.QLabel("本地目录:")
         self.local_dir_input = QtWidgets.QLineEdit()
         local_dir_browse = QtWidgets.QPushButton("浏览...")
         local_dir_browse.clicked.connect(self.browse_local_dir)
         
-        dir_layout.addWidget(local_dir_label, 1, 0)
-        dir_layout.addWidget(self.local_dir_input, 1, 1)
-        dir_layout.addWidget(local_dir_browse, 1, 2)
+        dir_layout.addWidget(local_dir_label, 4, 0)
+        dir_layout.addWidget(self.local_dir_input, 4, 1)
+        dir_layout.addWidget(local_dir_browse, 4, 2)
         
         # 远程目录
         remote_dir_label = QtWidgets.QLabel("远程目录:")
         self.remote_dir_input = QtWidgets.QLineEdit()
         
-        dir_layout.addWidget(remote_dir_label, 2, 0)
-        dir_layout.addWidget(self.remote_dir_input, 2, 1, 1, 2)
+        dir_layout.addWidget(remote_dir_label, 5, 0)
+        dir_layout.addWidget(self.remote_dir_input, 5, 1, 1, 2)
         
         dir_group.setLayout(dir_layout)
         layout.addWidget(dir_group)
         
+        # 传输设置组
+        transfer_group = QtWidgets.QGroupBox("传输设置")
+        transfer_layout = QtWidgets.QGridLayout()
+        
+        # 并发传输数
+        parallel_label = QtWidgets.QLabel("并发传输数:")
+        self.parallel_input = QtWidgets.QSpinBox()
+        self.parallel_input.setRange(1, 32)
+        self.parallel_input.setValue(4)
+        self.parallel_input.setToolTip("同时传输的文件数量（FTP为控制连接数，SFTP为同一SSH连接上的通道数）")
+        transfer_layout.addWidget(parallel_label, 0, 0)
+        transfer_layout.addWidget(self.parallel_input, 0, 1)
+        
+        debounce_label = QtWidgets.QLabel("合并等待(秒):")
+        self.debounce_input = QtWidgets.QSpinBox()
+        self.debounce_input.setRange(0, 600)
+        self.debounce_input.setValue(2)
+        self.debounce_input.setToolTip("文件停止变化这么多秒后才上传，期间的多次修改合并为一次，0表示不等待")
+        transfer_layout.addWidget(debounce_label, 0, 2)
+        transfer_layout.addWidget(self.debounce_input, 0, 3)
+        
+        # SFTP传输参数
+        sftp_window_label = QtWidgets.QLabel("SFTP窗口(MB):")
+        self.sftp_window_input = QtWidgets.QSpinBox()
+        self.sftp_window_input.setRange(1, 256)
+        self.sftp_window_input.setValue(16)
+        transfer_layout.addWidget(sftp_window_label, 1, 0)
+        transfer_layout.addWidget(self.sftp_window_input, 1, 1)
+        
+        sftp_packet_label = QtWidgets.QLabel("SFTP最大包(KB):")
+        self.sftp_packet_input = QtWidgets.QSpinBox()
+        self.sftp_packet_input.setRange(32, 256)
+        self.sftp_packet_input.setValue(32)
+        transfer_layout.addWidget(sftp_packet_label, 1, 2)
+        transfer_layout.addWidget(self.sftp_packet_input, 1, 3)
+        
+        sftp_threshold_label = QtWidgets.QLabel("分段并行阈值(MB):")
+        self.sftp_threshold_input = QtWidgets.QSpinBox()
+        self.sftp_threshold_input.setRange(0, 1024 * 1024)
+        self.sftp_threshold_input.setValue(64)
+        self.sftp_threshold_input.setToolTip("超过该大小的文件拆分为多个区段并行上传，0表示不拆分")
+        transfer_layout.addWidget(sftp_threshold_label, 2, 0)
+        transfer_layout.addWidget(self.sftp_threshold_input, 2, 1)
+        
+        self.delta_check = QtWidgets.QCheckBox("块级增量传输")
+        self.delta_check.setChecked(True)
+        self.delta_check.setToolTip("大文件修改后只发送变化的块（需要在本地保存上次同步版本的块签名）")
+        transfer_layout.addWidget(self.delta_check, 2, 2, 1, 2)
+        
+        # 上传验证方式
+        verify_mode_label = QtWidgets.QLabel("上传验证:")
+        self.verify_mode_combo = QtWidgets.QComboBox()
+        self.verify_mode_combo.addItem("批量(每个目录列一次)", "bulk")
+        self.verify_mode_combo.addItem("逐个文件", "file")
+        self.verify_mode_combo.addItem("不验证", "none")
+        self.verify_mode_combo.setToolTip("批量验证在一批文件上传完成后按目录列表比较大小和修改时间，"
+                                          "服务器不支持列目录时自动改为逐个文件验证")
+        transfer_layout.addWidget(verify_mode_label, 3, 0)
+        transfer_layout.addWidget(self.verify_mode_combo, 3, 1)
+        
+        self.reconcile_check = QtWidgets.QCheckBox("启动时与远程核对")
+        self.reconcile_check.setChecked(True)
+        self.reconcile_check.setToolTip("任务启动后列出远程目录树，只上传远程缺少或大小、修改时间不一致的文件")
+        transfer_layout.addWidget(self.reconcile_check, 3, 2, 1, 2)
+        
+        # 调度设置
+        weight_label = QtWidgets.QLabel("调度权重:")
+        self.weight_input = QtWidgets.QSpinBox()
+        self.weight_input.setRange(1, 100)
+        self.weight_input.setValue(1)
+        self.weight_input.setToolTip("多个任务同时传输时按权重分配传输机会，权重为2的任务获得的份额是权重为1的两倍")
+        transfer_layout.addWidget(weight_label, 4, 0)
+        transfer_layout.addWidget(self.weight_input, 4, 1)
+        
+        pinned_label = QtWidgets.QLabel("优先路径:")
+        self.pinned_input = QtWidgets.QLineEdit()
+        self.pinned_input.setPlaceholderText("相对本地目录的路径或通配符，多个用;分隔，如 config;*.json")
+        transfer_layout.addWidget(pinned_label, 5, 0)
+        transfer_layout.addWidget(self.pinned_input, 5, 1, 1, 3)
+        
+        # 上传限速
+        rate_limit_label = QtWidgets.QLabel("上传限速(KB/s):")
+        self.rate_limit_input = QtWidgets.QSpinBox()
+        self.rate_limit_input.setRange(0, 10 * 1024 * 1024)
+        self.rate_limit_input.setValue(0)
+        self.rate_limit_input.setSpecialValueText("不限速")
+        self.rate_limit_input.setToolTip("该任务的上传速度上限，0表示不限速；任务运行时也可在右键菜单中调整")
+        transfer_layout.addWidget(rate_limit_label, 6, 0)
+        transfer_layout.addWidget(self.rate_limit_input, 6, 1)
+        
+        rate_schedule_label = QtWidgets.QLabel("限速时段:")
+        self.rate_schedule_input = QtWidgets.QLineEdit()
+        self.rate_schedule_input.setPlaceholderText("如 08:00-18:00=512;18:00-08:00=0")
+        self.rate_schedule_input.setToolTip("按时间段设置限速(KB/s)，多个用;分隔，不在任何时段内时使用上面的限速")
+        transfer_layout.addWidget(rate_schedule_label, 6, 2)
+        transfer_layout.addWidget(self.rate_schedule_input, 6, 3)
+        
+        self.compression_check = QtWidgets.QCheckBox("压缩传输")
+        self.compression_check.setChecked(False)
+        self.compression_check.setToolTip("SFTP启用SSH压缩，WebDAV以gzip压缩上传（服务器不支持时自动改为不压缩）；"
+                                          "图片、视频、压缩包等已压缩的文件不再压缩。适合日志、CSV、JSON等文本文件")
+        transfer_layout.addWidget(self.compression_check, 7, 0, 1, 2)
+        
+        # WebDAV异步请求
+        self.webdav_async_check = QtWidgets.QCheckBox("异步WebDAV请求")
+        self.webdav_async_check.setChecked(False)
+        self.webdav_async_check.setToolTip("在少量连接上同时发送多个请求，适合大量小文件；大文件仍按并发传输数逐个上传")
+        transfer_layout.addWidget(self.webdav_async_check, 8, 0, 1, 2)
+        
+        webdav_concurrency_label = QtWidgets.QLabel("异步并发请求数:")
+        self.webdav_concurrency_input = QtWidgets.QSpinBox()
+        self.webdav_concurrency_input.setRange(1, 256)
+        self.webdav_concurrency_input.setValue(32)
+        self.webdav_concurrency_input.setToolTip("异步模式下同时进行的WebDAV请求数，也是保持的连接数上限")
+        transfer_layout.addWidget(webdav_concurrency_label, 8, 2)
+        transfer_layout.addWidget(self.webdav_concurrency_input, 8, 3)
+        
+        self.webdav_option_widgets = [
+            self.webdav_async_check,
+            webdav_concurrency_label, self.webdav_concurrency_input,
+        ]
+        
+        self.sftp_option_widgets = [
+            sftp_window_label, self.sftp_window_input,
+            sftp_packet_label, self.sftp_packet_input,
+            sftp_threshold_label, self.sftp_threshold_input,
+            self.delta_check,
+        ]
+        
+        transfer_group.setLayout(transfer_layout)
+        layout.addWidget(transfer_group)
+        
         # 按钮
         button_box = QtWidgets.QDialogButtonBox(
             QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel
@@ -189,13 +355,20 @@ class TaskDialog(QtWidgets.QDialog):
             QLabel {
                 font-family: 'Microsoft YaHei';
             }
-            QRadioButton {
+            QRadioButton, QCheckBox {
                 font-family: 'Microsoft YaHei';
             }
         """)
     
     def on_protocol_changed(self, protocol: str):
         """处理协议变更"""
+        # SFTP专用的传输参数
+        for widget in self.sftp_option_widgets:
+            widget.setEnabled(protocol == "SFTP")
+        # WebDAV专用的传输参数
+        for widget in self.webdav_option_widgets:
+            widget.setEnabled(protocol == "WebDAV")
+        
         # 更新端口显示和默认值
         if protocol == "SFTP":
             self.port_input.setValue(22)
@@ -283,6 +456,11 @@ class TaskDialog(QtWidgets.QDialog):
             self.show_error("请输入远程目录")
             return
         
+        invalid = invalid_schedule_parts(self.rate_schedule_input.text())
+        if invalid:
+            self.show_error(f"限速时段格式错误: {'; '.join(invalid)}，应为 HH:MM-HH:MM=KB/s")
+            return
+        
         self.accept()
     
     def show_error(self, message: str):
@@ -300,7 +478,26 @@ class TaskDialog(QtWidgets.QDialog):
             'local_dir': self.local_dir_input.text(),
             'remote_dir': self.remote_dir_input.text(),
             'use_key_auth': self.key_auth_radio.isChecked(),
-            'scan_interval': self.interval_input.value()
+            'scan_interval': self.interval_input.value(),
+            'hash_algorithm': self.hash_algorithm_combo.currentData(),
+            'incremental_scan': self.incremental_check.isChecked(),
+            'monitor_mode': self.monitor_mode_combo.currentData(),
+            'hash_workers': self.hash_workers_input.value(),
+            'parallel_transfers': self.parallel_input.value(),
+            'debounce_seconds': self.debounce_input.value(),
+            'sftp_window_mb': self.sftp_window_input.value(),
+            'sftp_max_packet_kb': self.sftp_packet_input.value(),
+            'sftp_parallel_threshold_mb': self.sftp_threshold_input.value(),
+            'delta_transfer': self.delta_check.isChecked(),
+            'verify_mode': self.verify_mode_combo.currentData(),
+            'startup_reconcile': self.reconcile_check.isChecked(),
+            'schedule_weight': self.weight_input.value(),
+            'pinned_paths': self.pinned_input.text().strip(),
+            'rate_limit_kbps': self.rate_limit_input.value(),
+            'rate_schedule': self.rate_schedule_input.text().strip(),
+            'compression': self.compression_check.isChecked(),
+            'webdav_async': self.webdav_async_check.isChecked(),
+            'webdav_concurrency': self.webdav_concurrency_input.value()
         }
         
         if self.password_radio.isChecked():
@@ -320,6 +517,28 @@ class TaskDialog(QtWidgets.QDialog):
         self.local_dir_input.setText(task['local_dir'])
         self.remote_dir_input.setText(task['remote_dir'])
         self.interval_input.setValue(task.get('scan_interval', 5))
+        algorithm_index = self.hash_algorithm_combo.findData(task.get('hash_algorithm', DEFAULT_FINGERPRINT))
+        self.hash_algorithm_combo.setCurrentIndex(max(algorithm_index, 0))
+        self.incremental_check.setChecked(task.get('incremental_scan', True))
+        mode_index = self.monitor_mode_combo.findData(task.get('monitor_mode', 'polling'))
+        self.monitor_mode_combo.setCurrentIndex(max(mode_index, 0))
+        self.hash_workers_input.setValue(task.get('hash_workers', 0))
+        self.parallel_input.setValue(task.get('parallel_transfers', 4))
+        self.debounce_input.setValue(task.get('debounce_seconds', 2))
+        self.sftp_window_input.setValue(task.get('sftp_window_mb', 16))
+        self.sftp_packet_input.setValue(task.get('sftp_max_packet_kb', 32))
+        self.sftp_threshold_input.setValue(task.get('sftp_parallel_threshold_mb', 64))
+        self.delta_check.setChecked(task.get('delta_transfer', True))
+        verify_index = self.verify_mode_combo.findData(task.get('verify_mode', 'bulk'))
+        self.verify_mode_combo.setCurrentIndex(max(verify_index, 0))
+        self.reconcile_check.setChecked(task.get('startup_reconcile', True))
+        self.weight_input.setValue(int(task.get('schedule_weight', 1)))
+        self.pinned_input.setText(task.get('pinned_paths', ''))
+        self.rate_limit_input.setValue(int(task.get('rate_limit_kbps', 0)))
+        self.rate_schedule_input.setText(task.get('rate_schedule', ''))
+        self.compression_check.setChecked(task.get('compression', False))
+        self.webdav_async_check.setChecked(task.get('webdav_async', False))
+        self.webdav_concurrency_input.setValue(int(task.get('webdav_concurrency', 32)))
         
         if task.get('use_key_auth', False):
             self.key_auth_radio.setChecked(True)
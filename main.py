@@ -1,11 +1,13 @@
 import sys
 import os
+import shutil
 import logging
 from PyQt5 import QtWidgets, QtGui, QtCore
 from gui.main_window import MainWindow
 from config_manager import ConfigManager
 from file_monitor import FileMonitor
 from sync_manager import SyncManager
+from state_index import STATE_DIR
 import queue
 
 def setup_logging():
@@ -18,11 +20,23 @@ def setup_logging():
         encoding='utf-8'
     )
 
+def setup_state_dir():
+    """创建用户数据目录中的同步状态目录，旧版本在工作目录中的state目录移动过去"""
+    if not os.path.exists(STATE_DIR) and os.path.isdir('state'):
+        try:
+            os.makedirs(os.path.dirname(STATE_DIR), exist_ok=True)
+            shutil.move('state', STATE_DIR)
+            logging.info(f"同步状态目录已移动到: {STATE_DIR}")
+        except OSError as e:
+            logging.error(f"移动同步状态目录失败: {str(e)}")
+    os.makedirs(STATE_DIR, exist_ok=True)
+
 def main():
     """程序入口点"""
     # 设置日志
     setup_logging()
     logging.info("程序启动")
+    setup_state_dir()
 
     # 创建应用实例
     app = QtWidgets.QApplication(sys.argv)
@@ -38,7 +52,9 @@ def main():
     file_monitor = FileMonitor()
     
     # 创建同步管理器实例
-    sync_manager = SyncManager()
+    sync_manager = SyncManager(config_manager.get_max_active_transfers(),
+                               config_manager.get_global_rate_limit(),
+                               config_manager.get_global_rate_schedule())
     
     # 创建主窗口
     main_window = MainWindow(config_manager, file_monitor, sync_manager)
@@ -0,0 +1,121 @@
+import os
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+# 每页变化集合最多包含的路径数（移动除外）
+CHANGE_PAGE_SIZE = 5000
+# 监控进程事件队列最多缓存的消息数，同步端处理不过来时监控进程等待
+EVENT_QUEUE_SIZE = 16
+
+# 路径以\0分隔编码为一个bytes，文件名不可能包含\0；无法解码的文件名按surrogateescape原样保留
+_SEPARATOR = b'\0'
+_ENCODING = 'utf-8'
+_ERRORS = 'surrogateescape'
+
+
+class ScanComplete(NamedTuple):
+    """初始扫描完成，状态索引已就绪"""
+    directory: str
+
+
+class ChangePage(NamedTuple):
+    """一批文件变化中的一页
+
+    路径去掉root前缀后以\\0分隔编码为bytes，比字符串列表占用更少的序列化和复制开销。
+    hashes与 added + modified 一一对应，空字符串表示没有指纹。
+    移动只出现在每批的第一页，每一页都可以单独作为变化集合处理。
+    """
+    batch: int
+    page: int
+    last: bool
+    root: str
+    added: bytes
+    modified: bytes
+    deleted: bytes
+    moved: bytes
+    moved_dirs: bytes
+    hash_prefix: str
+    hashes: bytes
+
+
+def _encode(paths: List[str], root: str) -> bytes:
+    start = len(root)
+    return _SEPARATOR.join(path[start:].encode(_ENCODING, _ERRORS) for path in paths)
+
+
+def _decode(data: bytes, root: str) -> List[str]:
+    if not data:
+        return []
+    return [root + part.decode(_ENCODING, _ERRORS) for part in data.split(_SEPARATOR)]
+
+
+def _encode_pairs(pairs: List[Tuple[str, str]], root: str) -> bytes:
+    return _encode([path for pair in pairs for path in pair], root)
+
+
+def _decode_pairs(data: bytes, root: str) -> List[Tuple[str, str]]:
+    paths = _decode(data, root)
+    return list(zip(paths[0::2], paths[1::2]))
+
+
+def paginate_changes(batch: int, directory: str, added: Set[str], modified: Set[str], deleted: Set[str],
+                     moved: List[Tuple[str, str]], moved_dirs: List[Tuple[str, str]],
+                     hashes: Optional[Dict[str, str]] = None, hash_prefix: str = '',
+                     page_size: int = CHANGE_PAGE_SIZE) -> Iterator[ChangePage]:
+    """把一批变化按page_size条路径分页编码，依次返回ChangePage
+
+    hashes的值不含hash_prefix（指纹算法名），每页只携带一次前缀。
+    """
+    root = os.path.abspath(directory) + os.sep
+    every_path = [path for pair in moved + moved_dirs for path in pair]
+    every_path += list(added) + list(modified) + list(deleted)
+    if not all(path.startswith(root) for path in every_path):
+        root = ''
+
+    # 依次为删除、新增、修改，每项为 (类别, 路径)
+    records = [('deleted', path) for path in sorted(deleted)]
+    records += [('added', path) for path in sorted(added)]
+    records += [('modified', path) for path in sorted(modified)]
+    page_size = max(1, page_size)
+    page_count = max(1, (len(records) + page_size - 1) // page_size)
+    for page in range(page_count):
+        kinds: Dict[str, List[str]] = {'added': [], 'modified': [], 'deleted': []}
+        for kind, path in records[page * page_size:(page + 1) * page_size]:
+            kinds[kind].append(path)
+        page_hashes = b''
+        if hashes is not None:
+            page_hashes = _SEPARATOR.join(hashes.get(path, '').encode(_ENCODING)
+                                          for path in kinds['added'] + kinds['modified'])
+        yield ChangePage(
+            batch=batch,
+            page=page,
+            last=page == page_count - 1,
+            root=root,
+            added=_encode(kinds['added'], root),
+            modified=_encode(kinds['modified'], root),
+            deleted=_encode(kinds['deleted'], root),
+            moved=_encode_pairs(moved, root) if page == 0 else b'',
+            moved_dirs=_encode_pairs(moved_dirs, root) if page == 0 else b'',
+            hash_prefix=hash_prefix if hashes is not None else '',
+            hashes=page_hashes,
+        )
+
+
+def decode_change_page(message: ChangePage) -> dict:
+    """把ChangePage解码为变化集合: added/modified/deleted为集合，moved/moved_dirs为路径对列表，
+    hashes为 路径 -> 带前缀的指纹（没有指纹时为None）"""
+    root = message.root
+    added = _decode(message.added, root)
+    modified = _decode(message.modified, root)
+    hashes = None
+    if message.hash_prefix:
+        digests = message.hashes.decode(_ENCODING).split('\0') if message.hashes else []
+        hashes = {path: message.hash_prefix + digest
+                  for path, digest in zip(added + modified, digests) if digest}
+    return {
+        'added': set(added),
+        'modified': set(modified),
+        'deleted': set(_decode(message.deleted, root)),
+        'moved': _decode_pairs(message.moved, root),
+        'moved_dirs': _decode_pairs(message.moved_dirs, root),
+        'hashes': hashes,
+    }
@@ -0,0 +1,214 @@
+import time
+import logging
+import datetime
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+# 令牌桶容量（秒）：允许的突发量为该时长内的配额
+BURST_SECONDS = 0.5
+# 令牌桶容量下限（字节）
+MIN_BURST = 64 * 1024
+# 等待令牌时每次最多睡眠的时间，便于及时响应限速调整
+MAX_SLEEP_SLICE = 0.25
+# 重新按时间段计划计算限速的间隔（秒）
+SCHEDULE_CHECK_INTERVAL = 30.0
+
+
+class TokenBucket:
+    """令牌桶限速器，rate为每秒字节数，0表示不限速
+
+    取用的字节数超过当前令牌时令牌变为负数（欠账），调用方按欠账除以速率的时间等待，
+    因此单次取用可以大于桶容量。可由多个线程同时调用。
+    """
+
+    def __init__(self, rate: float = 0):
+        self._lock = Lock()
+        self.rate = 0.0
+        self.burst = float(MIN_BURST)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self.set_rate(rate)
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def set_rate(self, rate: float):
+        """调整速率，立即生效（正在等待的调用按新速率重新计算剩余等待时间）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(0.0, float(rate))
+            self.burst = max(self.rate * BURST_SECONDS, MIN_BURST)
+            self._tokens = min(self._tokens, self.burst)
+
+    def reserve(self, size: int) -> float:
+        """取用size字节的令牌，返回调用方需要等待的时间（秒），不等待"""
+        with self._lock:
+            if self.rate <= 0:
+                return 0.0
+            self._refill(time.monotonic())
+            self._tokens -= size
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def consume(self, size: int):
+        """取用size字节的令牌，令牌不足时等待"""
+        rate = self.rate
+        remaining = self.reserve(size)
+        while remaining > 0:
+            step = min(remaining, MAX_SLEEP_SLICE)
+            time.sleep(step)
+            remaining -= step
+            current_rate = self.rate
+            if current_rate <= 0:
+                break
+            if current_rate != rate:
+                # 速率已调整，按新速率折算剩余的欠账
+                remaining = remaining * rate / current_rate
+                rate = current_rate
+
+
+def parse_schedule(text: str) -> List[Tuple[int, int, int]]:
+    """解析时间段限速计划，返回 (开始分钟, 结束分钟, KB/s) 列表
+
+    格式为以;分隔的 HH:MM-HH:MM=KB/s，如 "08:00-18:00=512;18:00-08:00=0"，
+    结束时间早于开始时间表示跨越午夜，0表示不限速。
+    """
+    rules = []
+    for part in (text or '').split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            rules.append(_parse_rule(part))
+        except ValueError:
+            logging.warning(f"忽略无效的限速计划: {part}")
+    return rules
+
+
+def invalid_schedule_parts(text: str) -> List[str]:
+    """返回限速计划中无法解析的部分，用于界面校验"""
+    invalid = []
+    for part in (text or '').split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            _parse_rule(part)
+        except ValueError:
+            invalid.append(part)
+    return invalid
+
+
+def _parse_rule(part: str) -> Tuple[int, int, int]:
+    span, rate = part.split('=')
+    start, end = span.split('-')
+    kbps = int(rate)
+    if kbps < 0:
+        raise ValueError(part)
+    return _parse_minutes(start), _parse_minutes(end), kbps
+
+
+def _parse_minutes(value: str) -> int:
+    hours, minutes = value.strip().split(':')
+    result = int(hours) * 60 + int(minutes)
+    if not 0 <= result <= 24 * 60:
+        raise ValueError(value)
+    return result
+
+
+def scheduled_rate(rules: List[Tuple[int, int, int]], default_kbps: int,
+                   now: Optional[datetime.datetime] = None) -> int:
+    """按当前时间返回生效的限速（KB/s），不在任何时间段内时返回default_kbps"""
+    now = now or datetime.datetime.now()
+    minute = now.hour * 60 + now.minute
+    for start, end, kbps in rules:
+        if start <= end:
+            if start <= minute < end:
+                return kbps
+        elif minute >= start or minute < end:
+            return kbps
+    return default_kbps
+
+
+class _Limit:
+    """一个限速对象（任务或全局）的设置"""
+
+    def __init__(self, kbps: int = 0, schedule: str = ''):
+        self.kbps = kbps
+        self.rules = parse_schedule(schedule)
+        self.bucket = TokenBucket()
+        self.apply()
+
+    def apply(self):
+        """按当前时间更新令牌桶速率"""
+        kbps = scheduled_rate(self.rules, self.kbps)
+        self.bucket.set_rate(kbps * 1024)
+
+
+class RateLimiter:
+    """上传限速：每个任务一个令牌桶，另有一个所有任务共享的全局令牌桶
+
+    限速单位为KB/s，0表示不限速；可设置按时间段变化的计划，修改后立即生效，无需重启任务。
+    """
+
+    def __init__(self, global_kbps: int = 0, global_schedule: str = ''):
+        self._global = _Limit(global_kbps, global_schedule)
+        self._tasks: Dict[str, _Limit] = {}
+        self._lock = Lock()
+        self._last_schedule_check = time.monotonic()
+
+    def set_global_limit(self, kbps: int, schedule: Optional[str] = None):
+        with self._lock:
+            self._global.kbps = int(kbps)
+            if schedule is not None:
+                self._global.rules = parse_schedule(schedule)
+            self._global.apply()
+
+    def set_task_limit(self, task_id: str, kbps: int, schedule: Optional[str] = None):
+        with self._lock:
+            limit = self._tasks.get(task_id)
+            if limit is None:
+                self._tasks[task_id] = _Limit(int(kbps), schedule or '')
+                return
+            limit.kbps = int(kbps)
+            if schedule is not None:
+                limit.rules = parse_schedule(schedule)
+            limit.apply()
+
+    def remove_task(self, task_id: str):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def current_rates(self, task_id: str) -> Tuple[int, int]:
+        """当前生效的 (任务限速, 全局限速)，单位KB/s"""
+        with self._lock:
+            limit = self._tasks.get(task_id)
+            task_rate = int(limit.bucket.rate / 1024) if limit else 0
+            return task_rate, int(self._global.bucket.rate / 1024)
+
+    def _check_schedules(self):
+        now = time.monotonic()
+        if now - self._last_schedule_check < SCHEDULE_CHECK_INTERVAL:
+            return
+        with self._lock:
+            self._last_schedule_check = now
+            for limit in [self._global] + list(self._tasks.values()):
+                if limit.rules:
+                    limit.apply()
+
+    def reserve(self, task_id: str, size: int) -> float:
+        """取用size字节的任务和全局令牌，返回需要等待的时间（秒），供异步上传自行等待"""
+        self._check_schedules()
+        limit = self._tasks.get(task_id)
+        delay = limit.bucket.reserve(size) if limit is not None else 0.0
+        return max(delay, self._global.bucket.reserve(size))
+
+    def throttle(self, task_id: str, size: int):
+        """发送size字节前调用，超过任务或全局限速时等待"""
+        self._check_schedules()
+        limit = self._tasks.get(task_id)
+        if limit is not None:
+            limit.bucket.consume(size)
+        self._global.bucket.consume(size)
+
@@ -0,0 +1,65 @@
+import posixpath
+from threading import Lock
+from typing import Iterable, List, Set
+
+
+class RemoteDirCache:
+    """已确认存在的远程目录缓存（每个连接一份），避免每次上传都逐级检查目录
+
+    目录在创建成功、检查存在或列出目录时加入缓存；操作失败时移出，下次重新检查。
+    可由多个传输线程同时调用。
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._dirs: Set[str] = set()
+        self._lock = Lock()
+
+    @staticmethod
+    def _normalize(remote_dir: str) -> str:
+        remote_dir = remote_dir.replace('\\', '/')
+        if not remote_dir.startswith('/'):
+            remote_dir = '/' + remote_dir
+        return posixpath.normpath(remote_dir)
+
+    def __contains__(self, remote_dir: str) -> bool:
+        remote_dir = self._normalize(remote_dir)
+        if remote_dir == '/':
+            return True
+        with self._lock:
+            return remote_dir in self._dirs
+
+    def add(self, remote_dir: str):
+        """记录一个存在的目录"""
+        remote_dir = self._normalize(remote_dir)
+        with self._lock:
+            if len(self._dirs) >= self.max_entries:
+                # 超出上限时整体清空，代价只是重新检查一次
+                self._dirs.clear()
+            self._dirs.add(remote_dir)
+
+    def discard(self, remote_dir: str):
+        """目录可能已不存在（或已被移动），连同其子目录和上级目录一起移出缓存
+
+        无法确定是哪一级目录被删除，上级目录也需要重新检查。
+        """
+        remote_dir = self._normalize(remote_dir)
+        prefix = remote_dir.rstrip('/') + '/'
+        with self._lock:
+            self._dirs = {path for path in self._dirs
+                          if path != remote_dir and not path.startswith(prefix) and not prefix.startswith(path + '/')}
+
+    def clear(self):
+        with self._lock:
+            self._dirs.clear()
+
+    def missing(self, remote_dirs: Iterable[str]) -> List[str]:
+        """返回这些目录及其上级目录中尚未确认存在的目录，按从上到下的顺序排列"""
+        pending = set()
+        with self._lock:
+            for remote_dir in remote_dirs:
+                remote_dir = self._normalize(remote_dir)
+                while remote_dir != '/' and remote_dir not in self._dirs and remote_dir not in pending:
+                    pending.add(remote_dir)
+                    remote_dir = posixpath.dirname(remote_dir)
+        return sorted(pending, key=lambda path: (path.count('/'), path))
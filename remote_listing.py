@@ -0,0 +1,89 @@
+import stat
+import time
+import calendar
+import posixpath
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from urllib.parse import unquote, urlparse
+from xml.etree import ElementTree
+
+_DAV = '{DAV:}'
+
+
+class RemoteEntry(NamedTuple):
+    """远程目录列表中的一项"""
+    size: int
+    # 修改时间（Unix时间戳，秒），服务器未提供时为None
+    mtime: Optional[float]
+    is_dir: bool
+
+
+# 远程目录列表: 文件名 -> 列表项
+RemoteListing = Dict[str, RemoteEntry]
+
+
+def from_sftp_attributes(attributes: Iterable) -> RemoteListing:
+    """把SFTP listdir_attr的结果转换为目录列表"""
+    listing = {}
+    for attr in attributes:
+        is_dir = attr.st_mode is not None and stat.S_ISDIR(attr.st_mode)
+        listing[attr.filename] = RemoteEntry(attr.st_size or 0, attr.st_mtime, is_dir)
+    return listing
+
+
+def _parse_mlsd_time(value: str) -> Optional[float]:
+    """解析MLSD的modify事实（YYYYMMDDHHMMSS[.sss]，UTC）"""
+    try:
+        seconds, _, fraction = value.partition('.')
+        timestamp = calendar.timegm(time.strptime(seconds, '%Y%m%d%H%M%S'))
+        return timestamp + (float('0.' + fraction) if fraction else 0.0)
+    except ValueError:
+        return None
+
+
+def from_mlsd(entries: Iterable[Tuple[str, Dict[str, str]]]) -> RemoteListing:
+    """把ftplib.FTP.mlsd的结果转换为目录列表"""
+    listing = {}
+    for name, facts in entries:
+        entry_type = facts.get('type', '').lower()
+        if entry_type in ('cdir', 'pdir') or name in ('.', '..'):
+            continue
+        is_dir = entry_type == 'dir'
+        try:
+            size = int(facts.get('size', 0))
+        except ValueError:
+            size = 0
+        mtime = _parse_mlsd_time(facts['modify']) if 'modify' in facts else None
+        listing[name] = RemoteEntry(size, mtime, is_dir)
+    return listing
+
+
+def from_propfind(xml_text: str, dir_url: str) -> RemoteListing:
+    """把PROPFIND Depth:1的multistatus响应转换为目录列表，只保留dir_url的直接子项"""
+    listing = {}
+    dir_path = unquote(urlparse(dir_url).path).rstrip('/')
+    root = ElementTree.fromstring(xml_text)
+    for response in root.iter(_DAV + 'response'):
+        href = response.findtext(_DAV + 'href')
+        if not href:
+            continue
+        path = unquote(urlparse(href).path).rstrip('/')
+        if posixpath.dirname(path) != dir_path:
+            continue
+        name = posixpath.basename(path)
+        size, mtime, is_dir = 0, None, False
+        for prop in response.iter(_DAV + 'prop'):
+            length = prop.findtext(_DAV + 'getcontentlength')
+            if length:
+                size = int(length)
+            modified = prop.findtext(_DAV + 'getlastmodified')
+            if modified:
+                try:
+                    mtime = parsedate_to_datetime(modified).timestamp()
+                except (TypeError, ValueError):
+                    pass
+            resource_type = prop.find(_DAV + 'resourcetype')
+            if resource_type is not None and resource_type.find(_DAV + 'collection') is not None:
+                is_dir = True
+        listing[name] = RemoteEntry(size, mtime, is_dir)
+    return listing
@@ -0,0 +1,161 @@
+import os
+import sys
+import sqlite3
+import logging
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+
+
+def user_data_dir() -> str:
+    """当前用户的程序数据目录（Windows为%LOCALAPPDATA%\\FileSync，Linux为~/.local/share/FileSync）"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.environ.get('APPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(base, 'FileSync')
+
+
+# 同步状态文件（状态索引、操作日志、检查点等）的存放目录，与启动时的工作目录无关
+STATE_DIR = os.path.join(user_data_dir(), 'state')
+
+# 文件记录: (大小, mtime_ns, inode, 哈希值)
+FileRecord = Tuple[int, int, int, str]
+
+
+class StateIndex:
+    """基于SQLite（WAL模式）的文件状态索引，以相对路径为主键保存每个文件的stat签名和哈希值
+
+    内存中保留一份与数据库一致的副本，写入时只提交发生变化的行，每次提交都是一个事务。
+    索引记录生成哈希值所用的指纹算法，算法变化后旧记录全部作废。
+    """
+
+    def __init__(self, db_path: str, root: str, algorithm: Optional[str] = None):
+        self.db_path = db_path
+        self.root = os.path.abspath(root)
+        self._prefix = self.root.rstrip(os.sep) + os.sep
+        self._records: Dict[str, FileRecord] = {}
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(db_path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, '
+            'inode INTEGER NOT NULL, hash BLOB NOT NULL) WITHOUT ROWID')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        if algorithm:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'algorithm'").fetchone()
+            if row and row[0] != algorithm:
+                logging.info(f"指纹算法已从{row[0]}改为{algorithm}，清空状态索引")
+                self._db.execute('DELETE FROM files')
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('algorithm', ?)", (algorithm,))
+        self._db.commit()
+
+    def _relative(self, path: str) -> str:
+        """绝对路径转换为索引中的相对路径（统一使用/分隔）"""
+        if path.startswith(self._prefix):
+            relative = path[len(self._prefix):]
+        else:
+            relative = os.path.relpath(path, self.root)
+        return relative.replace(os.sep, '/')
+
+    def _absolute(self, relative: str) -> str:
+        """索引中的相对路径转换为绝对路径"""
+        return self._prefix + relative.replace('/', os.sep)
+
+    def load(self) -> Dict[str, FileRecord]:
+        """加载全部记录，返回 绝对路径 -> 记录"""
+        records = {}
+        for path, size, mtime_ns, inode, file_hash in self._db.execute(
+                'SELECT path, size, mtime_ns, inode, hash FROM files'):
+            records[self._absolute(path)] = (size, mtime_ns, inode, file_hash.hex())
+        self._records = records
+        return dict(records)
+
+    def update(self, records: Dict[str, FileRecord]):
+        """把索引更新为records（绝对路径 -> 记录），只写入新增、变化和删除的行"""
+        upserts = [
+            (self._relative(path), record[0], record[1], record[2], bytes.fromhex(record[3]))
+            for path, record in records.items()
+            if self._records.get(path) != record
+        ]
+        deletes = [(self._relative(path),) for path in self._records if path not in records]
+        if not upserts and not deletes:
+            return
+        with self._db:
+            if deletes:
+                self._db.executemany('DELETE FROM files WHERE path = ?', deletes)
+            if upserts:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, hash) VALUES (?, ?, ?, ?, ?)',
+                    upserts)
+        self._records = dict(records)
+
+    def paths(self) -> Iterable[str]:
+        """索引中所有文件的绝对路径"""
+        return [self._absolute(path) for (path,) in self._db.execute('SELECT path FROM files')]
+
+    def close(self):
+        """关闭数据库"""
+        try:
+            self._db.close()
+        except Exception as e:
+            logging.warning(f"关闭状态索引失败: {str(e)}")
+
+
+class ContentIndex:
+    """已同步内容的索引（内容指纹 -> 远程路径），用于把相同内容的文件改为服务器端复制
+    
+    指纹带有算法前缀（如 sha256:...），只记录强哈希算法计算的指纹。
+    可由多个同步线程同时调用。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS content ('
+            'hash TEXT PRIMARY KEY, remote_path TEXT NOT NULL, size INTEGER NOT NULL) WITHOUT ROWID')
+        self._db.execute('CREATE INDEX IF NOT EXISTS content_remote_path ON content (remote_path)')
+        self._db.commit()
+
+    def lookup(self, content_hash: str) -> Optional[Tuple[str, int]]:
+        """查找内容相同的已同步文件，返回 (远程路径, 大小)"""
+        with self._lock:
+            return self._db.execute(
+                'SELECT remote_path, size FROM content WHERE hash = ?', (content_hash,)).fetchone()
+
+    def record(self, content_hash: str, remote_path: str, size: int):
+        """记录远程路径上现在的内容"""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM content WHERE remote_path = ?', (remote_path,))
+            self._db.execute('INSERT OR REPLACE INTO content (hash, remote_path, size) VALUES (?, ?, ?)',
+                             (content_hash, remote_path, size))
+
+    def discard(self, remote_path: str):
+        """远程文件被删除或被未知内容覆盖"""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM content WHERE remote_path = ?', (remote_path,))
+
+    def rename(self, old_remote_path: str, new_remote_path: str):
+        """远程文件或目录移动后更新其中文件的路径"""
+        old_prefix = old_remote_path.rstrip('/') + '/'
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM content WHERE remote_path = ?', (new_remote_path,))
+            self._db.execute(
+                'UPDATE content SET remote_path = ? || substr(remote_path, ?) '
+                'WHERE remote_path = ? OR substr(remote_path, 1, ?) = ?',
+                (new_remote_path, len(old_remote_path) + 1, old_remote_path, len(old_prefix), old_prefix))
+
+    def close(self):
+        """关闭数据库"""
+        try:
+            self._db.close()
+        except Exception as e:
+            logging.warning(f"关闭内容索引失败: {str(e)}")
@@ -1,23 +1,66 @@
 import os
 import sys
 import time
+import shlex
+import posixpath
 import socket
 import logging
 import paramiko
 import ftplib
 import requests
+import asyncio
+import threading
 import concurrent.futures
-from typing import Optional, Callable, List, Tuple, Dict, Any
+from contextlib import nullcontext
+from functools import partial
+from typing import Optional, Callable, List, Tuple, Dict, Any, Iterable, Set
 from threading import Lock
-from queue import Queue
+from queue import Queue, Empty
 from urllib.parse import urljoin
+from paramiko.sftp import CMD_SETSTAT
+from connection_pool import ConnectionPool, is_connection_error
+from checkpoint_store import CheckpointStore
+from remote_dir_cache import RemoteDirCache
+from transfer_scheduler import PRIORITY_METADATA, TransferScheduler
+from rate_limiter import RateLimiter
+from compression import CompressionStats, SSHCompressor, install_ssh_compressor, is_compressible
+from webdav_transport import FileBody, GzipBody, GZIP_PUT_HEADERS, PUT_HEADERS, WebDAVTransport
+from webdav_async import DEFAULT_CONCURRENCY, FALLBACK_STATUSES, AsyncWebDAVClient, EventLoopThread
+from remote_listing import RemoteEntry, RemoteListing, from_sftp_attributes, from_mlsd, from_propfind
+from state_index import STATE_DIR, ContentIndex, FileRecord
+from delta_transfer import (DELTA_MIN_SIZE, BlockSignature, SignatureStore, compute_delta,
+                            apply_in_place, rebuild_remote, copy_remote_file)
+
+# SFTP上传时每次从本地读取的字节数
+SFTP_BUFFER_SIZE = 1024 * 1024
+# 达到该大小的文件才记录断点续传检查点
+RESUME_MIN_SIZE = 8 * 1024 * 1024
+# WebDAV列目录时请求的属性
+WEBDAV_LISTING_BODY = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<d:propfind xmlns:d="DAV:"><d:prop>'
+    '<d:getcontentlength/><d:getlastmodified/><d:resourcetype/>'
+    '</d:prop></d:propfind>'
+)
+WEBDAV_LISTING_HEADERS = {'Content-Type': 'application/xml; charset=utf-8'}
+# 达到该大小的重复内容才改为服务器端复制，更小的文件直接上传
+DEDUP_MIN_SIZE = 64 * 1024
 
 class SyncManager:
     """同步管理器类，负责处理与远程服务器的文件同步"""
     
-    def __init__(self):
+    def __init__(self, max_active_transfers: int = 8, global_rate_limit: int = 0,
+                 global_rate_schedule: str = ''):
         self.connections = {}
         self.connection_locks = {}
+        # 所有任务共享的传输调度器
+        self.scheduler = TransferScheduler(max_active_transfers)
+        # 上传限速（KB/s），每个任务一个令牌桶，另有全局令牌桶
+        self.rate_limiter = RateLimiter(global_rate_limit, global_rate_schedule)
+        # 任务ID -> 累计传输统计
+        self.task_stats: Dict[str, Dict[str, int]] = {}
+        # 任务ID -> 累计压缩统计（仅启用压缩传输的任务）
+        self.compression_stats: Dict[str, CompressionStats] = {}
         
     def create_connection(self, task_id: str, config: dict) -> bool:
         """创建与远程服务器的连接"""
@@ -28,14 +71,38 @@ class SyncManager:
         try:
             protocol = config['protocol']
             if protocol == 'SFTP':
-                return self._create_sftp_connection(task_id, config)
+                created = self._create_sftp_connection(task_id, config)
             elif protocol == 'FTP':
-                return self._create_ftp_connection(task_id, config)
+                created = self._create_ftp_connection(task_id, config)
             elif protocol == 'WebDAV':
-                return self._create_webdav_connection(task_id, config)
+                created = self._create_webdav_connection(task_id, config)
             else:
                 logging.error(f"不支持的协议: {protocol}")
                 return False
+            
+            if created:
+                if config.get('compression', False):
+                    self.connections[task_id]['compression_stats'] = self.compression_stats.setdefault(
+                        task_id, CompressionStats())
+                # 断点续传检查点，任务重启后仍可从中断位置继续上传
+                self.connections[task_id]['checkpoints'] = CheckpointStore(
+                    os.path.join(STATE_DIR, f'checkpoints_{task_id}.json'))
+                # 已确认存在的远程目录，上传时无需逐级检查
+                self.connections[task_id]['known_dirs'] = RemoteDirCache()
+                pinned = config.get('pinned_paths', '')
+                if isinstance(pinned, str):
+                    pinned = [pattern.strip() for pattern in pinned.split(';')]
+                self.scheduler.configure_task(task_id, config.get('schedule_weight', 1),
+                                              config.get('local_dir', ''), pinned)
+                self.rate_limiter.set_task_limit(task_id, int(config.get('rate_limit_kbps', 0) or 0),
+                                                 config.get('rate_schedule', ''))
+                # 上传时每发送一块数据前调用，超过限速时等待
+                self.connections[task_id]['throttle'] = partial(self.rate_limiter.throttle, task_id)
+                if protocol in ('SFTP', 'WebDAV') and config.get('dedup', True):
+                    # 已同步内容的索引，相同内容的文件在服务器端复制而不再上传
+                    self.connections[task_id]['content_index'] = ContentIndex(
+                        os.path.join(STATE_DIR, f'content_{task_id}.db'))
+            return created
         except Exception as e:
             logging.error(f"创建连接失败: {str(e)}，配置: {config}")
             return False
@@ -64,15 +131,54 @@ class SyncManager:
             else:
                 connect_kwargs['password'] = config['password']
             
+            # 压缩传输时请求SSH传输层zlib压缩，服务器不支持时不压缩
+            connect_kwargs['compress'] = bool(config.get('compression', False))
+            
             ssh.connect(**connect_kwargs)
-            sftp = ssh.open_sftp()
+            
+            # 调大通道窗口，避免高延迟链路上发送方频繁等待窗口调整
+            transport = ssh.get_transport()
+            if config.get('compression', False):
+                if install_ssh_compressor(transport, self.compression_stats.setdefault(task_id, CompressionStats())):
+                    logging.info(f"SFTP连接已启用压缩: {transport.local_compression}")
+                else:
+                    logging.info("SFTP服务器不支持压缩，不压缩传输")
+            window_size = int(config.get('sftp_window_mb', 16)) * 1024 * 1024
+            max_packet_size = int(config.get('sftp_max_packet_kb', 32)) * 1024
+            transport.default_window_size = window_size
+            transport.default_max_packet_size = max_packet_size
+            
+            def open_sftp():
+                return paramiko.SFTPClient.from_transport(
+                    transport, window_size=window_size, max_packet_size=max_packet_size)
+            
+            sftp = open_sftp()
+            
+            # 在同一个SSH Transport上按需打开多个SFTP通道，实现并发传输
+            parallel = max(1, int(config.get('parallel_transfers', 4)))
+            sftp_pool = ConnectionPool(
+                factory=open_sftp,
+                max_size=parallel,
+                validator=self._check_sftp,
+                closer=lambda client: client.close()
+            )
+            sftp_pool.add(sftp)
             
             self.connections[task_id] = {
                 'type': 'SFTP',
                 'ssh': ssh,
-                'sftp': sftp,
-                'config': config
+                'sftp_pool': sftp_pool,
+                'config': config,
+                'parallel': parallel,
+                'executor': concurrent.futures.ThreadPoolExecutor(
+                    max_workers=parallel,
+                    thread_name_prefix=f'SFTP-{task_id}'
+                )
             }
+            if config.get('delta_transfer', True):
+                # 上次同步版本的块签名，大文件修改后只发送变化的块
+                self.connections[task_id]['signatures'] = SignatureStore(
+                    os.path.join(STATE_DIR, f'signatures_{task_id}'))
             self.connection_locks[task_id] = Lock()
             
             return True
@@ -81,43 +187,76 @@ class SyncManager:
             logging.error(f"创建SFTP连接失败: {str(e)}")
             return False
 
+    @staticmethod
+    def _check_sftp(sftp: paramiko.SFTPClient) -> bool:
+        """检查SFTP通道是否仍然可用"""
+        channel = sftp.get_channel()
+        return channel is not None and not channel.closed and channel.get_transport().is_active()
+
+    def _open_ftp(self, config: dict) -> ftplib.FTP:
+        """建立并登录一个FTP控制连接"""
+        # 创建FTP实例
+        ftp = ftplib.FTP()
+        ftp.set_debuglevel(0)
+        ftp.encoding = 'utf-8'
+        
+        # 连接服务器
+        logging.info(f"正在连接FTP服务器: {config['host']}:{config.get('port', 21)}")
+        ftp.connect(
+            host=config['host'],
+            port=config.get('port', 21),
+            timeout=30
+        )
+        
+        # 登录
+        logging.info("正在登录FTP服务器")
+        ftp.login(
+            user=config['username'],
+            passwd=config['password']
+        )
+        
+        # 设置被动模式
+        ftp.set_pasv(True)
+        
+        # 设置socket选项
+        if ftp.sock is not None:
+            # 启用TCP保活
+            ftp.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # 设置超时
+            ftp.sock.settimeout(30)
+        
+        return ftp
+
+    @staticmethod
+    def _check_ftp(ftp: ftplib.FTP) -> bool:
+        """检查FTP连接是否仍然可用"""
+        try:
+            ftp.voidcmd('NOOP')
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_ftp(ftp: ftplib.FTP):
+        """关闭FTP连接"""
+        try:
+            ftp.quit()
+        except Exception:
+            try:
+                ftp.close()
+            except Exception:
+                pass
+
     def _create_ftp_connection(self, task_id: str, config: dict) -> bool:
-        """创建FTP连接，包含重试机制"""
+        """创建FTP连接池，包含重试机制"""
         max_retries = 3
         retry_count = 0
         retry_delay = 2  # 重试延迟（秒）
+        parallel = max(1, int(config.get('parallel_transfers', 4)))
         
         while retry_count < max_retries:
             try:
-                # 创建FTP实例
-                ftp = ftplib.FTP()
-                ftp.set_debuglevel(0)
-                ftp.encoding = 'utf-8'
-                
-                # 连接服务器
-                logging.info(f"正在连接FTP服务器: {config['host']}:{config.get('port', 21)}")
-                ftp.connect(
-                    host=config['host'],
-                    port=config.get('port', 21),
-                    timeout=30
-                )
-                
-                # 登录
-                logging.info("正在登录FTP服务器")
-                ftp.login(
-                    user=config['username'],
-                    passwd=config['password']
-                )
-                
-                # 设置被动模式
-                ftp.set_pasv(True)
-                
-                # 设置socket选项
-                if ftp.sock is not None:
-                    # 启用TCP保活
-                    ftp.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-                    # 设置超时
-                    ftp.sock.settimeout(30)
+                ftp = self._open_ftp(config)
                 
                 # 测试连接
                 ftp.voidcmd('NOOP')
@@ -126,16 +265,29 @@ class SyncManager:
                 welcome = ftp.getwelcome()
                 logging.info(f"FTP服务器欢迎信息: {welcome}")
                 
+                # 创建连接池，首个连接放入池中，其余连接按需建立
+                ftp_pool = ConnectionPool(
+                    factory=lambda: self._open_ftp(config),
+                    max_size=parallel,
+                    validator=self._check_ftp,
+                    closer=self._close_ftp
+                )
+                ftp_pool.add(ftp)
+                
                 # 保存连接信息
                 self.connections[task_id] = {
                     'type': 'FTP',
-                    'ftp': ftp,
+                    'ftp_pool': ftp_pool,
                     'config': config,
-                    'pool': concurrent.futures.ThreadPoolExecutor(max_workers=4)  # 添加线程池
+                    'parallel': parallel,
+                    'executor': concurrent.futures.ThreadPoolExecutor(
+                        max_workers=parallel,
+                        thread_name_prefix=f'FTP-{task_id}'
+                    )
                 }
                 self.connection_locks[task_id] = Lock()
                 
-                logging.info("FTP连接创建成功")
+                logging.info(f"FTP连接创建成功，最大并发连接数: {parallel}")
                 return True
                 
             except (socket.error, ftplib.error_temp) as e:
@@ -151,13 +303,6 @@ class SyncManager:
                 logging.error(f"创建FTP连接失败: {str(e)}")
                 return False
 
-    def _get_basic_auth(self, username: str, password: str) -> str:
-        """生成Basic认证头"""
-        import base64
-        auth_str = f"{username}:{password}"
-        auth_bytes = auth_str.encode('utf-8')
-        return base64.b64encode(auth_bytes).decode('utf-8')
-
     def _create_webdav_connection(self, task_id: str, config: dict) -> bool:
         """创建WebDAV连接"""
         max_retries = 3
@@ -166,31 +311,8 @@ class SyncManager:
         
         while retry_count <= max_retries:
             try:
-                # 创建Session对象以复用连接
-                session = requests.Session()
-                
-                # 配置连接池
-                adapter = requests.adapters.HTTPAdapter(
-                    pool_connections=10,    # 连接池大小
-                    pool_maxsize=10,        # 最大连接数
-                    max_retries=3,          # 连接级别的重试
-                    pool_block=False        # 连接池满时不阻塞
-                )
-                session.mount('http://', adapter)
-                session.mount('https://', adapter)
-                
-                # 设置认证
-                session.auth = (config['username'], config['password'])
-                
-                # 设置通用请求头
-                session.headers.update({
-                    'User-Agent': 'WebDAV Client',
-                    'Accept': '*/*',
-                    'Content-Type': 'application/xml',
-                    'Connection': 'keep-alive',
-                    'Keep-Alive': 'timeout=60, max=1000',
-                    'Authorization': f'Basic {self._get_basic_auth(config["username"], config["password"])}',
-                })
+                # 持久会话及其连接池，整个任务期间复用（包括重新认证后）
+                session = WebDAVTransport(config['username'], config['password'])
                 
                 # 使用用户提供的WebDAV URL
                 webdav_url = config['host'].rstrip('/')
@@ -206,6 +328,8 @@ class SyncManager:
                     },
                     timeout=30  # 添加超时设置
                 )
+                if response.status_code == 401:
+                    session.close()
                 response.raise_for_status()
                 
                 # 创建线程池
@@ -222,6 +346,19 @@ class SyncManager:
                     'retry_count': 0,
                     'max_retries': 3
                 }
+                # 异步客户端不支持代理和重定向，需要代理或地址被重定向时使用同步方式
+                proxies = session.session.proxies or requests.utils.get_environ_proxies(webdav_url)
+                if config.get('webdav_async', False) and proxies:
+                    logging.info("WebDAV通过代理访问，不使用异步模式")
+                elif config.get('webdav_async', False) and response.history:
+                    logging.info(f"WebDAV地址被重定向到 {response.url}，不使用异步模式")
+                elif config.get('webdav_async', False):
+                    # 异步模式：在一个事件循环线程中同时进行多个请求
+                    self.connections[task_id]['async_loop'] = EventLoopThread(f'WebDAV-async-{task_id}')
+                    self.connections[task_id]['async_client'] = AsyncWebDAVClient(
+                        config['host'], config['username'], config['password'],
+                        int(config.get('webdav_concurrency', DEFAULT_CONCURRENCY)),
+                        throttle_delay=partial(self.rate_limiter.reserve, task_id))
                 self.connection_locks[task_id] = Lock()
                 
                 return True
@@ -242,36 +379,58 @@ class SyncManager:
         
         return False
 
-    def close_connection(self, task_id: str):
-        """关闭与远程服务器的连接"""
+    def close_connection(self, task_id: str, wait: bool = True):
+        """关闭与远程服务器的连接
+        
+        wait为False时不等待线程池中的传输线程和异步事件循环退出（界面线程中调用，
+        调用前应确认没有正在进行的传输）。
+        """
         if task_id in self.connections:
             try:
                 conn = self.connections[task_id]
                 if conn['type'] == 'SFTP':
-                    conn['sftp'].close()
-                    conn['ssh'].close()
+                    try:
+                        conn['executor'].shutdown(wait=wait)
+                    finally:
+                        conn['sftp_pool'].close_all()
+                        conn['ssh'].close()
                 elif conn['type'] == 'FTP':
                     try:
                         # 关闭线程池
-                        if 'pool' in conn:
-                            conn['pool'].shutdown(wait=True)
-                        # 关闭FTP连接
-                        conn['ftp'].quit()
-                    except:
-                        try:
-                            conn['ftp'].close()
-                        except:
-                            pass
+                        conn['executor'].shutdown(wait=wait)
+                    finally:
+                        # 关闭连接池中的所有FTP连接
+                        conn['ftp_pool'].close_all()
                 elif conn['type'] == 'WebDAV':
                     try:
                         # 关闭线程池
                         if 'pool' in conn:
-                            conn['pool'].shutdown(wait=True)
+                            conn['pool'].shutdown(wait=wait)
                     except Exception as e:
                         logging.error(f"关闭WebDAV线程池失败: {str(e)}")
+                    finally:
+                        conn['session'].close()
+                        if 'async_loop' in conn:
+                            async_loop = conn['async_loop']
+                            if wait:
+                                try:
+                                    async_loop.run(conn['async_client'].close(), timeout=10)
+                                finally:
+                                    async_loop.stop()
+                            else:
+                                # 关闭空闲连接后停止事件循环，不等待
+                                async_loop.submit(conn['async_client'].close()).add_done_callback(
+                                    lambda _: async_loop.stop(wait=False))
+                
+                if 'checkpoints' in conn:
+                    conn['checkpoints'].flush()
+                if 'content_index' in conn:
+                    conn['content_index'].close()
                 
                 del self.connections[task_id]
                 del self.connection_locks[task_id]
+                self.scheduler.remove_task(task_id)
+                self.rate_limiter.remove_task(task_id)
                 
             except Exception as e:
                 logging.error(f"关闭连接失败: {str(e)}")
@@ -288,23 +447,19 @@ class SyncManager:
         
         try:
             if conn['type'] == 'FTP':
-                # 使用线程池进行FTP同步
-                future = conn['pool'].submit(
-                    self._sync_file_ftp,
-                    conn['ftp'],
-                    local_path,
-                    remote_path,
-                    operation,
-                    conn['config']
-                )
-                return future.result(timeout=60)  # 设置超时时间
+                # 从连接池取出一个控制连接，可由多个线程同时调用
+                with conn['ftp_pool'].connection() as ftp:
+                    return self._sync_file_ftp(ftp, local_path, remote_path, operation, conn['config'],
+                                               conn.get('checkpoints'), conn.get('known_dirs'),
+                                               conn.get('throttle'))
+            elif conn['type'] == 'SFTP':
+                # 每个调用各自使用一个SFTP通道，可由多个线程同时调用
+                with conn['sftp_pool'].connection() as sftp:
+                    return self._sync_file_sftp(sftp, local_path, remote_path, operation, conn)
             else:
                 # 其他协议使用原有的同步方式
                 with lock:
-                    if conn['type'] == 'SFTP':
-                        return self._sync_file_sftp(conn['sftp'], local_path, 
-                                                  remote_path, operation)
-                    elif conn['type'] == 'WebDAV':
+                    if conn['type'] == 'WebDAV':
                         return self._sync_file_webdav(conn['session'], local_path, 
                                                     remote_path, operation, task_id)
                     return False
@@ -316,33 +471,1079 @@ class SyncManager:
             logging.error(f"同步文件失败: {str(e)}")
             return False
 
-    def _sync_file_sftp(self, sftp, local_path: str, remote_path: str, 
-                       operation: str) -> bool:
-        """通过SFTP同步文件"""
+    def rename_remote(self, task_id: str, old_remote_path: str, new_remote_path: str) -> bool:
+        """在服务器端移动（重命名）文件或目录，只需一次元数据操作"""
+        if task_id not in self.connections:
+            logging.error(f"任务 {task_id} 未建立连接")
+            return False
+        
+        conn = self.connections[task_id]
+        new_parent = posixpath.dirname(new_remote_path)
+        try:
+            if conn['type'] == 'SFTP':
+                with conn['sftp_pool'].connection() as sftp:
+                    try:
+                        self._mkdir_p_sftp(sftp, new_parent, conn.get('known_dirs'))
+                        try:
+                            sftp.posix_rename(old_remote_path, new_remote_path)
+                        except IOError:
+                            # 服务器不支持posix-rename扩展时使用标准rename（目标已存在时会失败）
+                            sftp.rename(old_remote_path, new_remote_path)
+                    except IOError as e:
+                        logging.error(f"SFTP移动失败: {old_remote_path} -> {new_remote_path}, 错误: {str(e)}")
+                        return False
+                if 'signatures' in conn:
+                    conn['signatures'].rename(old_remote_path, new_remote_path)
+            elif conn['type'] == 'FTP':
+                with conn['ftp_pool'].connection() as ftp:
+                    try:
+                        self._mkdir_p_ftp(ftp, new_parent, conn.get('known_dirs'))
+                        ftp.rename(old_remote_path, new_remote_path)
+                    except ftplib.error_perm as e:
+                        logging.error(f"FTP移动失败: {old_remote_path} -> {new_remote_path}, 错误: {str(e)}")
+                        return False
+            elif conn['type'] == 'WebDAV':
+                with self.connection_locks[task_id]:
+                    session = conn['session']
+                    base_url = conn['config']['host']
+                    self._ensure_webdav_dir(session, base_url, new_parent, conn.get('known_dirs'))
+                    response = session.request('MOVE', self._webdav_url(base_url, old_remote_path), headers={
+                        'Destination': self._webdav_url(base_url, new_remote_path),
+                        'Overwrite': 'T'
+                    }, timeout=60)
+                    if response.status_code not in [201, 204]:
+                        logging.error(f"WebDAV移动失败: {old_remote_path} -> {new_remote_path}, "
+                                      f"状态码: {response.status_code}")
+                        return False
+            else:
+                return False
+            if 'content_index' in conn:
+                conn['content_index'].rename(old_remote_path, new_remote_path)
+            if 'known_dirs' in conn:
+                conn['known_dirs'].discard(old_remote_path)
+            logging.info(f"远程移动成功: {old_remote_path} -> {new_remote_path}")
+            return True
+        except Exception as e:
+            logging.error(f"远程移动失败: {old_remote_path} -> {new_remote_path}, 错误: {str(e)}")
+            return False
+
+    def copy_remote(self, task_id: str, source_remote_path: str, target_remote_path: str) -> bool:
+        """在服务器端复制文件，不经过本地传输内容
+        
+        SFTP优先使用copy-data扩展，不支持时通过exec执行cp；WebDAV使用COPY。FTP不支持服务器端复制。
+        """
+        if task_id not in self.connections:
+            logging.error(f"任务 {task_id} 未建立连接")
+            return False
+        
+        conn = self.connections[task_id]
+        target_parent = posixpath.dirname(target_remote_path)
         try:
-            if operation == 'upload':
-                # 确保远程目录存在
-                remote_dir = os.path.dirname(remote_path)
+            if conn['type'] == 'SFTP':
+                with conn['sftp_pool'].connection() as sftp:
+                    self._mkdir_p_sftp(sftp, target_parent, conn.get('known_dirs'))
+                    if conn.get('sftp_copy_data', True):
+                        try:
+                            copy_remote_file(sftp, source_remote_path, target_remote_path)
+                            return True
+                        except (FileNotFoundError, PermissionError) as e:
+                            logging.warning(f"SFTP服务器端复制失败: {source_remote_path} -> "
+                                            f"{target_remote_path}, 错误: {str(e)}")
+                            return False
+                        except IOError:
+                            # 服务器不支持copy-data扩展
+                            conn['sftp_copy_data'] = False
+                if not conn.get('sftp_exec_cp', True):
+                    return False
+                return self._copy_remote_exec(conn, source_remote_path, target_remote_path)
+            elif conn['type'] == 'WebDAV':
+                with self.connection_locks[task_id]:
+                    session = conn['session']
+                    base_url = conn['config']['host']
+                    self._ensure_webdav_dir(session, base_url, target_parent, conn.get('known_dirs'))
+                    response = session.request('COPY', self._webdav_url(base_url, source_remote_path), headers={
+                        'Destination': self._webdav_url(base_url, target_remote_path),
+                        'Overwrite': 'T'
+                    }, timeout=60)
+                    if response.status_code not in [201, 204]:
+                        logging.warning(f"WebDAV复制失败: {source_remote_path} -> {target_remote_path}, "
+                                        f"状态码: {response.status_code}")
+                        return False
+                    return True
+            return False
+        except Exception as e:
+            logging.error(f"服务器端复制失败: {source_remote_path} -> {target_remote_path}, 错误: {str(e)}")
+            return False
+
+    def ensure_remote_dirs(self, task_id: str, remote_dirs: Iterable[str]):
+        """上传一批文件前从上到下一次性创建所有缺少的远程目录
+        
+        上级目录是本次新建的，下级目录必然不存在，直接创建而不先检查。
+        失败时只记录日志，上传时会再逐个检查。
+        """
+        conn = self.connections.get(task_id)
+        if conn is None or 'known_dirs' not in conn:
+            return
+        known_dirs = conn['known_dirs']
+        missing = known_dirs.missing(remote_dirs)
+        if not missing:
+            return
+        
+        created = set()
+        try:
+            if conn['type'] == 'SFTP':
+                with conn['sftp_pool'].connection() as sftp:
+                    for remote_dir in missing:
+                        if posixpath.dirname(remote_dir) not in created:
+                            try:
+                                sftp.stat(remote_dir)
+                                known_dirs.add(remote_dir)
+                                continue
+                            except FileNotFoundError:
+                                pass
+                        try:
+                            sftp.mkdir(remote_dir)
+                        except IOError:
+                            # 并发传输时目录可能已被其他通道创建
+                            sftp.stat(remote_dir)
+                        created.add(remote_dir)
+                        known_dirs.add(remote_dir)
+            elif conn['type'] == 'FTP':
+                with conn['ftp_pool'].connection() as ftp:
+                    for remote_dir in missing:
+                        if posixpath.dirname(remote_dir) not in created:
+                            try:
+                                ftp.cwd(remote_dir)
+                                known_dirs.add(remote_dir)
+                                continue
+                            except ftplib.error_perm:
+                                pass
+                        ftp.mkd(remote_dir)
+                        created.add(remote_dir)
+                        known_dirs.add(remote_dir)
+            elif conn['type'] == 'WebDAV' and self._use_async(conn):
+                # 需要改用同步方式时未创建的目录由上传时逐个创建
+                conn['async_loop'].run(self._webdav_mkdirs_async(conn, missing))
+            elif conn['type'] == 'WebDAV':
+                with self.connection_locks[task_id]:
+                    for remote_dir in missing:
+                        self._ensure_webdav_dir(conn['session'], conn['config']['host'], remote_dir, known_dirs)
+            if created:
+                logging.info(f"批量创建远程目录: {len(created)}个")
+        except Exception as e:
+            logging.warning(f"批量创建远程目录失败，上传时逐个创建: {str(e)}")
+
+    @staticmethod
+    def _copy_remote_exec(conn: dict, source_remote_path: str, target_remote_path: str) -> bool:
+        """通过SSH exec在服务器上执行cp复制文件（要求SFTP路径与shell路径一致）"""
+        try:
+            _, stdout, _ = conn['ssh'].exec_command(
+                f'cp -- {shlex.quote(source_remote_path)} {shlex.quote(target_remote_path)}', timeout=60)
+            status = stdout.channel.recv_exit_status()
+        except paramiko.SSHException as e:
+            # 服务器禁止执行命令（如仅允许SFTP的账号）
+            logging.info(f"SFTP服务器不支持执行命令，不再尝试服务器端复制: {str(e)}")
+            conn['sftp_exec_cp'] = False
+            return False
+        if status == 127:
+            conn['sftp_exec_cp'] = False
+        return status == 0
+
+    @staticmethod
+    def get_remote_path(local_dir: str, remote_dir: str, local_path: str) -> str:
+        """根据本地文件路径计算对应的远程路径（Unix风格，以/开头）"""
+        relative_path = os.path.relpath(local_path, local_dir)
+        remote_path = os.path.normpath(os.path.join(remote_dir, relative_path))
+        remote_path = remote_path.replace('\\', '/')
+        if not remote_path.startswith('/'):
+            remote_path = '/' + remote_path
+        return remote_path
+
+    def _sync_one(self, task_id: str, local_path: str, remote_path: str,
+                  operation: str, verify: bool, acquire_slot: bool = True) -> bool:
+        """获得调度器的传输槽后同步单个文件并按需验证，记录结果日志
+        
+        acquire_slot为False时调用方已持有传输槽。
+        """
+        slot = nullcontext()
+        if acquire_slot:
+            slot = self.scheduler.slot(task_id, *self.scheduler.classify(task_id, operation, local_path))
+        with slot:
+            success = self.sync_file(task_id, local_path, remote_path, operation)
+        if operation == 'delete':
+            if success:
+                logging.info(f"删除远程文件成功: {remote_path}")
+            else:
+                logging.error(f"删除远程文件失败: {remote_path}")
+            return success
+        
+        if not success:
+            logging.error(f"同步文件失败: {local_path} -> {remote_path}")
+            # 远程目录可能已被删除，下次上传时重新检查
+            known_dirs = self.connections.get(task_id, {}).get('known_dirs')
+            if known_dirs is not None:
+                known_dirs.discard(posixpath.dirname(remote_path))
+            return False
+        if verify and operation == 'upload':
+            # 验证远程文件
+            if not self.verify_remote_file(task_id, local_path, remote_path):
+                logging.error(f"文件同步验证失败: {local_path} -> {remote_path}")
+                return False
+            logging.info(f"同步文件成功并验证: {local_path} -> {remote_path}")
+        return True
+
+    def sync_files(self, task_id: str, operations: List[Tuple[str, str, str]], verify: bool = False,
+                   progress_callback: Optional[Callable[[int, int], None]] = None,
+                   should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, bool]:
+        """批量同步文件，返回 远程路径 -> 是否成功
+        
+        operations 为 (本地路径, 远程路径, 操作) 列表。连接支持并发时（如FTP连接池）
+        通过线程池同时传输多个文件，否则按顺序执行。
+        """
+        results: Dict[str, bool] = {}
+        if task_id not in self.connections:
+            logging.error(f"任务 {task_id} 未建立连接")
+            return {remote_path: False for _, remote_path, _ in operations}
+        
+        conn = self.connections[task_id]
+        if self._use_async(conn):
+            return self._sync_files_async(task_id, operations, verify, progress_callback, should_stop)
+        executor = conn.get('executor')
+        total = len(operations)
+        done = 0
+        
+        if executor is None:
+            for local_path, remote_path, operation in operations:
+                if should_stop and should_stop():
+                    break
+                results[remote_path] = self._sync_one(task_id, local_path, remote_path, operation, verify)
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total)
+            return results
+        
+        # 只保持有限数量的操作在执行中，以便及时响应停止请求
+        max_in_flight = conn.get('parallel', 1) * 2
+        pending = iter(operations)
+        futures: Dict[concurrent.futures.Future, Tuple[str, str, str]] = {}
+        while True:
+            while len(futures) < max_in_flight and not (should_stop and should_stop()):
+                operation = next(pending, None)
+                if operation is None:
+                    break
+                future = executor.submit(self._sync_one, task_id, *operation, verify)
+                futures[future] = operation
+            if not futures:
+                break
+            finished, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                _, remote_path, _ = futures.pop(future)
                 try:
-                    sftp.stat(remote_dir)
-                except FileNotFoundError:
-                    self._mkdir_p_sftp(sftp, remote_dir)
-                
-                sftp.put(local_path, remote_path)
-            elif operation == 'download':
-                # 确保本地目录存在
-                os.makedirs(os.path.dirname(local_path), exist_ok=True)
-                sftp.get(remote_path, local_path)
+                    results[remote_path] = future.result()
+                except Exception as e:
+                    logging.error(f"同步文件失败: {remote_path}, 错误: {str(e)}")
+                    results[remote_path] = False
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total)
+        return results
+
+    def _sync_files_async(self, task_id: str, operations: List[Tuple[str, str, str]], verify: bool,
+                          progress_callback: Optional[Callable[[int, int], None]],
+                          should_stop: Optional[Callable[[], bool]]) -> Dict[str, bool]:
+        """异步WebDAV模式的批量同步：在事件循环中同时进行多个PUT/DELETE请求
+        
+        调用线程等待结果并报告进度，收到停止请求后不再开始新的操作。
+        """
+        conn = self.connections[task_id]
+        client = conn['async_client']
+        finished: Queue = Queue()
+        stopping = threading.Event()
+        
+        async def run_one(window: asyncio.Semaphore, local_path: str, remote_path: str, operation: str):
+            try:
+                success = await self._webdav_operation_async(task_id, conn, local_path, remote_path,
+                                                             operation, verify)
+            except Exception as e:
+                logging.error(f"同步文件失败: {remote_path}, 错误: {str(e)}")
+                success = False
+            finally:
+                window.release()
+            finished.put((remote_path, success))
+        
+        async def run_all():
+            # 只保持有限数量的操作在执行中，以便及时响应停止请求
+            window = asyncio.Semaphore(client.concurrency * 2)
+            tasks = []
+            for local_path, remote_path, operation in operations:
+                await window.acquire()
+                if stopping.is_set():
+                    break
+                tasks.append(asyncio.ensure_future(run_one(window, local_path, remote_path, operation)))
+            if tasks:
+                await asyncio.wait(tasks)
+        
+        future = conn['async_loop'].submit(run_all())
+        results: Dict[str, bool] = {}
+        total = len(operations)
+        while True:
+            try:
+                remote_path, success = finished.get(timeout=0.2)
+            except Empty:
+                if should_stop and should_stop():
+                    stopping.set()
+                if future.done() and finished.empty():
+                    break
+                continue
+            results[remote_path] = success
+            if progress_callback:
+                progress_callback(len(results), total)
+        try:
+            future.result()
+        except Exception as e:
+            logging.error(f"异步WebDAV同步失败: {str(e)}")
+        return results
+
+    @staticmethod
+    def _use_async(conn: dict) -> bool:
+        """连接是否使用异步WebDAV客户端"""
+        return 'async_client' in conn and not conn.get('async_fallback')
+
+    @staticmethod
+    def _disable_async(conn: dict, status: int):
+        """服务器返回异步客户端不处理的响应（重定向或401），之后该连接改用同步方式"""
+        if not conn.get('async_fallback'):
+            logging.warning(f"WebDAV服务器返回{status}（重定向或需要重新认证），之后改用同步方式")
+            conn['async_fallback'] = True
+
+    async def _webdav_operation_async(self, task_id: str, conn: dict, local_path: str, remote_path: str,
+                                      operation: str, verify: bool) -> bool:
+        """从调度器获得传输槽后异步上传或删除一个文件
+        
+        需要断点续传的大文件和需要压缩的文件交给线程池中的同步上传路径处理；
+        服务器返回重定向或401时同样改由同步的WebDAVTransport重新执行（跟随重定向、重新认证）。
+        """
+        loop = asyncio.get_running_loop()
+        priority, size = self.scheduler.classify(task_id, operation, local_path)
+        # 先在事件循环中等待传输槽，线程池中只运行已获得传输槽的操作
+        async with self.scheduler.async_slot(task_id, priority, size):
+            success = None
+            stats = conn.get('compression_stats')
+            if operation != 'upload' or not (
+                    size >= RESUME_MIN_SIZE or (stats is not None and conn.get('webdav_gzip') is not False
+                                                and is_compressible(local_path))):
+                success = await self._webdav_try_async(task_id, conn, local_path, remote_path, operation, verify)
+            if success is None:
+                success = await loop.run_in_executor(
+                    None, partial(self._sync_one, task_id, local_path, remote_path, operation, verify,
+                                  acquire_slot=False))
+        return success
+
+    async def _webdav_try_async(self, task_id: str, conn: dict, local_path: str, remote_path: str,
+                                operation: str, verify: bool) -> Optional[bool]:
+        """用异步客户端执行一个操作，需要改用同步方式时返回None"""
+        client = conn['async_client']
+        url = self._webdav_url(conn['config']['host'], remote_path)
+        if operation == 'delete':
+            response = await client.request('DELETE', url)
+            if response.status in FALLBACK_STATUSES:
+                self._disable_async(conn, response.status)
+                return None
+            # 404表示远程文件已不存在，与删除成功相同
+            if response.status in (200, 204, 404):
+                logging.info(f"删除远程文件成功: {remote_path}")
+                return True
+            logging.error(f"删除远程文件失败: {remote_path}, 状态码: {response.status}")
+            return False
+        
+        size = os.path.getsize(local_path)
+        remote_dir = posixpath.dirname(remote_path)
+        if not await self._webdav_mkdirs_async(conn, conn['known_dirs'].missing([remote_dir])):
+            return None
+        response = await client.request('PUT', url, PUT_HEADERS, body_path=local_path, body_length=size)
+        if response.status == 409:
+            # 上级目录已被删除，重新创建后再上传一次
+            conn['known_dirs'].discard(remote_dir)
+            if not await self._webdav_mkdirs_async(conn, conn['known_dirs'].missing([remote_dir])):
+                return None
+            response = await client.request('PUT', url, PUT_HEADERS, body_path=local_path, body_length=size)
+        if response.status in FALLBACK_STATUSES:
+            self._disable_async(conn, response.status)
+            return None
+        if response.status not in (200, 201, 204):
+            logging.error(f"同步文件失败: {local_path} -> {remote_path}, 状态码: {response.status}")
+            conn['known_dirs'].discard(remote_dir)
+            return False
+        if verify and not await self._verify_webdav_file_async(task_id, conn, url, local_path, remote_path, size):
+            logging.error(f"文件同步验证失败: {local_path} -> {remote_path}")
+            return False
+        logging.info(f"文件上传成功: {local_path} -> {remote_path}")
+        return True
+
+    async def _verify_webdav_file_async(self, task_id: str, conn: dict, url: str, local_path: str,
+                                        remote_path: str, size: int) -> bool:
+        """用Depth:0的PROPFIND只获取文件自身的属性，检查文件是否存在且大小正确"""
+        try:
+            response = await conn['async_client'].request(
+                'PROPFIND', url, dict(WEBDAV_LISTING_HEADERS, Depth='0'), WEBDAV_LISTING_BODY.encode('utf-8'))
+            if response.status in FALLBACK_STATUSES:
+                self._disable_async(conn, response.status)
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, self.verify_remote_file, task_id, local_path, remote_path)
+            if response.status != 207:
+                return False
+            # Depth:0的响应中只有文件自身，按其所在目录解析
+            listing = from_propfind(response.text, url.rsplit('/', 1)[0])
+        except Exception as e:
+            logging.warning(f"验证远程文件失败: {remote_path}, 错误: {str(e)}")
+            return False
+        entry = listing.get(posixpath.basename(remote_path))
+        return entry is not None and not entry.is_dir and entry.size == size
+
+    async def _webdav_mkdirs_async(self, conn: dict, missing: List[str]) -> bool:
+        """从上到下创建缺少的WebDAV目录，同一层的目录同时创建；需要改用同步方式时返回False"""
+        client = conn['async_client']
+        known_dirs = conn['known_dirs']
+        levels: Dict[int, List[str]] = {}
+        for remote_dir in missing:
+            levels.setdefault(remote_dir.count('/'), []).append(remote_dir)
+        fallback = []
+        
+        async def mkcol(remote_dir: str):
+            url = self._webdav_url(conn['config']['host'], remote_dir)
+            response = await client.request('MKCOL', url)
+            # 405表示目录已存在（可能由同时进行的其他上传创建）
+            if response.status in (200, 201, 405):
+                known_dirs.add(remote_dir)
+            elif response.status in FALLBACK_STATUSES:
+                fallback.append(response.status)
+            else:
+                logging.error(f"创建WebDAV目录失败: {url}, 状态码: {response.status}")
+        
+        for depth in sorted(levels):
+            await asyncio.gather(*(mkcol(remote_dir) for remote_dir in levels[depth]))
+            if fallback:
+                self._disable_async(conn, fallback[0])
+                return False
+        return True
+
+    async def _list_webdav_dir_async(self, conn: dict, remote_dir: str) -> Optional[RemoteListing]:
+        """异步获取WebDAV目录列表，返回值与list_remote_dir相同"""
+        url = self._webdav_url(conn['config']['host'], remote_dir).rstrip('/') + '/'
+        try:
+            response = await conn['async_client'].request(
+                'PROPFIND', url, dict(WEBDAV_LISTING_HEADERS, Depth='1'), WEBDAV_LISTING_BODY.encode('utf-8'))
+            if response.status == 404:
+                return {}
+            if response.status in FALLBACK_STATUSES:
+                # 由调用方改为逐个文件验证
+                self._disable_async(conn, response.status)
+                return None
+            if response.status != 207:
+                logging.warning(f"WebDAV列目录失败: {remote_dir}, 状态码: {response.status}")
+                return None
+            listing = from_propfind(response.text, url)
+        except Exception as e:
+            logging.warning(f"获取远程目录列表失败: {remote_dir}, 错误: {str(e)}")
+            return None
+        self._remember_listing(conn, remote_dir, listing)
+        return listing
+
+    def apply_changes(self, task_id: str, local_dir: str, remote_dir: str,
+                      added: Set[str], modified: Set[str], deleted: Set[str],
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      should_stop: Optional[Callable[[], bool]] = None,
+                      moved: Optional[List[Tuple[str, str]]] = None,
+                      moved_dirs: Optional[List[Tuple[str, str]]] = None,
+                      hashes: Optional[Dict[str, str]] = None,
+                      results: Optional[Dict[str, bool]] = None) -> Dict[str, int]:
+        """按变化集合增量同步：只传输新增、修改和删除的文件，返回传输统计
+        
+        moved/moved_dirs 为 (旧路径, 新路径) 列表，在服务器端直接移动，失败时改为上传新文件并删除旧文件。
+        hashes 为 本地路径 -> 内容指纹，内容与已同步文件相同时在服务器端复制，失败时改为上传。
+        progress_callback(已完成数量, 总数量) 在每个文件处理后调用；
+        should_stop() 返回True时在当前文件完成后中止剩余操作。
+        results 不为None时填入 本地路径 -> 是否成功：上传和删除按文件路径，移动的新旧路径都记录，
+        目录移动按旧目录路径记录；因停止请求未执行的路径不出现在其中。
+        """
+        stats = {'uploaded': 0, 'deleted': 0, 'moved': 0, 'deduplicated': 0, 'bytes_saved': 0, 'failed': 0}
+        results = {} if results is None else results
+        moved = list(moved or [])
+        # 目录移动失败时，按其中的文件移动是否全部成功决定目录移动是否完成
+        failed_dirs = []
+        # 先整体移动目录，成功后其中的文件不再单独移动
+        for old_dir, new_dir in moved_dirs or []:
+            with self.scheduler.slot(task_id, PRIORITY_METADATA):
+                renamed = self.rename_remote(task_id, self.get_remote_path(local_dir, remote_dir, old_dir),
+                                             self.get_remote_path(local_dir, remote_dir, new_dir))
+            old_prefix = old_dir + os.sep
+            if renamed:
+                remaining = [(old_path, new_path) for old_path, new_path in moved
+                             if not old_path.startswith(old_prefix)]
+                for old_path, new_path in moved:
+                    if old_path.startswith(old_prefix):
+                        results[old_path] = results[new_path] = True
+                stats['moved'] += len(moved) - len(remaining)
+                moved = remaining
+                results[old_dir] = True
+            else:
+                failed_dirs.append((old_dir, [pair for pair in moved if pair[0].startswith(old_prefix)]))
+        
+        added = set(added)
+        deleted = set(deleted)
+        for old_path, new_path in moved:
+            if should_stop and should_stop():
+                break
+            with self.scheduler.slot(task_id, PRIORITY_METADATA):
+                renamed = self.rename_remote(task_id, self.get_remote_path(local_dir, remote_dir, old_path),
+                                             self.get_remote_path(local_dir, remote_dir, new_path))
+            if renamed:
+                stats['moved'] += 1
+                results[old_path] = results[new_path] = True
+            else:
+                added.add(new_path)
+                deleted.add(old_path)
+        
+        content_index = self.connections.get(task_id, {}).get('content_index')
+        hashes = hashes or {}
+        uploads = []
+        # 内容已在远程存在的文件: (本地路径, 远程路径, 内容指纹, 大小)
+        copies = []
+        # 与本批中另一个文件内容相同，等该文件上传后再复制
+        batch_copies = []
+        first_in_batch: Dict[str, str] = {}
+        for local_path in sorted(added | modified):
+            remote_path = self.get_remote_path(local_dir, remote_dir, local_path)
+            content_hash = hashes.get(local_path) if content_index else None
+            if content_hash:
+                try:
+                    size = os.path.getsize(local_path)
+                except OSError:
+                    size = 0
+                if size >= DEDUP_MIN_SIZE:
+                    source = content_index.lookup(content_hash)
+                    if source and source[0] != remote_path and source[1] == size:
+                        copies.append((local_path, remote_path, content_hash, size))
+                        continue
+                    if content_hash in first_in_batch:
+                        batch_copies.append((local_path, remote_path, content_hash, size))
+                        continue
+                    first_in_batch[content_hash] = remote_path
+            uploads.append(local_path)
+        
+        # 上传和复制开始前一次性创建所有缺少的目录
+        self.ensure_remote_dirs(task_id, {posixpath.dirname(self.get_remote_path(local_dir, remote_dir, local_path))
+                                          for local_path in added | modified})
+        
+        # 复制必须在删除之前完成，复制源可能在本批中被删除
+        uploads += self._copy_duplicates(task_id, copies, stats, should_stop, results)
+        
+        operations = [(local_path, self.get_remote_path(local_dir, remote_dir, local_path), 'upload')
+                      for local_path in uploads]
+        operations += [('', self.get_remote_path(local_dir, remote_dir, local_path), 'delete')
+                       for local_path in sorted(deleted)]
+        # 删除在前，其次是优先路径和小文件，大文件最后
+        operations = self.scheduler.order(task_id, operations)
+        remote_results = self._run_operations(task_id, operations, hashes, stats, progress_callback, should_stop)
+        self._record_results(local_dir, remote_dir, added | modified | deleted, remote_results, results)
+        
+        # 本批中内容相同的文件，在第一个文件上传成功后从它复制
+        remaining = [item for item in batch_copies if remote_results.get(first_in_batch[item[2]])]
+        uploads = [item[0] for item in batch_copies if not remote_results.get(first_in_batch[item[2]])]
+        uploads += self._copy_duplicates(task_id, remaining, stats, should_stop, results)
+        if uploads:
+            operations = [(local_path, self.get_remote_path(local_dir, remote_dir, local_path), 'upload')
+                          for local_path in uploads]
+            remote_results = self._run_operations(task_id, operations, hashes, stats, progress_callback,
+                                                  should_stop)
+            self._record_results(local_dir, remote_dir, uploads, remote_results, results)
+        
+        for old_dir, dir_moves in failed_dirs:
+            results[old_dir] = all(results.get(old_path) and results.get(new_path)
+                                   for old_path, new_path in dir_moves)
+        
+        totals = self.task_stats.setdefault(task_id, {})
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+        return stats
+
+    def _record_results(self, local_dir: str, remote_dir: str, local_paths: Iterable[str],
+                        remote_results: Dict[str, bool], results: Dict[str, bool]):
+        """把按远程路径的执行结果转换为按本地路径记录，未执行的路径不记录"""
+        for local_path in local_paths:
+            success = remote_results.get(self.get_remote_path(local_dir, remote_dir, local_path))
+            if success is not None:
+                results[local_path] = success
+
+    def walk_remote_tree(self, task_id: str, remote_dir: str,
+                         should_stop: Optional[Callable[[], bool]] = None) -> Optional[Dict[str, RemoteEntry]]:
+        """递归列出远程目录树，返回 远程文件路径 -> 列表项
+        
+        逐层遍历，同一层的目录并行获取列表。任一目录无法列出或被请求停止时返回None。
+        """
+        files: Dict[str, RemoteEntry] = {}
+        level = [remote_dir]
+        while level:
+            if should_stop and should_stop():
+                return None
+            listings = self.list_remote_dirs(task_id, level)
+            next_level = []
+            for parent in level:
+                listing = listings.get(parent)
+                if listing is None:
+                    return None
+                for name, entry in listing.items():
+                    path = posixpath.join(parent, name)
+                    if entry.is_dir:
+                        next_level.append(path)
+                    else:
+                        files[path] = entry
+            level = next_level
+        return files
+
+    def remote_file_hash(self, task_id: str, remote_path: str) -> Optional[str]:
+        """由服务器计算文件的SHA-256（FTP HASH命令），服务器不支持时返回None"""
+        conn = self.connections.get(task_id)
+        if conn is None or conn['type'] != 'FTP' or conn.get('ftp_hash') is False:
+            return None
+        try:
+            with conn['ftp_pool'].connection() as ftp:
+                # 不支持的命令和文件不存在等5xx应答在连接内处理，连接照常归还连接池
+                try:
+                    if conn.get('ftp_hash') is None:
+                        features = ftp.sendcmd('FEAT').upper()
+                        conn['ftp_hash'] = any(line.strip().startswith('HASH') and 'SHA-256' in line
+                                               for line in features.splitlines())
+                        if not conn['ftp_hash']:
+                            return None
+                    ftp.sendcmd('OPTS HASH SHA-256')
+                    # 响应格式: 213 SHA-256 0-1234 <十六进制哈希> <文件名>
+                    parts = ftp.sendcmd(f'HASH {remote_path}').split(' ', 4)
+                    if len(parts) >= 4 and parts[1].upper() == 'SHA-256':
+                        return parts[3].lower()
+                except ftplib.error_perm as e:
+                    # 500/502/504: 服务器不支持该命令或参数，之后不再尝试
+                    if str(e)[:3] in ('500', '501', '502', '504'):
+                        conn['ftp_hash'] = False
+                    logging.info(f"FTP服务器计算哈希失败: {remote_path}, 错误: {str(e)}")
+        except Exception as e:
+            logging.warning(f"获取远程文件哈希失败: {remote_path}, 错误: {str(e)}")
+        return None
+
+    def startup_reconcile(self, task_id: str, local_dir: str, remote_dir: str,
+                          local_records: Dict[str, FileRecord],
+                          progress_callback: Optional[Callable[[int, int], None]] = None,
+                          should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, int]:
+        """任务启动时与远程核对：递归列出远程目录树，只上传远程缺少或与本地不一致的文件
+        
+        local_records 为本地状态索引的记录。大小不同的文件需要上传；大小相同时，
+        远程修改时间与本地相同（SFTP上传时会设置）或晚于本地修改时间即视为已同步，
+        否则（包括服务器不提供修改时间时）在服务器能计算SHA-256时比较哈希值，不能比较则上传。
+        只存在于远程的文件不删除。
+        """
+        stats = {'checked': 0, 'different': 0}
+        root = self.get_remote_path(local_dir, remote_dir, local_dir)
+        logging.info(f"开始启动核对: {local_dir} -> {root}")
+        remote_files = self.walk_remote_tree(task_id, root, should_stop)
+        if remote_files is None:
+            logging.warning(f"无法列出远程目录，跳过启动核对: {root}")
+            return stats
+        
+        config = self.connections.get(task_id, {}).get('config', {})
+        compare_hash = config.get('hash_algorithm', 'sha256') == 'sha256'
+        different = set()
+        for local_path, (size, mtime_ns, _, file_hash) in local_records.items():
+            if should_stop and should_stop():
+                return stats
+            stats['checked'] += 1
+            remote_path = self.get_remote_path(local_dir, remote_dir, local_path)
+            entry = remote_files.get(remote_path)
+            if entry is None or entry.size != size:
+                different.add(local_path)
+                continue
+            local_mtime = mtime_ns / 1e9
+            if entry.mtime is not None and (int(entry.mtime) == int(local_mtime) or entry.mtime >= local_mtime):
+                continue
+            if compare_hash and self.remote_file_hash(task_id, remote_path) == file_hash:
+                continue
+            different.add(local_path)
+        
+        stats['different'] = len(different)
+        logging.info(f"启动核对完成: 本地{stats['checked']}个文件, 远程{len(remote_files)}个文件, "
+                     f"需要上传{len(different)}个")
+        if different:
+            stats.update(self.apply_changes(task_id, local_dir, remote_dir, different, set(), set(),
+                                            progress_callback, should_stop))
+        return stats
+
+    def _run_operations(self, task_id: str, operations: List[Tuple[str, str, str]], hashes: Dict[str, str],
+                        stats: Dict[str, int], progress_callback: Optional[Callable[[int, int], None]],
+                        should_stop: Optional[Callable[[], bool]]) -> Dict[str, bool]:
+        """执行上传和删除，累加统计并更新已同步内容的索引"""
+        conn = self.connections.get(task_id, {})
+        content_index = conn.get('content_index')
+        # bulk: 全部上传完成后按目录列表批量验证; file: 每个文件上传后单独验证; none: 不验证
+        verify_mode = conn.get('config', {}).get('verify_mode', 'bulk')
+        results = self.sync_files(task_id, operations, verify=verify_mode == 'file',
+                                  progress_callback=progress_callback, should_stop=should_stop)
+        if verify_mode == 'bulk':
+            uploaded = [(local_path, remote_path) for local_path, remote_path, operation in operations
+                        if operation == 'upload' and results.get(remote_path)]
+            if uploaded:
+                results.update(self.verify_remote_files(task_id, uploaded))
+        for local_path, remote_path, operation in operations:
+            if remote_path not in results:
+                continue
+            if not results[remote_path]:
+                stats['failed'] += 1
             elif operation == 'delete':
-                sftp.remove(remote_path)
-            return True
+                stats['deleted'] += 1
+            else:
+                stats['uploaded'] += 1
+            if content_index is None:
+                continue
+            content_hash = hashes.get(local_path)
+            if results[remote_path] and operation == 'upload' and content_hash:
+                try:
+                    content_index.record(content_hash, remote_path, os.path.getsize(local_path))
+                    continue
+                except OSError:
+                    pass
+            content_index.discard(remote_path)
+        return results
+
+    def _copy_duplicates(self, task_id: str, copies: List[Tuple[str, str, str, int]], stats: Dict[str, int],
+                         should_stop: Optional[Callable[[], bool]],
+                         results: Optional[Dict[str, bool]] = None) -> List[str]:
+        """在服务器端复制内容已同步的文件，返回复制失败、需要上传的本地路径
+
+        复制成功的本地路径在results中记为成功。
+        """
+        content_index = self.connections[task_id]['content_index'] if copies else None
+        failed = []
+        for local_path, remote_path, content_hash, size in copies:
+            if should_stop and should_stop():
+                break
+            source = content_index.lookup(content_hash)
+            copied = False
+            if source:
+                with self.scheduler.slot(task_id, PRIORITY_METADATA):
+                    copied = self.copy_remote(task_id, source[0], remote_path)
+            if copied and self.verify_remote_file(task_id, local_path, remote_path):
+                content_index.record(content_hash, remote_path, size)
+                stats['deduplicated'] += 1
+                stats['bytes_saved'] += size
+                if results is not None:
+                    results[local_path] = True
+                logging.info(f"服务器端复制相同内容: {source[0]} -> {remote_path}")
+                continue
+            if source:
+                # 远程源文件可能已被删除或修改，不再用作复制源
+                content_index.discard(source[0])
+            failed.append(local_path)
+        return failed
+
+    def full_reconcile(self, task_id: str, local_dir: str, remote_dir: str,
+                       local_files: Iterable[str],
+                       progress_callback: Optional[Callable[[int, int], None]] = None,
+                       should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, int]:
+        """全量同步：上传本地索引中的所有文件，仅在用户明确请求时调用"""
+        logging.info(f"开始全量同步: {local_dir} -> {remote_dir}")
+        return self.apply_changes(task_id, local_dir, remote_dir, set(local_files), set(), set(),
+                                  progress_callback, should_stop)
+
+    def _sync_file_sftp(self, sftp, local_path: str, remote_path: str,
+                       operation: str, conn: Optional[dict] = None) -> bool:
+        """通过SFTP同步文件，连接层错误时重试（上传会从检查点继续）"""
+        max_retries = 3
+        retry_count = 0
+        
+        while retry_count < max_retries:
+            try:
+                if operation == 'upload':
+                    # 确保远程目录存在
+                    remote_dir = os.path.dirname(remote_path)
+                    self._mkdir_p_sftp(sftp, remote_dir, conn.get('known_dirs') if conn else None)
+                    
+                    with self._sftp_compression(conn, local_path):
+                        self._sftp_upload(sftp, local_path, remote_path, conn)
+                elif operation == 'download':
+                    # 确保本地目录存在
+                    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                    sftp.get(remote_path, local_path)
+                elif operation == 'delete':
+                    sftp.remove(remote_path)
+                    if conn and 'signatures' in conn:
+                        conn['signatures'].discard(remote_path)
+                return True
             
-        except Exception as e:
-            logging.error(f"SFTP同步失败: {str(e)}")
+            except (paramiko.SSHException, EOFError, socket.timeout) as e:
+                retry_count += 1
+                if not self._check_sftp(sftp):
+                    # 通道已断开，交给连接池回收
+                    raise
+                if retry_count < max_retries:
+                    logging.warning(f"SFTP操作失败，正在重试 ({retry_count}/{max_retries}): {str(e)}")
+                    time.sleep(1)
+                else:
+                    logging.error(f"SFTP操作失败，已达到最大重试次数: {str(e)}")
+                    return False
+            except Exception as e:
+                logging.error(f"SFTP同步失败: {str(e)}")
+                return False
+        
+        return False
+
+    @staticmethod
+    def _sftp_compression(conn: Optional[dict], local_path: str):
+        """启用压缩传输时，已压缩或压缩率低的文件在当前线程中跳过SSH压缩"""
+        stats = conn.get('compression_stats') if conn else None
+        if stats is None:
+            return nullcontext()
+        compressible = is_compressible(local_path)
+        stats.count_file(compressible)
+        return nullcontext() if compressible else SSHCompressor.bypass()
+
+    def _sftp_upload(self, sftp, local_path: str, remote_path: str, conn: Optional[dict] = None):
+        """SFTP上传，有上次同步版本的块签名时只发送变化的块，并记录本次版本的块签名"""
+        signatures = conn.get('signatures') if conn else None
+        local_stat = os.stat(local_path)
+        if not signatures or local_stat.st_size < DELTA_MIN_SIZE:
+            if not self._sftp_upload_full(sftp, local_path, remote_path, conn):
+                self._sftp_set_mtime(sftp, remote_path, local_stat, conn)
+            return
+        
+        mtime_set = False
+        if not self._sftp_delta_upload(sftp, local_path, remote_path, conn):
+            mtime_set = self._sftp_upload_full(sftp, local_path, remote_path, conn)
+        if not mtime_set:
+            self._sftp_set_mtime(sftp, remote_path, local_stat, conn)
+        
+        # 本地文件在上传期间被修改时签名与远程内容不一致，不保存
+        signature = BlockSignature.compute(local_path)
+        current_stat = os.stat(local_path)
+        if (current_stat.st_size != local_stat.st_size
+                or current_stat.st_mtime_ns != local_stat.st_mtime_ns):
+            signatures.discard(remote_path)
+            return
+        remote_stat = sftp.stat(remote_path)
+        signature.remote_size = remote_stat.st_size
+        signature.remote_mtime = int(remote_stat.st_mtime or 0)
+        signatures.save(remote_path, signature)
+
+    def _sftp_delta_upload(self, sftp, local_path: str, remote_path: str, conn: dict) -> bool:
+        """按块签名增量上传，无法增量传输时返回False"""
+        signatures = conn['signatures']
+        signature = signatures.load(remote_path)
+        if signature is None:
+            return False
+        try:
+            remote_stat = sftp.stat(remote_path)
+        except FileNotFoundError:
+            return False
+        if not signature.matches_remote(remote_stat):
+            logging.info(f"远程文件已被修改，块签名失效: {remote_path}")
+            return False
+        
+        delta = compute_delta(local_path, signature)
+        if delta is None:
+            logging.info(f"文件变化较大，完整上传: {local_path}")
             return False
+        
+        if delta.is_in_place():
+            # 原地写入中断后远程文件与签名不再一致，先删除签名
+            signatures.discard(remote_path)
+            apply_in_place(sftp, local_path, remote_path, delta, SFTP_BUFFER_SIZE, conn.get('throttle'))
+        elif conn.get('sftp_copy_data', True):
+            temp_path = remote_path + '.filesync-part'
+            try:
+                rebuild_remote(sftp, local_path, remote_path, temp_path, delta, SFTP_BUFFER_SIZE,
+                               conn.get('throttle'))
+            except IOError as e:
+                # 服务器不支持copy-data扩展，之后不再尝试远程重建
+                logging.info(f"SFTP服务器无法在远程重建文件，改为完整上传: {str(e)}")
+                conn['sftp_copy_data'] = False
+                try:
+                    sftp.remove(temp_path)
+                except IOError:
+                    pass
+                return False
+        else:
+            return False
+        
+        logging.info(f"增量上传: {local_path} 发送 {delta.literal_bytes}/{delta.file_size} 字节")
+        return True
+
+    @staticmethod
+    def _sftp_mtime_attr(local_stat: os.stat_result) -> paramiko.SFTPAttributes:
+        attr = paramiko.SFTPAttributes()
+        attr.st_atime = int(local_stat.st_atime)
+        attr.st_mtime = int(local_stat.st_mtime)
+        return attr
+
+    def _sftp_set_mtime(self, sftp, remote_path: str, local_stat: os.stat_result, conn: Optional[dict]):
+        """把远程文件的修改时间设为本地文件的修改时间，验证和启动核对时据此比较
+        
+        第一次设置失败时认为服务器不支持，此后该连接不再设置也不再比较修改时间。
+        """
+        if not conn or conn.get('preserve_mtime') is False:
+            return
+        try:
+            sftp._request(CMD_SETSTAT, remote_path, self._sftp_mtime_attr(local_stat))
+            conn['preserve_mtime'] = True
+        except IOError as e:
+            if conn.get('preserve_mtime') is None:
+                logging.info(f"SFTP服务器不支持设置修改时间，验证时只比较大小: {str(e)}")
+                conn['preserve_mtime'] = False
+            else:
+                raise
+
+    def _sftp_upload_full(self, sftp, local_path: str, remote_path: str, conn: Optional[dict] = None) -> bool:
+        """高吞吐SFTP上传：大缓冲区流水线写入，超大文件拆分为多个区段通过多个通道并行写入
+        
+        返回True表示已在关闭远程文件前设置了修改时间。
+        """
+        file_size = os.path.getsize(local_path)
+        config = conn['config'] if conn else {}
+        threshold = int(config.get('sftp_parallel_threshold_mb', 64)) * 1024 * 1024
+        
+        # 超过阈值的文件尽量借用空闲通道，借不到时退化为单通道写入
+        extra_channels = []
+        if conn and threshold > 0 and file_size >= threshold:
+            for _ in range(conn['parallel'] - 1):
+                channel = conn['sftp_pool'].try_acquire()
+                if channel is None:
+                    break
+                extra_channels.append(channel)
+        
+        if not extra_channels:
+            return self._sftp_upload_stream(sftp, local_path, remote_path, conn)
+        
+        # 额外通道 -> 该通道写入时的异常，归还时按异常类型判断通道是否损坏
+        errors: Dict[int, Exception] = {}
+        try:
+            # 先创建（截断）远程文件，再由各通道以随机写方式写入各自的区段
+            with sftp.open(remote_path, 'wb'):
+                pass
+            channels = [sftp] + extra_channels
+            ranges = self._split_ranges(file_size, len(channels))
+            # 并行写入的线程沿用当前线程是否跳过压缩的设置
+            bypass_compression = SSHCompressor.bypassed()
+            logging.info(f"分{len(ranges)}个区段并行上传: {local_path}")
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [
+                    executor.submit(self._sftp_write_range, channel, local_path, remote_path,
+                                    start, end, 'r+b', throttle=conn.get('throttle'),
+                                    bypass_compression=bypass_compression)
+                    for channel, (start, end) in zip(channels, ranges)
+                ]
+                for channel, future in zip(channels, futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        errors[id(channel)] = e
+            for channel in channels:
+                if id(channel) in errors:
+                    raise errors[id(channel)]
+        finally:
+            for channel in extra_channels:
+                error = errors.get(id(channel))
+                conn['sftp_pool'].release(channel, broken=error is not None and is_connection_error(error))
+        return False
+
+    def _sftp_upload_stream(self, sftp, local_path: str, remote_path: str, conn: Optional[dict] = None) -> bool:
+        """单通道顺序上传，较大的文件记录检查点，中断后从远程已确认的位置继续
+        
+        已确认服务器支持设置修改时间时，在关闭远程文件前随写请求一起发送，返回True。
+        """
+        local_stat = os.stat(local_path)
+        checkpoints = conn.get('checkpoints') if conn else None
+        if local_stat.st_size < RESUME_MIN_SIZE:
+            checkpoints = None
+        
+        offset = 0
+        if checkpoints:
+            offset = checkpoints.get_offset(remote_path, local_path, local_stat)
+            if offset:
+                # 检查点记录的是已发送的字节数，以远程文件实际大小为准
+                try:
+                    offset = min(offset, sftp.stat(remote_path).st_size)
+                except FileNotFoundError:
+                    offset = 0
+                if offset:
+                    logging.info(f"断点续传: {local_path} 从第{offset}字节继续上传")
+        
+        progress_callback = None
+        if checkpoints:
+            def progress_callback(position: int):
+                checkpoints.update(remote_path, local_path, local_stat, position)
+        
+        mtime_attr = None
+        if conn and conn.get('preserve_mtime') is True:
+            mtime_attr = self._sftp_mtime_attr(local_stat)
+        try:
+            self._sftp_write_range(sftp, local_path, remote_path, offset, local_stat.st_size,
+                                   'r+b' if offset else 'wb', progress_callback, mtime_attr,
+                                   conn.get('throttle') if conn else None)
+        except Exception:
+            if checkpoints:
+                checkpoints.flush()
+            raise
+        if checkpoints:
+            checkpoints.clear(remote_path)
+        return mtime_attr is not None
 
-    def _sync_file_ftp(self, ftp, local_path: str, remote_path: str, 
-                      operation: str, config: dict) -> bool:
+    @staticmethod
+    def _split_ranges(file_size: int, count: int) -> List[Tuple[int, int]]:
+        """把文件按SFTP_BUFFER_SIZE对齐拆分为最多count个区段"""
+        part = -(-file_size // count)
+        part = -(-part // SFTP_BUFFER_SIZE) * SFTP_BUFFER_SIZE
+        ranges = []
+        start = 0
+        while start < file_size:
+            end = min(start + part, file_size)
+            ranges.append((start, end))
+            start = end
+        return ranges
+
+    @staticmethod
+    def _sftp_write_range(sftp, local_path: str, remote_path: str, start: int, end: int, mode: str,
+                          progress_callback: Optional[Callable[[int], None]] = None,
+                          mtime_attr: Optional[paramiko.SFTPAttributes] = None,
+                          throttle: Optional[Callable[[int], None]] = None,
+                          bypass_compression: bool = False):
+        """以流水线方式把本地文件的[start, end)区段写入远程文件的相同位置
+        
+        progress_callback(当前位置) 在每次写入缓冲区后调用，throttle(字节数) 在每次写入前调用。
+        bypass_compression 为True时本次写入跳过SSH压缩。
+        mtime_attr 不为None时在关闭前设置修改时间，服务器按顺序处理，close返回时已生效。
+        """
+        with open(local_path, 'rb') as local_file, sftp.open(remote_path, mode) as remote_file, \
+                (SSHCompressor.bypass() if bypass_compression else nullcontext()):
+            # 流水线模式下写请求不逐个等待服务器确认，close时统一检查结果
+            remote_file.set_pipelined(True)
+            if start:
+                local_file.seek(start)
+                remote_file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = local_file.read(min(SFTP_BUFFER_SIZE, remaining))
+                if not data:
+                    break
+                if throttle:
+                    throttle(len(data))
+                remote_file.write(data)
+                remaining -= len(data)
+                if progress_callback:
+                    progress_callback(end - remaining)
+            if mtime_attr is not None:
+                # 不单独等待确认，设置失败时由上传后的验证发现
+                sftp._async_request(type(None), CMD_SETSTAT, remote_path, mtime_attr)
+
+    def _sync_file_ftp(self, ftp, local_path: str, remote_path: str,
+                      operation: str, config: dict, checkpoints: Optional[CheckpointStore] = None,
+                      known_dirs: Optional[RemoteDirCache] = None,
+                      throttle: Optional[Callable[[int], None]] = None) -> bool:
         """通过FTP同步文件"""
         max_retries = 3
         retry_count = 0
@@ -364,20 +1565,19 @@ class SyncManager:
                 if operation == 'upload':
                     # 确保远程目录存在
                     remote_dir = os.path.dirname(remote_path)
-                    self._mkdir_p_ftp(ftp, remote_dir)
+                    self._mkdir_p_ftp(ftp, remote_dir, known_dirs)
                     
                     # 设置二进制传输模式
                     ftp.voidcmd('TYPE I')
                     
-                    # 上传文件
-                    with open(local_path, 'rb') as f:
-                        try:
-                            ftp.storbinary(f'STOR {remote_path}', f, blocksize=8192)
-                            logging.info(f"文件上传成功: {local_path} -> {remote_path}")
-                            return True
-                        except ftplib.error_perm as e:
-                            logging.error(f"FTP上传权限错误: {str(e)}")
-                            return False
+                    # 上传文件，重试时从检查点继续
+                    try:
+                        self._ftp_upload(ftp, local_path, remote_path, checkpoints, throttle)
+                        logging.info(f"文件上传成功: {local_path} -> {remote_path}")
+                        return True
+                    except ftplib.error_perm as e:
+                        logging.error(f"FTP上传权限错误: {str(e)}")
+                        return False
                             
                 elif operation == 'download':
                     # 确保本地目录存在
@@ -421,6 +1621,68 @@ class SyncManager:
         
         return False
 
+    def _ftp_upload(self, ftp, local_path: str, remote_path: str,
+                    checkpoints: Optional[CheckpointStore] = None,
+                    throttle: Optional[Callable[[int], None]] = None):
+        """FTP上传，较大的文件记录检查点，中断后通过REST+STOR或APPE从远程已有的位置继续
+        
+        throttle(字节数) 在每个数据块发送后调用，超过限速时等待后再发送下一块。
+        """
+        local_stat = os.stat(local_path)
+        if local_stat.st_size < RESUME_MIN_SIZE:
+            checkpoints = None
+        
+        offset = 0
+        remote_size = 0
+        if checkpoints:
+            offset = checkpoints.get_offset(remote_path, local_path, local_stat)
+            if offset:
+                # 检查点记录的是已发送的字节数，以服务器上的实际大小为准
+                try:
+                    remote_size = ftp.size(remote_path) or 0
+                except ftplib.error_perm:
+                    remote_size = 0
+                offset = min(offset, remote_size)
+        
+        try:
+            with open(local_path, 'rb') as f:
+                def on_block(block: bytes):
+                    if throttle:
+                        throttle(len(block))
+                    # 文件读取位置即为已发送的字节数
+                    if checkpoints:
+                        checkpoints.update(remote_path, local_path, local_stat, f.tell())
+                
+                self._ftp_store_from(ftp, f, local_path, remote_path, offset, remote_size, on_block)
+        except Exception:
+            if checkpoints:
+                checkpoints.flush()
+            raise
+        if checkpoints:
+            checkpoints.clear(remote_path)
+
+    @staticmethod
+    def _ftp_store_from(ftp, f, local_path: str, remote_path: str, offset: int, remote_size: int,
+                        callback: Callable[[bytes], None]):
+        """从offset处开始上传，优先使用REST+STOR，服务器不支持时尝试APPE，都不可用则完整上传"""
+        if offset:
+            logging.info(f"断点续传: {local_path} 从第{offset}字节继续上传")
+            f.seek(offset)
+            try:
+                ftp.storbinary(f'STOR {remote_path}', f, blocksize=8192, callback=callback, rest=offset)
+                return
+            except ftplib.error_perm as e:
+                # 50x表示服务器不支持REST，远程大小恰好等于续传位置时改用APPE追加
+                if not str(e).startswith('50'):
+                    raise
+            f.seek(offset)
+            if offset == remote_size:
+                ftp.storbinary(f'APPE {remote_path}', f, blocksize=8192, callback=callback)
+                return
+            logging.info(f"服务器不支持续传，重新上传: {local_path}")
+            f.seek(0)
+        ftp.storbinary(f'STOR {remote_path}', f, blocksize=8192, callback=callback)
+
     def _sync_file_webdav(self, session, local_path: str, remote_path: str, 
                          operation: str, task_id: str) -> bool:
         """通过WebDAV同步文件"""
@@ -432,21 +1694,20 @@ class SyncManager:
         while retry_count <= max_retries:
             try:
                 base_url = conn['config']['host']
-                # 确保路径正确编码
-                encoded_path = '/'.join(requests.utils.quote(p) for p in remote_path.split('/'))
-                url = urljoin(base_url + '/', encoded_path.lstrip('/'))
+                url = self._webdav_url(base_url, remote_path)
                 logging.info(f"WebDAV操作URL: {url}")
                 
                 if operation == 'upload':
                     # 确保远程目录存在
                     remote_dir = os.path.dirname(remote_path)
                     if remote_dir:
-                        self._ensure_webdav_dir(session, base_url, remote_dir)
+                        self._ensure_webdav_dir(session, base_url, remote_dir, conn.get('known_dirs'))
                     
-                    # 使用线程池上传文件
+                    # 使用线程池上传文件；连接停滞由请求自身的超时发现，这里不限制总时长，
+                    # 否则大文件上传超时后重试时原上传仍在写同一个临时文件
                     future = conn['pool'].submit(self._webdav_upload_file,
-                                              session, url, local_path)
-                    result = future.result(timeout=60)  # 设置超时时间
+                                              session, url, local_path, remote_path, conn)
+                    result = future.result()
                     if not result:
                         raise Exception("上传失败")
                         
@@ -457,7 +1718,7 @@ class SyncManager:
                     # 使用线程池下载文件
                     future = conn['pool'].submit(self._webdav_download_file,
                                               session, url, local_path)
-                    result = future.result(timeout=60)
+                    result = future.result()
                     if not result:
                         raise Exception("下载失败")
                         
@@ -478,15 +1739,8 @@ class SyncManager:
                         wait_time = retry_delay * (2 ** (retry_count - 1))  # 指数退避
                         logging.warning(f"WebDAV认证失败，{wait_time}秒后重试 ({retry_count}/{max_retries})")
                         time.sleep(wait_time)
-                        # 重新创建session
-                        session = requests.Session()
-                        session.auth = (conn['config']['username'], conn['config']['password'])
-                        session.headers.update({
-                            'User-Agent': 'WebDAV Client',
-                            'Accept': '*/*',
-                            'Content-Type': 'application/xml',
-                        })
-                        conn['session'] = session
+                        # 重新认证，保留会话和连接池
+                        session.reauth()
                         continue
                 logging.error(f"WebDAV操作失败: {str(e)}")
                 return False
@@ -497,49 +1751,150 @@ class SyncManager:
                 
         return False
 
-    def _webdav_upload_file(self, session, url: str, local_path: str) -> bool:
-        """WebDAV文件上传处理"""
+    @staticmethod
+    def _webdav_url(base_url: str, remote_path: str) -> str:
+        """远程路径转换为WebDAV URL"""
+        # 确保路径正确编码
+        encoded_path = '/'.join(requests.utils.quote(p) for p in remote_path.split('/'))
+        return urljoin(base_url + '/', encoded_path.lstrip('/'))
+
+    def _webdav_upload_file(self, session, url: str, local_path: str,
+                            remote_path: Optional[str] = None, conn: Optional[dict] = None) -> bool:
+        """WebDAV文件上传处理，大文件先上传到临时文件，中断后尽量用分段PUT续传
+        
+        检查点只记录服务器上临时文件已确认保存的字节数（上传失败后用HEAD获取），
+        续传时仍以HEAD返回的实际大小为准；上传过程中被终止时没有检查点，下次完整上传。
+        """
+        checkpoints = None
         try:
-            with open(local_path, 'rb') as f:
-                headers = {
-                    'Content-Type': 'application/octet-stream',
-                    'Accept': '*/*',
-                    'Connection': 'keep-alive',
-                    'Keep-Alive': 'timeout=60, max=1000'
-                }
-                response = session.put(url, data=f, headers=headers, timeout=60)
-                
-                if response.status_code == 401:  # 未授权错误，尝试刷新认证头
-                    auth_header = session.headers.get('Authorization')
-                    if auth_header:
-                        headers['Authorization'] = auth_header
-                        response = session.put(url, data=f, headers=headers, timeout=60)
-                
-                if response.status_code not in [200, 201, 204]:
-                    logging.error(f"WebDAV上传失败: {url}, 状态码: {response.status_code}")
-                    if response.text:
-                        logging.error(f"错误详情: {response.text}")
-                    return False
+            local_stat = os.stat(local_path)
+            checkpoints = conn.get('checkpoints') if conn else None
+            if local_stat.st_size < RESUME_MIN_SIZE or not remote_path:
+                checkpoints = None
+            throttle = conn.get('throttle') if conn else None
+            if checkpoints is None:
+                return self._webdav_put_file(session, url, local_path, conn, throttle)
+
+            part_url = url + '.filesync-part'
+            offset = checkpoints.get_offset(remote_path, local_path, local_stat)
+            uploaded = False
+            if offset and conn.get('ranged_put', True):
+                # 以服务器上临时文件的实际大小为准
+                response = session.head(part_url, timeout=30)
+                part_size = int(response.headers.get('Content-Length', 0)) if response.status_code == 200 else 0
+                offset = min(offset, part_size)
+                if offset == local_stat.st_size:
+                    # 临时文件已完整上传，只差移动到目标位置
+                    uploaded = True
+                elif offset > 0:
+                    logging.info(f"从 {offset} 字节处续传: {remote_path}")
+                    uploaded = self._webdav_put(session, part_url, local_path, offset, throttle)
+                    if uploaded:
+                        response = session.head(part_url, timeout=30)
+                        uploaded = (response.status_code == 200 and
+                                    int(response.headers.get('Content-Length', -1)) == local_stat.st_size)
+                    if not uploaded:
+                        # 服务器不支持Content-Range方式的PUT，之后不再尝试
+                        logging.info("WebDAV服务器不支持分段续传，改为完整上传")
+                        conn['ranged_put'] = False
+
+            if not uploaded and not self._webdav_put_file(session, part_url, local_path, conn, throttle):
+                self._record_webdav_part(session, part_url, remote_path, local_path, local_stat, checkpoints)
+                return False
+
+            response = session.request('MOVE', part_url, headers={
+                'Destination': url,
+                'Overwrite': 'T'
+            }, timeout=60)
+            if response.status_code not in [201, 204]:
+                logging.error(f"WebDAV移动临时文件失败: {part_url}, 状态码: {response.status_code}")
+                self._record_webdav_part(session, part_url, remote_path, local_path, local_stat, checkpoints)
+                return False
+            checkpoints.clear(remote_path)
             return True
         except Exception as e:
             logging.error(f"WebDAV上传失败: {str(e)}")
+            if checkpoints is not None:
+                self._record_webdav_part(session, url + '.filesync-part', remote_path, local_path,
+                                         local_stat, checkpoints)
+            return False
+
+    def _record_webdav_part(self, session, part_url: str, remote_path: str, local_path: str,
+                            local_stat: os.stat_result, checkpoints: CheckpointStore):
+        """上传失败后以服务器上临时文件的实际大小记录检查点，没有已保存的数据时删除检查点"""
+        try:
+            response = session.head(part_url, timeout=30)
+            part_size = int(response.headers.get('Content-Length', 0)) if response.status_code == 200 else 0
+        except Exception as e:
+            logging.warning(f"获取WebDAV临时文件大小失败: {part_url}, 错误: {str(e)}")
+            return
+        if 0 < part_size <= local_stat.st_size:
+            checkpoints.update(remote_path, local_path, local_stat, part_size)
+            checkpoints.flush()
+        else:
+            checkpoints.clear(remote_path)
+
+    def _webdav_put_file(self, session, url: str, local_path: str, conn: Optional[dict],
+                         throttle: Optional[Callable[[int], None]] = None) -> bool:
+        """上传整个文件，启用压缩传输且文件值得压缩时先尝试gzip压缩上传"""
+        stats = conn.get('compression_stats') if conn else None
+        if stats is not None and conn.get('webdav_gzip') is not False:
+            compressible = is_compressible(local_path)
+            stats.count_file(compressible)
+            if compressible:
+                result = self._webdav_put_gzip(session, url, local_path, conn, throttle)
+                if result is not None:
+                    return result
+        return self._webdav_put(session, url, local_path, throttle=throttle)
+
+    def _webdav_put_gzip(self, session, url: str, local_path: str, conn: dict,
+                         throttle: Optional[Callable[[int], None]] = None) -> Optional[bool]:
+        """以Content-Encoding: gzip流式压缩上传，服务器不接受压缩请求体时返回None
+        
+        第一次压缩上传后比较远程文件大小，服务器原样保存了压缩数据（未解压）时同样返回None，
+        由调用方重新上传覆盖；之后该连接不再尝试压缩上传。
+        """
+        body = GzipBody(local_path, conn['compression_stats'], throttle)
+        response = session.put(url, data=body, headers=GZIP_PUT_HEADERS, timeout=60)
+        if response.status_code in (400, 411, 415, 501):
+            logging.info(f"WebDAV服务器不接受压缩上传，改为不压缩上传: 状态码 {response.status_code}")
+            conn['webdav_gzip'] = False
+            return None
+        if response.status_code not in [200, 201, 204]:
+            logging.error(f"WebDAV上传失败: {url}, 状态码: {response.status_code}")
             return False
+        if conn.get('webdav_gzip') is None:
+            response = session.head(url, timeout=30)
+            length = response.headers.get('Content-Length') if response.status_code == 200 else None
+            if length is not None:
+                if int(length) != os.path.getsize(local_path):
+                    logging.info("WebDAV服务器未解压gzip请求体，改为不压缩上传")
+                    conn['webdav_gzip'] = False
+                    return None
+                conn['webdav_gzip'] = True
+        return True
+
+    def _webdav_put(self, session, url: str, local_path: str, offset: int = 0,
+                    throttle: Optional[Callable[[int], None]] = None) -> bool:
+        """PUT上传文件，offset大于0时只上传剩余部分并带上Content-Range，请求体读取时按throttle限速"""
+        file_size = os.path.getsize(local_path)
+        headers = PUT_HEADERS
+        if offset:
+            headers = dict(PUT_HEADERS, **{'Content-Range': f'bytes {offset}-{file_size - 1}/{file_size}'})
+        body = FileBody(local_path, offset, file_size - offset, throttle)
+        response = session.put(url, data=body, headers=headers, timeout=60)
+
+        if response.status_code not in [200, 201, 204]:
+            logging.error(f"WebDAV上传失败: {url}, 状态码: {response.status_code}")
+            if response.text:
+                logging.error(f"错误详情: {response.text}")
+            return False
+        return True
 
     def _webdav_download_file(self, session, url: str, local_path: str) -> bool:
         """WebDAV文件下载处理"""
         try:
-            headers = {
-                'Accept': '*/*',
-                'Connection': 'keep-alive',
-                'Keep-Alive': 'timeout=60, max=1000'
-            }
-            response = session.get(url, headers=headers, timeout=60, stream=True)
-            
-            if response.status_code == 401:  # 未授权错误，尝试刷新认证头
-                auth_header = session.headers.get('Authorization')
-                if auth_header:
-                    headers['Authorization'] = auth_header
-                    response = session.get(url, headers=headers, timeout=60, stream=True)
+            response = session.get(url, timeout=60, stream=True)
             
             if response.status_code != 200:
                 logging.error(f"WebDAV下载失败: {url}, 状态码: {response.status_code}")
@@ -559,20 +1914,10 @@ class SyncManager:
     def _webdav_delete_file(self, session, url: str) -> bool:
         """WebDAV文件删除处理"""
         try:
-            headers = {
-                'Accept': '*/*',
-                'Connection': 'keep-alive',
-                'Keep-Alive': 'timeout=60, max=1000'
-            }
-            response = session.delete(url, headers=headers, timeout=30)
-            
-            if response.status_code == 401:  # 未授权错误，尝试刷新认证头
-                auth_header = session.headers.get('Authorization')
-                if auth_header:
-                    headers['Authorization'] = auth_header
-                    response = session.delete(url, headers=headers, timeout=30)
+            response = session.delete(url, timeout=30)
             
-            if response.status_code not in [200, 204]:
+            # 404表示远程文件已不存在，与删除成功相同
+            if response.status_code not in [200, 204, 404]:
                 logging.error(f"WebDAV删除失败: {url}, 状态码: {response.status_code}")
                 if response.text:
                     logging.error(f"错误详情: {response.text}")
@@ -582,19 +1927,24 @@ class SyncManager:
             logging.error(f"WebDAV删除失败: {str(e)}")
             return False
             
-    def _ensure_webdav_dir(self, session, base_url: str, remote_dir: str):
-        """确保WebDAV远程目录存在"""
+    def _ensure_webdav_dir(self, session, base_url: str, remote_dir: str,
+                           known_dirs: Optional[RemoteDirCache] = None):
+        """确保WebDAV远程目录存在，已在缓存中的目录不再检查"""
         if not remote_dir:
             return
             
         parts = remote_dir.split('/')
         current_path = ''
+        plain_path = ''
         
         for part in parts:
             if not part:
                 continue
                 
             current_path += '/' + requests.utils.quote(part)
+            plain_path += '/' + part
+            if known_dirs is not None and plain_path in known_dirs:
+                continue
             url = urljoin(base_url, current_path.lstrip('/'))
             logging.info(f"检查WebDAV目录: {url}")
             
@@ -673,18 +2023,26 @@ class SyncManager:
                     else:
                         logging.error(f"创建WebDAV目录失败: {url}, 错误: {str(e)}")
                         raise
+            if known_dirs is not None:
+                known_dirs.add(plain_path)
 
-    def _mkdir_p_sftp(self, sftp, remote_dir: str):
-        """递归创建SFTP远程目录"""
-        if remote_dir == '/':
+    def _mkdir_p_sftp(self, sftp, remote_dir: str, known_dirs: Optional[RemoteDirCache] = None):
+        """递归创建SFTP远程目录，已在缓存中的目录不再检查"""
+        if remote_dir == '/' or (known_dirs is not None and remote_dir in known_dirs):
             return
         try:
             sftp.stat(remote_dir)
         except FileNotFoundError:
             parent = os.path.dirname(remote_dir)
             if parent != remote_dir:
-                self._mkdir_p_sftp(sftp, parent)
-            sftp.mkdir(remote_dir)
+                self._mkdir_p_sftp(sftp, parent, known_dirs)
+            try:
+                sftp.mkdir(remote_dir)
+            except IOError:
+                # 并发传输时目录可能已被其他通道创建
+                sftp.stat(remote_dir)
+        if known_dirs is not None:
+            known_dirs.add(remote_dir)
 
     def _reconnect_ftp(self, ftp, config: dict):
         """重新连接FTP服务器"""
@@ -718,8 +2076,8 @@ class SyncManager:
             logging.error(f"FTP重新连接失败: {str(e)}")
             raise
             
-    def _mkdir_p_ftp(self, ftp, remote_dir: str):
-        """递归创建FTP远程目录"""
+    def _mkdir_p_ftp(self, ftp, remote_dir: str, known_dirs: Optional[RemoteDirCache] = None):
+        """递归创建FTP远程目录，已在缓存中的目录不再检查"""
         if remote_dir == '/':
             return
             
@@ -737,6 +2095,8 @@ class SyncManager:
                 continue
                 
             current_dir += '/' + part
+            if known_dirs is not None and current_dir in known_dirs:
+                continue
             try:
                 ftp.cwd(current_dir)
             except ftplib.error_perm:
@@ -748,6 +2108,121 @@ class SyncManager:
                     if "550" not in str(e):  # 忽略目录已存在的错误
                         logging.error(f"创建目录失败: {current_dir}, 错误: {str(e)}")
                         raise
+                    continue
+            if known_dirs is not None:
+                known_dirs.add(current_dir)
+
+    def list_remote_dir(self, task_id: str, remote_dir: str) -> Optional[RemoteListing]:
+        """获取远程目录列表（SFTP listdir_attr、FTP MLSD、WebDAV PROPFIND Depth:1）
+        
+        目录不存在时返回空列表，无法获取（如FTP服务器不支持MLSD）时返回None。
+        列出的目录及其子目录记入已知目录缓存。
+        """
+        conn = self.connections.get(task_id)
+        if conn is None:
+            return None
+        try:
+            if conn['type'] == 'SFTP':
+                with conn['sftp_pool'].connection() as sftp:
+                    try:
+                        listing = from_sftp_attributes(sftp.listdir_attr(remote_dir))
+                    except FileNotFoundError:
+                        return {}
+            elif conn['type'] == 'FTP':
+                if conn.get('mlsd') is False:
+                    return None
+                with conn['ftp_pool'].connection() as ftp:
+                    try:
+                        listing = from_mlsd(ftp.mlsd(remote_dir, facts=['type', 'size', 'modify']))
+                    except ftplib.error_perm as e:
+                        if str(e).startswith('550'):
+                            return {}
+                        # 500/502: 服务器不支持MLSD
+                        logging.info(f"FTP服务器不支持MLSD，改为逐个文件验证: {str(e)}")
+                        conn['mlsd'] = False
+                        return None
+            elif conn['type'] == 'WebDAV':
+                with self.connection_locks[task_id]:
+                    url = self._webdav_url(conn['config']['host'], remote_dir).rstrip('/') + '/'
+                    response = conn['session'].request('PROPFIND', url, data=WEBDAV_LISTING_BODY,
+                                                       headers=dict(WEBDAV_LISTING_HEADERS, Depth='1'), timeout=60)
+                if response.status_code == 404:
+                    return {}
+                if response.status_code != 207:
+                    logging.warning(f"WebDAV列目录失败: {remote_dir}, 状态码: {response.status_code}")
+                    return None
+                listing = from_propfind(response.text, url)
+            else:
+                return None
+        except Exception as e:
+            logging.warning(f"获取远程目录列表失败: {remote_dir}, 错误: {str(e)}")
+            return None
+        
+        self._remember_listing(conn, remote_dir, listing)
+        return listing
+
+    @staticmethod
+    def _remember_listing(conn: dict, remote_dir: str, listing: RemoteListing):
+        """列出的目录及其子目录记入已知目录缓存"""
+        known_dirs = conn.get('known_dirs')
+        if known_dirs is not None:
+            known_dirs.add(remote_dir)
+            for name, entry in listing.items():
+                if entry.is_dir:
+                    known_dirs.add(posixpath.join(remote_dir, name))
+
+    def list_remote_dirs(self, task_id: str, remote_dirs: Iterable[str]) -> Dict[str, Optional[RemoteListing]]:
+        """获取多个远程目录的列表，连接支持并发时并行获取"""
+        remote_dirs = list(remote_dirs)
+        conn = self.connections.get(task_id)
+        if conn is not None and self._use_async(conn) and len(remote_dirs) > 1:
+            async def list_all():
+                return await asyncio.gather(*(self._list_webdav_dir_async(conn, remote_dir)
+                                              for remote_dir in remote_dirs))
+            return dict(zip(remote_dirs, conn['async_loop'].run(list_all())))
+        executor = conn.get('executor') if conn else None
+        if executor is None or len(remote_dirs) < 2:
+            return {remote_dir: self.list_remote_dir(task_id, remote_dir) for remote_dir in remote_dirs}
+        return dict(zip(remote_dirs, executor.map(lambda remote_dir: self.list_remote_dir(task_id, remote_dir),
+                                                  remote_dirs)))
+
+    def verify_remote_files(self, task_id: str, files: List[Tuple[str, str]]) -> Dict[str, bool]:
+        """批量验证上传结果，返回 远程路径 -> 是否通过
+        
+        files 为 (本地路径, 远程路径) 列表。每个目录只获取一次列表，按列表比较大小，
+        远程修改时间已设置为本地修改时间时同时比较修改时间（精确到秒）。
+        无法获取目录列表时改为逐个文件验证。
+        """
+        conn = self.connections.get(task_id)
+        if conn is None:
+            return {remote_path: False for _, remote_path in files}
+        
+        by_dir: Dict[str, List[Tuple[str, str]]] = {}
+        for local_path, remote_path in files:
+            by_dir.setdefault(posixpath.dirname(remote_path), []).append((local_path, remote_path))
+        listings = self.list_remote_dirs(task_id, by_dir)
+        check_mtime = conn.get('preserve_mtime') is True
+        
+        results = {}
+        for remote_dir, items in by_dir.items():
+            listing = listings.get(remote_dir)
+            for local_path, remote_path in items:
+                if listing is None:
+                    results[remote_path] = self.verify_remote_file(task_id, local_path, remote_path)
+                    continue
+                entry = listing.get(posixpath.basename(remote_path))
+                try:
+                    local_stat = os.stat(local_path)
+                except OSError:
+                    local_stat = None
+                verified = (entry is not None and local_stat is not None and not entry.is_dir
+                            and entry.size == local_stat.st_size)
+                if verified and check_mtime and entry.mtime is not None:
+                    verified = int(entry.mtime) == int(local_stat.st_mtime)
+                if not verified:
+                    logging.error(f"文件同步验证失败: {local_path} -> {remote_path}")
+                results[remote_path] = verified
+        return results
 
     def verify_remote_file(self, task_id: str, local_path: str, remote_path: str) -> bool:
         """验证远程文件是否存在且大小正确"""
@@ -758,7 +2233,12 @@ class SyncManager:
             conn = self.connections[task_id]
             if conn['type'] == 'SFTP':
                 try:
-                    remote_stat = conn['sftp'].stat(remote_path)
+                    with conn['sftp_pool'].connection() as sftp:
+                        # 文件不存在或无权访问时在连接内处理，连接照常归还连接池
+                        try:
+                            remote_stat = sftp.stat(remote_path)
+                        except (FileNotFoundError, PermissionError):
+                            return False
                     local_stat = os.stat(local_path)
                     return remote_stat.st_size == local_stat.st_size
                 except FileNotFoundError:
@@ -766,7 +2246,13 @@ class SyncManager:
                     
             elif conn['type'] == 'FTP':
                 try:
-                    remote_size = conn['ftp'].size(remote_path)
+                    with conn['ftp_pool'].connection() as ftp:
+                        ftp.voidcmd('TYPE I')
+                        # 文件不存在或服务器不支持SIZE时返回5xx应答，连接仍可使用
+                        try:
+                            remote_size = ftp.size(remote_path)
+                        except ftplib.error_perm:
+                            return False
                     local_size = os.path.getsize(local_path)
                     return remote_size == local_size
                 except:
@@ -777,8 +2263,16 @@ class SyncManager:
                     base_url = conn['config']['host']
                     encoded_path = '/'.join(requests.utils.quote(p) for p in remote_path.split('/'))
                     url = urljoin(base_url + '/', encoded_path.lstrip('/'))
-                    response = conn['session'].request('PROPFIND', url, headers={'Depth': '0'})
-                    return response.status_code == 207
+                    response = conn['session'].request('PROPFIND', url, data=WEBDAV_LISTING_BODY, headers={
+                        'Depth': '0',
+                        'Content-Type': 'application/xml; charset=utf-8'
+                    }, timeout=60)
+                    if response.status_code != 207:
+                        return False
+                    # Depth:0的响应中只有文件自身，按其所在目录解析
+                    listing = from_propfind(response.text, url.rsplit('/', 1)[0])
+                    entry = listing.get(posixpath.basename(remote_path))
+                    return entry is not None and entry.size == os.path.getsize(local_path)
                 except:
                     return False
                     
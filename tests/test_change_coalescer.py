@@ -0,0 +1,158 @@
+import os
+
+from change_coalescer import ChangeCoalescer
+
+
+def write(path, data=b'x'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+class Recorder:
+    """记录on_rewrite回调"""
+
+    def __init__(self):
+        self.discarded = []
+        self.queued = []
+
+    def __call__(self, discarded, queued):
+        self.discarded += discarded
+        self.queued += queued
+
+
+def test_waits_for_quiet_period_and_merges_events(tmp_path):
+    path = write(tmp_path / 'a.txt')
+    coalescer = ChangeCoalescer(quiet_period=2.0)
+    coalescer.add({path}, set(), set(), now=0.0)
+    coalescer.add(set(), {path}, set(), now=1.0)
+
+    assert coalescer.pop_ready(now=2.5) == (set(), set(), set())
+    # 第一次事件为新增，之后的修改仍按新增同步，且只同步一次
+    assert coalescer.pop_ready(now=3.0) == ({path}, set(), set())
+    assert len(coalescer) == 0
+
+
+def test_modified_and_deleted_existing_files(tmp_path):
+    modified = write(tmp_path / 'm.txt')
+    deleted = str(tmp_path / 'd.txt')
+    coalescer = ChangeCoalescer(quiet_period=1.0)
+    coalescer.add(set(), {modified}, {deleted}, now=0.0)
+
+    assert coalescer.pop_ready(now=1.0) == (set(), {modified}, {deleted})
+
+
+def test_added_then_deleted_file_is_dropped(tmp_path):
+    path = str(tmp_path / 'tmp.swp')
+    recorder = Recorder()
+    coalescer = ChangeCoalescer(quiet_period=1.0, on_rewrite=recorder)
+    coalescer.add({path}, set(), set(), now=0.0)
+    coalescer.add(set(), set(), {path}, now=0.5)
+
+    assert coalescer.pop_ready(now=2.0) == (set(), set(), set())
+    assert set(recorder.discarded) == {('upload', path, ''), ('delete', path, '')}
+    assert recorder.queued == []
+
+
+def test_deleted_then_recreated_file_is_modified(tmp_path):
+    path = write(tmp_path / 'a.txt')
+    coalescer = ChangeCoalescer(quiet_period=1.0)
+    coalescer.add(set(), set(), {path}, now=0.0)
+    coalescer.add({path}, set(), set(), now=0.5)
+
+    assert coalescer.pop_ready(now=2.0) == (set(), {path}, set())
+
+
+def test_file_still_being_written_is_deferred_until_max_delay(tmp_path):
+    path = write(tmp_path / 'big.bin', b'1')
+    coalescer = ChangeCoalescer(quiet_period=1.0, max_delay=10.0)
+    coalescer.add({path}, set(), set(), now=0.0)
+
+    # 大小在静默期内变化，说明仍在写入
+    write(path, b'12')
+    assert coalescer.pop_ready(now=1.0) == (set(), set(), set())
+    write(path, b'123')
+    assert coalescer.pop_ready(now=5.0) == (set(), set(), set())
+    # 超过最长等待时间后即使仍在写入也提交
+    write(path, b'1234')
+    assert coalescer.pop_ready(now=10.0) == ({path}, set(), set())
+
+
+def test_move_of_unsynced_new_file_becomes_upload(tmp_path):
+    old_path = str(tmp_path / 'old.txt')
+    new_path = write(tmp_path / 'new.txt')
+    recorder = Recorder()
+    coalescer = ChangeCoalescer(quiet_period=1.0, on_rewrite=recorder)
+    coalescer.add({old_path}, set(), set(), now=0.0)
+    coalescer.add_moves([(old_path, new_path)], now=0.5)
+
+    # 远程没有旧文件，不需要移动
+    assert coalescer.pop_moves() == ([], [])
+    assert coalescer.pop_ready(now=2.0) == ({new_path}, set(), set())
+    assert ('move', old_path, new_path) in recorder.discarded
+    assert ('upload', old_path, '') in recorder.discarded
+    assert recorder.queued == [('upload', new_path, '')]
+
+
+def test_move_of_modified_existing_file_moves_then_uploads(tmp_path):
+    old_path = str(tmp_path / 'old.txt')
+    new_path = write(tmp_path / 'new.txt')
+    recorder = Recorder()
+    coalescer = ChangeCoalescer(quiet_period=1.0, on_rewrite=recorder)
+    coalescer.add(set(), {old_path}, set(), now=0.0)
+    coalescer.add_moves([(old_path, new_path)], now=0.5)
+
+    assert coalescer.pop_moves() == ([(old_path, new_path)], [])
+    assert coalescer.pop_ready(now=2.0) == (set(), {new_path}, set())
+    assert recorder.queued == [('upload', new_path, '')]
+
+
+def test_move_without_pending_changes_is_passed_through(tmp_path):
+    old_path = str(tmp_path / 'old.txt')
+    new_path = str(tmp_path / 'new.txt')
+    recorder = Recorder()
+    coalescer = ChangeCoalescer(quiet_period=1.0, on_rewrite=recorder)
+    coalescer.add_moves([(old_path, new_path)])
+
+    assert coalescer.pop_moves() == ([(old_path, new_path)], [])
+    assert coalescer.pop_moves() == ([], [])
+    assert recorder.discarded == [] and recorder.queued == []
+
+
+def test_move_over_pending_target_discards_target_changes(tmp_path):
+    old_path = str(tmp_path / 'old.txt')
+    new_path = write(tmp_path / 'new.txt')
+    recorder = Recorder()
+    coalescer = ChangeCoalescer(quiet_period=1.0, on_rewrite=recorder)
+    coalescer.add({new_path}, set(), set(), now=0.0)
+    coalescer.add_moves([(old_path, new_path)], now=0.5)
+
+    assert coalescer.pop_moves() == ([(old_path, new_path)], [])
+    assert coalescer.pop_ready(now=2.0) == (set(), set(), set())
+    assert ('upload', new_path, '') in recorder.discarded
+
+
+def test_directory_move_renames_pending_paths(tmp_path):
+    old_dir = str(tmp_path / 'old')
+    new_dir = str(tmp_path / 'new')
+    old_path = os.path.join(old_dir, 'sub', 'a.txt')
+    new_path = write(os.path.join(new_dir, 'sub', 'a.txt'))
+    recorder = Recorder()
+    coalescer = ChangeCoalescer(quiet_period=1.0, on_rewrite=recorder)
+    coalescer.add(set(), {old_path}, set(), now=0.0)
+    coalescer.add_moves([(old_path, new_path)], [(old_dir, new_dir)], now=0.5)
+
+    # 目录中的文件移动保留，供目录移动失败时逐个处理
+    assert coalescer.pop_moves() == ([(old_path, new_path)], [(old_dir, new_dir)])
+    assert coalescer.pop_ready(now=2.0) == (set(), {new_path}, set())
+    assert ('upload', old_path, '') in recorder.discarded
+    assert recorder.queued == [('upload', new_path, '')]
+
+
+def test_pop_all_ignores_quiet_period(tmp_path):
+    path = write(tmp_path / 'a.txt')
+    coalescer = ChangeCoalescer(quiet_period=100.0)
+    coalescer.add({path}, set(), set())
+
+    assert coalescer.pop_all() == ({path}, set(), set())
@@ -0,0 +1,121 @@
+import json
+import os
+
+from transfer_journal import (COMPLETED, IN_FLIGHT, QUEUED, TransferJournal, change_keys,
+                              replay_changes)
+
+
+def read_records(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_change_keys():
+    keys = change_keys({'/a'}, {'/b'}, [('/c', '/d')], [('/e', '/f')])
+    assert keys == [('upload', '/a', ''), ('delete', '/b', ''),
+                    ('move', '/c', '/d'), ('move_dir', '/e', '/f')]
+
+
+def test_pending_survives_reopen(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    journal = TransferJournal(path)
+    journal.queue(change_keys({'/a', '/b', '/c'}, set(), [('/m', '/n')]))
+    journal.begin([('upload', '/a', ''), ('upload', '/b', ''), ('move', '/m', '/n')])
+    journal.complete([('upload', '/b', '')])
+    journal.close()
+
+    reopened = TransferJournal(path)
+    assert reopened.pending() == {
+        ('upload', '/a', ''): IN_FLIGHT,
+        ('upload', '/c', ''): QUEUED,
+        ('move', '/m', '/n'): IN_FLIGHT,
+    }
+    reopened.close()
+
+
+def test_state_changes_of_unqueued_operations_are_ignored(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    journal = TransferJournal(path)
+    journal.begin([('upload', '/a', '')])
+    journal.complete([('delete', '/b', '')])
+    journal.close()
+
+    assert not os.path.exists(path) or read_records(path) == []
+    assert TransferJournal(path).pending() == {}
+
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    journal = TransferJournal(path)
+    journal.queue([('upload', '/a', ''), ('delete', '/b', '')])
+    journal.close()
+    # 崩溃时写了一半的最后一行
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"state": "completed", "op": "upl')
+
+    reopened = TransferJournal(path)
+    assert reopened.pending() == {('upload', '/a', ''): QUEUED, ('delete', '/b', ''): QUEUED}
+    reopened.close()
+
+
+def test_compaction_keeps_only_pending_operations(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    journal = TransferJournal(path, compact_min_records=10)
+    keys = [('upload', f'/f{i}', '') for i in range(6)]
+    journal.queue(keys)
+    journal.complete(keys[:5])
+    journal.close()
+
+    # 11条记录中只有1个未完成，完成时已压缩
+    records = read_records(path)
+    assert records == [{'state': QUEUED, 'op': 'upload', 'path': '/f5'}]
+
+    reopened = TransferJournal(path)
+    assert reopened.pending() == {('upload', '/f5', ''): QUEUED}
+    reopened.queue([('move', '/x', '/y')])
+    reopened.close()
+    assert TransferJournal(path).pending() == {('upload', '/f5', ''): QUEUED, ('move', '/x', '/y'): QUEUED}
+
+
+def test_completed_records_are_compacted_on_open(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    journal = TransferJournal(path)
+    journal.queue([('upload', '/a', ''), ('upload', '/b', '')])
+    journal.complete([('upload', '/a', '')])
+    journal.close()
+
+    TransferJournal(path).close()
+    assert read_records(path) == [{'state': QUEUED, 'op': 'upload', 'path': '/b'}]
+
+
+def test_requeue_after_completion(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    journal = TransferJournal(path)
+    journal.queue([('upload', '/a', '')])
+    journal.complete([('upload', '/a', '')])
+    journal.queue([('upload', '/a', '')])
+    journal.close()
+
+    assert TransferJournal(path).pending() == {('upload', '/a', ''): QUEUED}
+    assert read_records(path)[-1]['state'] != COMPLETED
+
+
+def test_replay_changes_uses_current_local_state(tmp_path):
+    existing = str(tmp_path / 'exists.txt')
+    with open(existing, 'wb') as f:
+        f.write(b'x')
+    missing = str(tmp_path / 'missing.txt')
+    pending = [
+        ('delete', existing, ''),
+        ('upload', missing, ''),
+        ('move', '/a', '/b'),
+        ('move_dir', '/d1', '/d2'),
+        ('move', '/b', '/c'),
+    ]
+
+    uploads, deleted, moved, moved_dirs = replay_changes(pending)
+    # 删除后又重新创建的文件上传，上传前已被删除的文件删除
+    assert uploads == {existing}
+    assert deleted == {missing}
+    assert moved == [('/a', '/b'), ('/b', '/c')]
+    assert moved_dirs == [('/d1', '/d2')]
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import logging
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 操作状态
+QUEUED = 'queued'
+IN_FLIGHT = 'in_flight'
+COMPLETED = 'completed'
+
+# 日志条目的键: (操作, 本地路径, 新本地路径)，操作为upload、delete、move或move_dir，非移动操作的新路径为空
+JournalKey = Tuple[str, str, str]
+
+# 记录数超过该值且其中大部分已完成时压缩日志
+COMPACT_MIN_RECORDS = 10000
+
+
+class TransferJournal:
+    """任务的持久化操作日志（仅追加的JSON行文件），记录已排队、执行中和已完成的上传、删除和移动
+
+    写入先进入文件缓冲区，由sync()批量刷新并fsync，程序崩溃时最多丢失最后一个刷新间隔内的记录。
+    重新启动时未完成的操作（排队或执行中）可重放。已完成的记录积累过多时重写为只含未完成操作的新文件。
+    可由界面线程和同步线程同时调用。
+    """
+
+    def __init__(self, file_path: str, sync_interval: float = 0.5,
+                 compact_min_records: int = COMPACT_MIN_RECORDS):
+        self.file_path = file_path
+        self.sync_interval = sync_interval
+        self.compact_min_records = compact_min_records
+        self._pending: Dict[JournalKey, str] = {}
+        self._records = 0
+        self._dirty = False
+        self._last_sync = time.monotonic()
+        self._lock = Lock()
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        self._load()
+        self._file = open(file_path, 'a', encoding='utf-8')
+        if self._records > len(self._pending):
+            self.compact()
+
+    def _load(self):
+        """读取已有日志，得到每个操作的最新状态"""
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    key = (record['op'], record['path'], record.get('new_path', ''))
+                    state = record['state']
+                except (ValueError, KeyError, TypeError):
+                    # 崩溃时写了一半的最后一行
+                    continue
+                self._records += 1
+                if state == COMPLETED:
+                    self._pending.pop(key, None)
+                else:
+                    self._pending[key] = state
+
+    def _append(self, state: str, keys: Iterable[JournalKey]):
+        lines = []
+        for op, path, new_path in keys:
+            if state != QUEUED and (op, path, new_path) not in self._pending:
+                # 只记录已排队操作的状态变化
+                continue
+            record = {'state': state, 'op': op, 'path': path}
+            if new_path:
+                record['new_path'] = new_path
+            lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+            if state == COMPLETED:
+                self._pending.pop((op, path, new_path), None)
+            else:
+                self._pending[(op, path, new_path)] = state
+        if not lines:
+            return
+        self._file.write(''.join(lines))
+        self._records += len(lines)
+        self._dirty = True
+
+    def queue(self, keys: Iterable[JournalKey]):
+        """记录新排队的操作"""
+        with self._lock:
+            self._append(QUEUED, keys)
+
+    def begin(self, keys: Iterable[JournalKey]):
+        """记录开始执行的操作（忽略未排队的操作），并立即刷新到磁盘"""
+        with self._lock:
+            self._append(IN_FLIGHT, keys)
+        self.sync(force=True)
+
+    def complete(self, keys: Iterable[JournalKey]):
+        """记录已成功完成或不再需要执行的操作，忽略未排队的操作；失败的操作不应记录为完成"""
+        with self._lock:
+            self._append(COMPLETED, keys)
+            should_compact = (self._records >= self.compact_min_records
+                              and len(self._pending) * 4 < self._records)
+        if should_compact:
+            self.compact()
+
+    def pending(self) -> Dict[JournalKey, str]:
+        """未完成的操作及其状态"""
+        with self._lock:
+            return dict(self._pending)
+
+    def sync(self, force: bool = False):
+        """把缓冲的记录刷新到磁盘，未到刷新间隔时跳过（force为True时立即刷新）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.monotonic()
+            if not force and now - self._last_sync < self.sync_interval:
+                return
+            try:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                logging.error(f"刷新操作日志失败: {str(e)}")
+                return
+            self._dirty = False
+            self._last_sync = now
+
+    def compact(self):
+        """重写日志，只保留未完成的操作"""
+        with self._lock:
+            temp_path = self.file_path + '.tmp'
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    for (op, path, new_path), state in self._pending.items():
+                        record = {'state': state, 'op': op, 'path': path}
+                        if new_path:
+                            record['new_path'] = new_path
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._file.close()
+                os.replace(temp_path, self.file_path)
+            except OSError as e:
+                logging.error(f"压缩操作日志失败: {str(e)}")
+                if self._file.closed:
+                    self._file = open(self.file_path, 'a', encoding='utf-8')
+                return
+            self._file = open(self.file_path, 'a', encoding='utf-8')
+            self._records = len(self._pending)
+            self._dirty = False
+
+    def close(self):
+        """刷新并关闭日志"""
+        self.sync(force=True)
+        with self._lock:
+            self._file.close()
+
+
+def change_keys(uploads: Iterable[str], deleted: Iterable[str],
+                moved: Optional[Iterable[Tuple[str, str]]] = None,
+                moved_dirs: Optional[Iterable[Tuple[str, str]]] = None) -> List[JournalKey]:
+    """把一个变化集合转换为日志条目的键"""
+    keys = [('upload', path, '') for path in uploads]
+    keys += [('delete', path, '') for path in deleted]
+    keys += [('move', old_path, new_path) for old_path, new_path in moved or []]
+    keys += [('move_dir', old_dir, new_dir) for old_dir, new_dir in moved_dirs or []]
+    return keys
+
+
+def replay_changes(pending: Iterable[JournalKey]) -> Tuple[Set[str], Set[str], List[Tuple[str, str]],
+                                                          List[Tuple[str, str]]]:
+    """把未完成的操作还原为变化集合，返回 (上传, 删除, 文件移动, 目录移动)
+
+    上传和删除按本地文件当前是否存在决定，移动保持记录的顺序。
+    """
+    uploads, deleted = set(), set()
+    moved, moved_dirs = [], []
+    for op, path, new_path in pending:
+        if op in ('upload', 'delete'):
+            (uploads if os.path.isfile(path) else deleted).add(path)
+        elif op == 'move':
+            moved.append((path, new_path))
+        elif op == 'move_dir':
+            moved_dirs.append((path, new_path))
+    return uploads, deleted, moved, moved_dirs
@@ -0,0 +1,228 @@
+import os
+import time
+import asyncio
+import fnmatch
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 优先级（数值越小越先执行）
+PRIORITY_METADATA = 0   # 删除和移动：只有一次元数据操作
+PRIORITY_PINNED = 1     # 用户指定的优先路径
+PRIORITY_SMALL = 2      # 小文件
+PRIORITY_BULK = 3       # 大文件
+
+# 不超过该大小的文件按小文件优先传输
+SMALL_FILE_SIZE = 1024 * 1024
+# 每个操作按至少该字节数计入任务的已用份额，避免大量小操作不占份额
+MIN_OPERATION_COST = 64 * 1024
+
+
+class _TaskState:
+    """一个任务在调度器中的状态"""
+
+    def __init__(self, weight: float = 1.0, local_dir: str = '', pinned: Sequence[str] = ()):
+        self.weight = max(weight, 0.01)
+        self.local_dir = local_dir
+        self.pinned = [pattern for pattern in pinned if pattern]
+        # 加权虚拟时间：已获得的传输量除以权重，越小越先获得下一个传输槽
+        self.virtual_time = 0.0
+        self.active = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class _Request:
+    __slots__ = ('task_id', 'priority', 'cost', 'seq', 'enqueued', 'granted', 'on_granted')
+
+    def __init__(self, task_id: str, priority: int, cost: int, seq: int,
+                 on_granted: Optional[Callable[[], None]] = None):
+        self.task_id = task_id
+        self.priority = priority
+        self.cost = cost
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.granted = False
+        # 获得传输槽时调用（持有调度器的锁，不能阻塞）
+        self.on_granted = on_granted
+
+
+class TransferScheduler:
+    """跨任务的传输调度器，限制同时进行的传输总数并决定下一个获得传输槽的操作
+
+    删除、移动和优先路径在所有任务中最先执行；其余操作按任务权重公平分配
+    （加权虚拟时间最小的任务优先），同一任务内小文件先于大文件。
+    每个任务自身的并发数仍由其连接数限制。
+    """
+
+    def __init__(self, max_active: int = 8):
+        self.max_active = max(1, max_active)
+        self._tasks: Dict[str, _TaskState] = {}
+        self._waiting: List[_Request] = []
+        self._active = 0
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def configure_task(self, task_id: str, weight: float = 1.0, local_dir: str = '',
+                       pinned: Sequence[str] = ()):
+        """设置任务的权重和优先路径（相对本地目录的通配符模式）"""
+        with self._cond:
+            state = self._tasks.get(task_id)
+            if state is None:
+                self._tasks[task_id] = state = _TaskState()
+                # 新加入的任务从当前最小的虚拟时间开始，不能凭空积累份额
+                state.virtual_time = min((task.virtual_time for task in self._tasks.values()
+                                          if task is not state), default=0.0)
+            state.weight = max(float(weight), 0.01)
+            state.local_dir = local_dir
+            state.pinned = [pattern for pattern in pinned if pattern]
+
+    def remove_task(self, task_id: str):
+        with self._cond:
+            self._tasks.pop(task_id, None)
+
+    def is_pinned(self, task_id: str, local_path: str) -> bool:
+        """本地路径是否匹配任务的优先路径"""
+        state = self._tasks.get(task_id)
+        if state is None or not state.pinned or not local_path:
+            return False
+        relative = os.path.relpath(local_path, state.local_dir).replace(os.sep, '/') if state.local_dir \
+            else local_path
+        return any(fnmatch.fnmatch(relative, pattern) or relative.startswith(pattern.rstrip('/') + '/')
+                   for pattern in state.pinned)
+
+    def classify(self, task_id: str, operation: str, local_path: str) -> Tuple[int, int]:
+        """返回操作的 (优先级, 大小)"""
+        if operation != 'upload':
+            return PRIORITY_METADATA, 0
+        try:
+            size = os.path.getsize(local_path)
+        except OSError:
+            size = 0
+        if self.is_pinned(task_id, local_path):
+            return PRIORITY_PINNED, size
+        return (PRIORITY_SMALL if size <= SMALL_FILE_SIZE else PRIORITY_BULK), size
+
+    def order(self, task_id: str, operations: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
+        """按优先级和大小排列一批 (本地路径, 远程路径, 操作)"""
+        keys = {id(operation): self.classify(task_id, operation[2], operation[0]) for operation in operations}
+        return sorted(operations, key=lambda operation: keys[id(operation)])
+
+    def _pick(self) -> Optional[_Request]:
+        """选择下一个获得传输槽的请求"""
+        best, best_key = None, None
+        for request in self._waiting:
+            state = self._tasks.get(request.task_id)
+            virtual_time = state.virtual_time if state else 0.0
+            urgent = 0 if request.priority <= PRIORITY_PINNED else 1
+            key = (urgent, virtual_time, request.priority, request.seq)
+            if best_key is None or key < best_key:
+                best, best_key = request, key
+        return best
+
+    def _dispatch(self):
+        """在有空闲传输槽时按顺序授予等待的请求"""
+        while self._active < self.max_active and self._waiting:
+            request = self._pick()
+            self._waiting.remove(request)
+            request.granted = True
+            if request.on_granted:
+                request.on_granted()
+            self._active += 1
+            state = self._tasks.get(request.task_id)
+            if state is not None:
+                state.active += 1
+                state.virtual_time += max(request.cost, MIN_OPERATION_COST) / state.weight
+                wait = time.monotonic() - request.enqueued
+                state.total_wait += wait
+                state.max_wait = max(state.max_wait, wait)
+        self._cond.notify_all()
+
+    def _enqueue(self, task_id: str, priority: int, cost: int,
+                 on_granted: Optional[Callable[[], None]] = None) -> _Request:
+        """加入等待队列并尝试分配传输槽，调用时须持有锁"""
+        state = self._tasks.get(task_id)
+        if state is not None and state.active == 0 and not any(
+                request.task_id == task_id for request in self._waiting):
+            # 空闲后重新开始传输的任务不能用空闲期间未使用的份额抢占其他任务
+            busy = [other.virtual_time for other_id, other in self._tasks.items()
+                    if other_id != task_id and (other.active or any(
+                        request.task_id == other_id for request in self._waiting))]
+            if busy:
+                state.virtual_time = max(state.virtual_time, min(busy))
+        self._seq += 1
+        request = _Request(task_id, priority, cost, self._seq, on_granted)
+        self._waiting.append(request)
+        self._dispatch()
+        return request
+
+    def _release(self, task_id: str):
+        """释放一个传输槽并分配给下一个等待的请求"""
+        with self._cond:
+            self._active -= 1
+            state = self._tasks.get(task_id)
+            if state is not None:
+                state.active -= 1
+                state.completed += 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, task_id: str, priority: int = PRIORITY_BULK, cost: int = 0) -> Iterator[None]:
+        """获得一个传输槽后执行with块，退出时释放"""
+        with self._cond:
+            request = self._enqueue(task_id, priority, cost)
+            while not request.granted:
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            self._release(task_id)
+
+    @asynccontextmanager
+    async def async_slot(self, task_id: str, priority: int = PRIORITY_BULK,
+                         cost: int = 0) -> AsyncIterator[None]:
+        """slot()的协程版本，等待传输槽时不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        granted = asyncio.Event()
+        with self._cond:
+            request = self._enqueue(task_id, priority, cost,
+                                    lambda: loop.call_soon_threadsafe(granted.set))
+        try:
+            await granted.wait()
+        except BaseException:
+            # 等待时被取消：还未获得传输槽时退出队列，已获得时释放
+            with self._cond:
+                if not request.granted:
+                    self._waiting.remove(request)
+                    request = None
+            if request is not None:
+                self._release(task_id)
+            raise
+        try:
+            yield
+        finally:
+            self._release(task_id)
+
+    def metrics(self) -> Dict[str, dict]:
+        """每个任务的排队数量、进行中数量、已完成数量和等待时间（秒）"""
+        with self._cond:
+            now = time.monotonic()
+            result = {}
+            for task_id, state in self._tasks.items():
+                waiting = [request for request in self._waiting if request.task_id == task_id]
+                granted = state.completed + state.active
+                result[task_id] = {
+                    'weight': state.weight,
+                    'waiting': len(waiting),
+                    'waiting_by_priority': {
+                        priority: sum(1 for request in waiting if request.priority == priority)
+                        for priority in (PRIORITY_METADATA, PRIORITY_PINNED, PRIORITY_SMALL, PRIORITY_BULK)
+                    },
+                    'active': state.active,
+                    'completed': state.completed,
+                    'avg_wait': state.total_wait / granted if granted else 0.0,
+                    'max_wait': state.max_wait,
+                    'oldest_wait': max((now - request.enqueued for request in waiting), default=0.0),
+                }
+            return result
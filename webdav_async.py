@@ -0,0 +1,251 @@
+import ssl
+import base64
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# 默认同时进行的请求数
+DEFAULT_CONCURRENCY = 32
+# 上传时每次从本地文件读取并发送的字节数
+SEND_CHUNK_SIZE = 256 * 1024
+# 响应头的最大行数，防止异常响应耗尽内存
+MAX_HEADER_LINES = 200
+# 异步客户端不处理的响应（重定向和认证失败），由调用方改用同步的WebDAVTransport重新执行
+FALLBACK_STATUSES = frozenset({301, 302, 303, 307, 308, 401})
+
+
+class AsyncHTTPError(Exception):
+    """异步WebDAV请求失败（连接错误、超时或无法解析的响应）"""
+
+
+class AsyncResponse:
+    """异步请求的响应"""
+
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self) -> str:
+        return self.body.decode('utf-8', errors='replace')
+
+
+class _Connection:
+    __slots__ = ('reader', 'writer')
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class AsyncWebDAVClient:
+    """基于asyncio的WebDAV客户端，在保持连接(keep-alive)的HTTP/1.1连接上同时进行多个请求
+
+    只实现同步所需的HTTP子集：预先发送Basic认证，请求体为bytes或本地文件，
+    响应体按Content-Length、分块编码或连接关闭读取。同时进行的请求数和空闲连接数不超过concurrency。
+    不跟随重定向、不重新认证（返回FALLBACK_STATUSES中的状态码）、不使用代理，由调用方处理。
+    所有方法都必须在同一个事件循环中调用。
+    """
+
+    def __init__(self, base_url: str, username: str, password: str,
+                 concurrency: int = DEFAULT_CONCURRENCY, timeout: float = 60,
+                 throttle_delay: Optional[Callable[[int], float]] = None):
+        parsed = urlparse(base_url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.host_header = parsed.netloc.rsplit('@', 1)[-1]
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        # throttle_delay(字节数) 返回发送这些字节前需要等待的秒数（限速）
+        self.throttle_delay = throttle_delay
+        token = base64.b64encode(f"{username}:{password}".encode('utf-8')).decode('ascii')
+        self._authorization = f'Basic {token}'
+        self._ssl = ssl.create_default_context() if parsed.scheme == 'https' else None
+        self._idle: List[_Connection] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _connect(self) -> Tuple[_Connection, bool]:
+        """取一个空闲连接，没有时新建，返回 (连接, 是否为复用的连接)"""
+        while self._idle:
+            connection = self._idle.pop()
+            if not connection.reader.at_eof():
+                return connection, True
+            connection.close()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self._ssl), self.timeout)
+        return _Connection(reader, writer), False
+
+    def _release(self, connection: _Connection):
+        if len(self._idle) < self.concurrency:
+            self._idle.append(connection)
+        else:
+            connection.close()
+
+    async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                      body: Optional[bytes] = None, body_path: Optional[str] = None,
+                      body_length: int = 0) -> AsyncResponse:
+        """发送请求并读取完整响应
+
+        url 为完整URL或以/开头的路径。请求体为body，或为本地文件body_path的前body_length字节。
+        复用的连接已被服务器关闭时自动换新连接重发一次。
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        parsed = urlparse(url)
+        target = parsed.path or '/'
+        if parsed.query:
+            target += '?' + parsed.query
+        length = len(body) if body is not None else body_length
+        lines = [f'{method} {target} HTTP/1.1', f'Host: {self.host_header}',
+                 f'Authorization: {self._authorization}', 'User-Agent: WebDAV Client',
+                 'Accept: */*', f'Content-Length: {length}']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8')
+
+        async with self._semaphore:
+            for attempt in range(2):
+                connection, reused = await self._connect()
+                try:
+                    response, keep_alive = await self._exchange(connection, method, head, body, body_path, length)
+                except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, AsyncHTTPError) as e:
+                    connection.close()
+                    if reused and attempt == 0:
+                        # 空闲连接已被服务器关闭
+                        continue
+                    raise AsyncHTTPError(f"{method} {url} 失败: {e!r}") from e
+                except BaseException:
+                    connection.close()
+                    raise
+                if keep_alive:
+                    self._release(connection)
+                else:
+                    connection.close()
+                return response
+        raise AsyncHTTPError(f"{method} {url} 失败")
+
+    async def _exchange(self, connection: _Connection, method: str, head: bytes, body: Optional[bytes],
+                        body_path: Optional[str], length: int) -> Tuple[AsyncResponse, bool]:
+        """发送请求并读取响应，每次发送和读取响应分别计算超时（限速等待不计入）"""
+        writer = connection.writer
+        writer.write(head)
+        if body:
+            await self._throttle(len(body))
+            writer.write(body)
+        elif body_path and length:
+            with open(body_path, 'rb') as f:
+                remaining = length
+                while remaining > 0:
+                    data = f.read(min(SEND_CHUNK_SIZE, remaining))
+                    if not data:
+                        raise AsyncHTTPError(f"文件在上传期间变短: {body_path}")
+                    await self._throttle(len(data))
+                    writer.write(data)
+                    await asyncio.wait_for(writer.drain(), self.timeout)
+                    remaining -= len(data)
+        await asyncio.wait_for(writer.drain(), self.timeout)
+        return await asyncio.wait_for(self._read_response(connection.reader, method), self.timeout)
+
+    async def _throttle(self, size: int):
+        if self.throttle_delay:
+            delay = self.throttle_delay(size)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader, method: str) -> Tuple[AsyncResponse, bool]:
+        while True:
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError("连接已关闭")
+            parts = status_line.decode('latin-1').split(None, 2)
+            if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+                raise AsyncHTTPError(f"无效的响应: {status_line[:100]!r}")
+            version, status = parts[0], int(parts[1])
+            headers: Dict[str, str] = {}
+            for _ in range(MAX_HEADER_LINES):
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            else:
+                raise AsyncHTTPError("响应头过长")
+            if 100 <= status < 200:
+                # 跳过中间响应（如100 Continue）
+                continue
+            break
+
+        connection_header = headers.get('connection', '').lower()
+        keep_alive = connection_header != 'close' and (version != 'HTTP/1.0' or connection_header == 'keep-alive')
+        if method == 'HEAD' or status in (204, 304):
+            body = b''
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size_line = await reader.readline()
+                size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    # 跳过尾部字段
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return AsyncResponse(status, headers, body), keep_alive
+
+    async def close(self):
+        """关闭所有空闲连接"""
+        while self._idle:
+            self._idle.pop().close()
+
+
+class EventLoopThread:
+    """在后台线程中运行的事件循环，供同步代码提交协程"""
+
+    def __init__(self, name: str):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def submit(self, coroutine: Awaitable) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Awaitable, timeout: Optional[float] = None):
+        """执行协程并等待结果"""
+        return self.submit(coroutine).result(timeout)
+
+    def stop(self, wait: bool = True):
+        """停止事件循环，wait为True时等待线程退出；事件循环在线程退出前关闭"""
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if not wait:
+            return
+        self._thread.join(timeout=10)
+        if self._thread.is_alive():
+            logging.warning("异步WebDAV事件循环未能及时退出")
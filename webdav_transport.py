@@ -0,0 +1,139 @@
+import base64
+import logging
+import requests
+from threading import Lock
+from typing import Callable, Iterator, Optional
+
+from compression import CompressionStats, gzip_chunks
+
+# 上传时每次从本地文件读取的字节数（固定大小的缓冲区）
+WEBDAV_CHUNK_SIZE = 256 * 1024
+# 每个任务的HTTP连接池大小
+WEBDAV_POOL_SIZE = 10
+
+# 上传请求头（与会话的通用请求头合并）
+PUT_HEADERS = {'Content-Type': 'application/octet-stream'}
+GZIP_PUT_HEADERS = {'Content-Type': 'application/octet-stream', 'Content-Encoding': 'gzip'}
+
+
+class FileBody:
+    """可重复发送的文件请求体
+
+    每次迭代重新打开文件，从offset起用固定大小的缓冲区分块读取；提供长度，请求带Content-Length
+    而不是分块传输编码。认证失败重发请求时重新迭代即可从头发送。
+    """
+
+    def __init__(self, local_path: str, offset: int, length: int,
+                 throttle: Optional[Callable[[int], None]] = None,
+                 chunk_size: int = WEBDAV_CHUNK_SIZE):
+        self.local_path = local_path
+        self.offset = offset
+        self.length = length
+        self.throttle = throttle
+        self.chunk_size = chunk_size
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[memoryview]:
+        buffer = memoryview(bytearray(self.chunk_size))
+        with open(self.local_path, 'rb') as f:
+            f.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                count = f.readinto(buffer[:min(self.chunk_size, remaining)])
+                if not count:
+                    # 已声明Content-Length，少发数据会使服务器一直等待
+                    raise IOError(f"文件在上传期间变短: {self.local_path}")
+                if self.throttle:
+                    self.throttle(count)
+                remaining -= count
+                # 发送完成后才读取下一块，缓冲区可以复用
+                yield buffer[:count]
+
+
+class GzipBody:
+    """可重复发送的gzip压缩请求体，长度未知，以分块传输编码发送"""
+
+    def __init__(self, local_path: str, stats: Optional[CompressionStats] = None,
+                 throttle: Optional[Callable[[int], None]] = None):
+        self.local_path = local_path
+        self.stats = stats
+        self.throttle = throttle
+
+    def __iter__(self) -> Iterator[bytes]:
+        with open(self.local_path, 'rb') as f:
+            yield from gzip_chunks(f, self.stats, self.throttle)
+
+
+class WebDAVTransport:
+    """WebDAV传输层：一个任务的持久会话及其HTTP连接池
+
+    请求返回401时重新设置认证信息后重发一次，请求体必须可重复发送（bytes、FileBody、GzipBody）。
+    重新认证只更新认证信息，会话和连接池保持不变。接口与requests.Session的常用方法一致。
+    """
+
+    def __init__(self, username: str, password: str, pool_size: int = WEBDAV_POOL_SIZE):
+        self.username = username
+        self.password = password
+        self.session = requests.Session()
+        self.adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=3,          # 连接级别的重试
+            pool_block=False        # 连接池满时不阻塞
+        )
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.session.headers.update({
+            'User-Agent': 'WebDAV Client',
+            'Accept': '*/*',
+            'Content-Type': 'application/xml',
+            'Connection': 'keep-alive',
+            'Keep-Alive': 'timeout=60, max=1000',
+        })
+        self._auth_lock = Lock()
+        self.reauth()
+
+    @property
+    def headers(self):
+        return self.session.headers
+
+    def reauth(self):
+        """重新设置认证信息，保留会话和连接池"""
+        with self._auth_lock:
+            self.session.auth = (self.username, self.password)
+            token = base64.b64encode(f"{self.username}:{self.password}".encode('utf-8')).decode('utf-8')
+            self.session.headers['Authorization'] = f'Basic {token}'
+
+    @staticmethod
+    def _rewindable(data) -> bool:
+        return data is None or isinstance(data, (bytes, str, dict, FileBody, GzipBody))
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """发送请求，401时重新认证后重发一次"""
+        kwargs.setdefault('timeout', 60)
+        response = self.session.request(method, url, **kwargs)
+        if response.status_code == 401 and self._rewindable(kwargs.get('data')):
+            logging.warning(f"WebDAV认证失败，重新认证后重试: {method} {url}")
+            response.close()
+            self.reauth()
+            response = self.session.request(method, url, **kwargs)
+        return response
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        """关闭会话和连接池"""
+        self.session.close()